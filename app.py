@@ -1,97 +1,1106 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, request, jsonify
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import os
 from datetime import datetime, timedelta
-from functools import wraps
-from supabase import create_client, Client
+from functools import lru_cache, wraps
 from dotenv import load_dotenv
+from cache import CacheBytes, CacheTTL
+from busqueda import MAX_TERMINOS, terminos as terminos_busqueda
+from compresion import Compresor
+from contrasenas import ContrasenasOcupadas, ServicioContrasenas, metodo_normalizado
+import json
+import base64
+import hashlib
+import hmac
+from metricas import Metricas, ObservadorPool, instrumentar, observador_backend, observador_contrasenas, observador_resiliencia
+from perfilado import Perfilador, instalar as instalar_perfilado
+from repositorio import BACKENDS, COLUMNAS_PROYECTO, COLUMNAS_TAREA, Duplicado, crear_repositorio
+from resiliencia import CircuitoAbierto, Disyuntor, Politica, instalar_plazo, no_disponible
+from serializacion import ProveedorJSON, compilar_serializador
+from viajes import MODOS as MODOS_VIAJES, RegistroViajes, presupuesto_viajes
+from werkzeug.local import LocalProxy
 import re
+import threading
+import time
 
-# Configuración de la aplicación
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv("JWT_SECRET_KEY")
-
-# Configuración mejorada de CORS
-CORS(app, resources={
-    r"/*": {
-        "origins": ["http://localhost:4200", "http://127.0.0.1:4200"],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Credentials"],
-        "supports_credentials": True
+# ========================== CONFIGURACIÓN ==========================
+
+CORS_METODOS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
+CORS_CABECERAS = ["Content-Type", "Authorization", "Access-Control-Allow-Credentials", "If-None-Match"]
+
+
+def _lista(valor):
+    return [elemento.strip() for elemento in valor.split(',') if elemento.strip()]
+
+
+def _booleano(valor):
+    return valor.lower() in ('1', 'true', 'si', 'yes')
+
+
+def _categorias_por_grupo(valor):
+    return {int(grupo): categorias for grupo, categorias in json.loads(valor).items()}
+
+
+# .env se carga una sola vez por proceso (sin pisar las variables ya definidas)
+@lru_cache(maxsize=None)
+def _cargar_dotenv():
+    load_dotenv()
+
+
+# Configuración leída de 'entorno' (por defecto os.environ y .env). create_app()
+# acepta un diccionario que la sobrescribe. Un valor que no se puede convertir
+# es un error de configuración más, como los de validar_configuracion().
+def configuracion_de_entorno(entorno=None):
+    if entorno is None:
+        _cargar_dotenv()
+        entorno = os.environ
+    errores = []
+
+    def leer(nombre, defecto=None, conversion=None):
+        valor = entorno.get(nombre, defecto)
+        if conversion is None or valor is None:
+            return valor
+        try:
+            return conversion(valor)
+        except (TypeError, ValueError, AttributeError):
+            errores.append(f'{nombre} no es válido: {valor!r}')
+
+    config = {
+        'SECRET_KEY': leer("JWT_SECRET_KEY"),
+
+        # CORS (CORS_ORIGINS separados por comas; CORS_MAX_AGE en segundos es
+        # lo que el navegador puede reutilizar un preflight)
+        'CORS_ORIGINS': leer('CORS_ORIGINS', 'http://localhost:4200,http://127.0.0.1:4200', _lista),
+        'CORS_MAX_AGE': leer('CORS_MAX_AGE', '7200', int),
+
+        # Supabase
+        'DATABASE_URL': leer("DATABASE_URL"),
+        'DATABASE_KEY': leer("DATABASE_KEY"),
+
+        # Métricas en formato Prometheus en /metrics: latencia, estados y
+        # peticiones en curso por ruta, llamadas al backend (número y duración
+        # por petición), tiempo de hash de contraseñas y ocupación del pool
+        # HTTP. Con METRICS_TOKEN la ruta exige 'Authorization: Bearer <token>'.
+        'METRICS_TOKEN': leer('METRICS_TOKEN'),
+
+        # Capa de acceso a datos ('supabase' o 'memoria' para trabajar sin conexión)
+        'DATA_BACKEND': leer('DATA_BACKEND', 'supabase'),
+
+        # Pool HTTP hacia Supabase, propio de cada proceso worker y creado con
+        # la primera consulta (o al calentar el repositorio). SUPABASE_HTTP2
+        # requiere el paquete h2; con HTTP/2 unas pocas conexiones multiplexan
+        # muchas peticiones.
+        'SUPABASE_POOL': {
+            'max_conexiones': leer('SUPABASE_POOL_MAX_CONNECTIONS', '20', int),
+            'max_keepalive': leer('SUPABASE_POOL_MAX_KEEPALIVE', leer('SUPABASE_POOL_MAX_CONNECTIONS', '20'), int),
+            'keepalive_expiry': leer('SUPABASE_POOL_KEEPALIVE_EXPIRY', '30', float),
+            'timeout_conexion': leer('SUPABASE_CONNECT_TIMEOUT', '3', float),
+            'timeout_lectura': leer('SUPABASE_READ_TIMEOUT', '10', float),
+            'timeout_pool': leer('SUPABASE_POOL_TIMEOUT', '5', float),
+            'http2': leer('SUPABASE_HTTP2', 'false', _booleano)
+        },
+
+        # Cache de usuarios verificados (evita consultar 'usuarios' en cada petición)
+        'USER_CACHE_TTL': leer('USER_CACHE_TTL', '60', int),  # Máxima antigüedad en segundos
+        'USER_CACHE_MAX': leer('USER_CACHE_MAX', '10000', int),
+
+        # Tokens: acceso de corta duración (se verifican sin consultar
+        # 'usuarios') y refresco de larga duración (se comprueban contra la
+        # época del usuario en /refresh). Los tokens ya verificados se guardan
+        # por digest y cada entrada caduca con el propio token.
+        'ACCESS_TOKEN_TTL': leer('ACCESS_TOKEN_TTL', '900', int),  # Segundos
+        'REFRESH_TOKEN_TTL': leer('REFRESH_TOKEN_TTL', str(30 * 24 * 3600), int),
+        'TOKEN_CACHE_MAX': leer('TOKEN_CACHE_MAX', '10000', int),
+
+        # Cache de nombre -> id para estatus (global) y categorías (por proyecto)
+        'LOOKUP_CACHE_TTL': leer('LOOKUP_CACHE_TTL', '3600', int),
+
+        # Tableros ya serializados por proyecto, acotados por memoria (LRU)
+        'TABLERO_CACHE_MAX_BYTES': leer('TABLERO_CACHE_MAX_BYTES', str(64 * 1024 * 1024), int),
+
+        # Hash de contraseñas en un pool de procesos acotado
+        # (PASSWORD_HASH_WORKERS=0 lo calcula en el hilo de la petición). Los
+        # hashes con otro método o coste se renuevan al iniciar sesión.
+        'PASSWORD_HASH_METHOD': leer('PASSWORD_HASH_METHOD', 'scrypt'),  # p. ej. 'scrypt:65536:8:1' o 'pbkdf2:sha256:1000000'
+        'PASSWORD_HASH_WORKERS': leer('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1)), int),
+        'PASSWORD_HASH_MAX_QUEUE': leer('PASSWORD_HASH_MAX_QUEUE', '64', int),
+        'PASSWORD_HASH_TIMEOUT': leer('PASSWORD_HASH_TIMEOUT', '10', float),
+
+        # Presupuesto de viajes al backend por ruta (@presupuesto_viajes) y
+        # detección de consultas repetidas (N+1): 'enforce' en pruebas y
+        # benchmarks, 'warn' para solo registrarlo en el log, 'off' (por
+        # defecto) sin coste
+        'ROUNDTRIP_BUDGETS': leer('ROUNDTRIP_BUDGETS', 'off'),
+
+        # Resiliencia de las llamadas al backend: plazo por petición
+        # (BACKEND_DEADLINE segundos: no se empieza un intento ni una espera
+        # que no quepa en él, y ninguna espera de red de una llamada pasa de
+        # lo que queda; en ASGI la llamada se cancela al vencer),
+        # reintentos con jitter de las operaciones idempotentes, copia del
+        # tablero si tarda más de BACKEND_HEDGE_DELAY segundos (0 = sin
+        # copias) y disyuntor que rechaza las llamadas durante
+        # BACKEND_BREAKER_COOLDOWN segundos tras BACKEND_BREAKER_THRESHOLD
+        # fallos de red seguidos. Las rutas responden 503.
+        'BACKEND_DEADLINE': leer('BACKEND_DEADLINE', '10', float),
+        'BACKEND_RETRIES': leer('BACKEND_RETRIES', '2', int),
+        'BACKEND_RETRY_BASE': leer('BACKEND_RETRY_BASE', '0.05', float),
+        'BACKEND_RETRY_MAX': leer('BACKEND_RETRY_MAX', '1', float),
+        'BACKEND_HEDGE_DELAY': leer('BACKEND_HEDGE_DELAY', '0', float),
+        'BACKEND_BREAKER_THRESHOLD': leer('BACKEND_BREAKER_THRESHOLD', '5', int),
+        'BACKEND_BREAKER_COOLDOWN': leer('BACKEND_BREAKER_COOLDOWN', '10', float),
+
+        # Perfilado de peticiones (desactivado por defecto):
+        # PROFILE_SAMPLE_RATE es la fracción de peticiones perfiladas
+        # (opcionalmente solo los endpoints de PROFILE_ENDPOINTS) y con
+        # PROFILE_SECRET se puede pedir el perfil de una petición concreta con
+        # la cabecera X-Profile (python perfilado.py <secreto>)
+        'PROFILE_SAMPLE_RATE': leer('PROFILE_SAMPLE_RATE', '0', float),
+        'PROFILE_SECRET': leer('PROFILE_SECRET'),
+        'PROFILE_ENDPOINTS': leer('PROFILE_ENDPOINTS', '', _lista),
+        'PROFILE_DIR': leer('PROFILE_DIR', 'perfiles'),
+        'PROFILE_MAX_FILES': leer('PROFILE_MAX_FILES', '200', int),
+
+        # Compresión de respuestas negociada por Accept-Encoding (zstd y br
+        # solo si están instalados); las variantes comprimidas de los tableros
+        # en cache se guardan aparte, por ETag
+        'COMPRESSION_MIN_BYTES': leer('COMPRESSION_MIN_BYTES', '1024', int),
+        'COMPRESSION_ENCODINGS': leer('COMPRESSION_ENCODINGS', 'zstd,br,gzip', _lista),
+        'COMPRESSION_CACHE_MAX_BYTES': leer('COMPRESSION_CACHE_MAX_BYTES', str(16 * 1024 * 1024), int),
+
+        # Máximo de tareas por petición en las rutas de lote
+        'BULK_MAX_TAREAS': leer('BULK_MAX_TAREAS', '1000', int),
+
+        # Máximo de elementos por página en los listados paginados (?limit=)
+        'PAGE_MAX_LIMIT': leer('PAGE_MAX_LIMIT', '1000', int),
+
+        # Resultados por página de la búsqueda de tareas si no se pide ?limit=
+        'SEARCH_PAGE_SIZE': leer('SEARCH_PAGE_SIZE', '20', int),
+
+        # Categorías creadas con cada proyecto nuevo; CATEGORIAS_POR_GRUPO
+        # permite definir otras por grupo, p. ej. '{"2": ["Backlog", "Doing", "Done"]}'
+        'CATEGORIAS_DEFAULT': ['To Do', 'In Progress', 'Hot Fix', 'Done'],
+        'CATEGORIAS_POR_GRUPO': leer('CATEGORIAS_POR_GRUPO', '{}', _categorias_por_grupo),
+
+        # Calentamiento de cada proceso worker (con el hook post_fork de
+        # gunicorn o, sin él, con la primera petición): conexiones del pool,
+        # estatus en cache, procesos de hash y primera ejecución de regex,
+        # JSON y JWT. create_app() no hace E/S.
+        'WARMUP': leer('WARMUP', 'false', _booleano)
     }
-})
+    if errores:
+        raise ValueError('Configuración no válida: ' + '; '.join(errores))
+    return config
+
+
+def _es_numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+# Errores de configuración detectados al arrancar, todos a la vez, en lugar de
+# en la primera petición que use el valor
+def validar_configuracion(config):
+    errores = []
+    if not config.get('SECRET_KEY'):
+        errores.append('falta JWT_SECRET_KEY')
+    if config['DATA_BACKEND'] not in BACKENDS:
+        errores.append(f"DATA_BACKEND debe ser uno de {', '.join(BACKENDS)}")
+    elif config['DATA_BACKEND'] == 'supabase' and not (config.get('DATABASE_URL') and config.get('DATABASE_KEY')):
+        errores.append('faltan DATABASE_URL o DATABASE_KEY')
+    if config['ROUNDTRIP_BUDGETS'] not in MODOS_VIAJES:
+        errores.append(f"ROUNDTRIP_BUDGETS debe ser uno de {', '.join(MODOS_VIAJES)}")
+    try:
+        metodo_normalizado(config['PASSWORD_HASH_METHOD'])
+    except ValueError as e:
+        errores.append(str(e))
+    for clave in ('ACCESS_TOKEN_TTL', 'REFRESH_TOKEN_TTL', 'USER_CACHE_TTL', 'USER_CACHE_MAX', 'TOKEN_CACHE_MAX',
+                  'LOOKUP_CACHE_TTL', 'TABLERO_CACHE_MAX_BYTES', 'PASSWORD_HASH_MAX_QUEUE', 'PASSWORD_HASH_TIMEOUT',
+                  'BULK_MAX_TAREAS', 'PAGE_MAX_LIMIT', 'SEARCH_PAGE_SIZE', 'BACKEND_BREAKER_THRESHOLD', 'PROFILE_MAX_FILES'):
+        if not _es_numero(config[clave]):
+            errores.append(f'{clave} debe ser un número')
+        elif config[clave] <= 0:
+            errores.append(f'{clave} debe ser mayor que 0')
+    for clave in ('PASSWORD_HASH_WORKERS', 'BACKEND_DEADLINE', 'BACKEND_RETRIES', 'BACKEND_RETRY_BASE',
+                  'BACKEND_RETRY_MAX', 'BACKEND_HEDGE_DELAY', 'BACKEND_BREAKER_COOLDOWN', 'COMPRESSION_MIN_BYTES'):
+        if not _es_numero(config[clave]):
+            errores.append(f'{clave} debe ser un número')
+        elif config[clave] < 0:
+            errores.append(f'{clave} no puede ser negativo')
+    if not _es_numero(config['PROFILE_SAMPLE_RATE']) or not 0 <= config['PROFILE_SAMPLE_RATE'] <= 1:
+        errores.append('PROFILE_SAMPLE_RATE debe estar entre 0 y 1')
+    if errores:
+        raise ValueError('Configuración no válida: ' + '; '.join(errores))
+
+
+# Campos de respuesta de tareas y proyectos: nombre de salida -> columna, o
+# (tabla, columna) para los nombres que llegan por join
+CAMPOS_SALIDA_TAREA = {
+    'id_tarea': 'id_tarea',
+    'titulo': 'titulo',
+    'descripcion': 'descripcion',
+    'prioridad': 'prioridad',
+    'fecha_creacion': 'fecha_creacion',
+    'fecha_vencimiento': 'fecha_vencimiento',
+    'categoria': ('categorias', 'nombre'),
+    'estatus': ('estatus', 'nombre'),
+    'id_proyecto': 'id_proyecto',
+    'id_categoria': 'id_categoria',
+    'id_estatus': 'id_estatus'
+}
+CAMPOS_SALIDA_PROYECTO = {campo: campo for campo in COLUMNAS_PROYECTO}
+
+# Campos que se pueden pedir con ?fields= en los listados
+CAMPOS_RESPUESTA_TAREA = COLUMNAS_TAREA + ('categoria', 'estatus')
+CAMPOS_RESPUESTA_PROYECTO = COLUMNAS_PROYECTO
+
+# Serializadores compartidos por todas las rutas (las tareas recién insertadas
+# no traen los joins: los nombres se pasan como argumentos)
+serializar_tarea = compilar_serializador(CAMPOS_SALIDA_TAREA.items())
+serializar_tarea_insertada = compilar_serializador(
+    (campo, None if campo in ('categoria', 'estatus') else origen) for campo, origen in CAMPOS_SALIDA_TAREA.items())
+serializar_proyecto = compilar_serializador(CAMPOS_SALIDA_PROYECTO.items())
+# Listados completos: las filas recién leídas se reutilizan como respuesta
+remodelar_tarea = compilar_serializador(CAMPOS_SALIDA_TAREA.items(), en_sitio=True)
+
+# Serializadores para las combinaciones de ?fields= pedidas
+@lru_cache(maxsize=256)
+def serializador_tarea(campos):
+    return compilar_serializador((campo, CAMPOS_SALIDA_TAREA[campo]) for campo in campos)
+
+@lru_cache(maxsize=256)
+def serializador_proyecto(campos):
+    return compilar_serializador((campo, CAMPOS_SALIDA_PROYECTO[campo]) for campo in campos)
+
+
+# ========================== ESTADO DE LA APLICACIÓN ==========================
+
+# Repositorio, caches y servicios de una aplicación. create_app() crea uno por
+# aplicación y lo guarda en app.extensions['tareas'], de modo que dos
+# aplicaciones del mismo proceso (p. ej. en las pruebas) no comparten estado
+class Estado:
+    def __init__(self, config, metricas, repositorio=None):
+        self.metricas = metricas
+
+        self.cache_usuarios = CacheTTL(max_entradas=config['USER_CACHE_MAX'], ttl=config['USER_CACHE_TTL'])
+        self.cache_tokens = CacheTTL(max_entradas=config['TOKEN_CACHE_MAX'], ttl=config['ACCESS_TOKEN_TTL'])
+        self.revocaciones = Revocaciones(config['ACCESS_TOKEN_TTL'])
+        self.cache_estatus = CacheTTL(max_entradas=1000, ttl=config['LOOKUP_CACHE_TTL'])
+        self.cache_categorias = CacheTTL(max_entradas=50000, ttl=config['LOOKUP_CACHE_TTL'])
+        self.cache_tableros = CacheBytes(max_bytes=config['TABLERO_CACHE_MAX_BYTES'])
+        self.cache_comprimidos = CacheBytes(max_bytes=config['COMPRESSION_CACHE_MAX_BYTES'])
+
+        self.contrasenas = ServicioContrasenas(
+            metodo=config['PASSWORD_HASH_METHOD'],
+            procesos=config['PASSWORD_HASH_WORKERS'],
+            max_pendientes=config['PASSWORD_HASH_MAX_QUEUE'],
+            timeout=config['PASSWORD_HASH_TIMEOUT']
+        )
+        self.contrasenas.observador = observador_contrasenas(metricas)
+
+        self.registro_viajes = RegistroViajes(config['ROUNDTRIP_BUDGETS'])
+        self.observar_backend = observador_backend(metricas)
+        if self.registro_viajes.activo:
+            self.observar_backend = self.registro_viajes.envolver(self.observar_backend)
 
-# Configuración de Supabase
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-DATABASE_KEY = os.getenv("DATABASE_KEY")
-supabase: Client = create_client(DATABASE_URL, DATABASE_KEY)
+        al_evento_resiliencia, al_cambiar_circuito = observador_resiliencia(metricas)
+        self.politica_backend = Politica(
+            reintentos=config['BACKEND_RETRIES'],
+            espera_base=config['BACKEND_RETRY_BASE'],
+            espera_maxima=config['BACKEND_RETRY_MAX'],
+            cobertura=config['BACKEND_HEDGE_DELAY'] or None,
+            disyuntor=Disyuntor(umbral=config['BACKEND_BREAKER_THRESHOLD'], espera=config['BACKEND_BREAKER_COOLDOWN'],
+                                al_cambiar=al_cambiar_circuito),
+            al_evento=al_evento_resiliencia
+        )
 
-# Añadir manejador explícito para OPTIONS
-@app.before_request
+        self.perfilador = Perfilador(
+            directorio=config['PROFILE_DIR'],
+            muestreo=config['PROFILE_SAMPLE_RATE'],
+            secreto=config['PROFILE_SECRET'],
+            endpoints=config['PROFILE_ENDPOINTS'],
+            max_capturas=config['PROFILE_MAX_FILES']
+        )
+
+        # Cabeceras de preflight por origen permitido, calculadas una sola vez
+        self.cabeceras_preflight = {
+            origen: (
+                ("Access-Control-Allow-Origin", origen),
+                ("Access-Control-Allow-Credentials", "true"),
+                ("Access-Control-Allow-Methods", ", ".join(CORS_METODOS)),
+                ("Access-Control-Allow-Headers", ", ".join(CORS_CABECERAS)),
+                ("Access-Control-Max-Age", str(config['CORS_MAX_AGE'])),
+                ("Vary", "Origin")
+            )
+            for origen in config['CORS_ORIGINS']
+        }
+
+        self.repo = self.conectar(repositorio or crear_repositorio(
+            config['DATA_BACKEND'], config['DATABASE_URL'], config['DATABASE_KEY'],
+            conexiones=config['SUPABASE_POOL'], observador_pool=ObservadorPool(metricas, 'sincrono')))
+
+        # Proceso (pid) en el que ya se calentó la aplicación
+        self.calentada_en = None
+        self.lock_calentamiento = threading.Lock()
+
+    # Las métricas, el registro de viajes y la política de resiliencia se fijan
+    # en cada repositorio (también en el asíncrono de asgi.py), no en la clase
+    def conectar(self, repositorio):
+        repositorio.observador = self.observar_backend
+        repositorio.politica = self.politica_backend
+        return repositorio
+
+    # Libera el pool de contraseñas y los hilos de las copias del tablero
+    def cerrar(self):
+        self.contrasenas.cerrar()
+        self.politica_backend.cerrar()
+
+
+def estado(app=None):
+    return (app or current_app._get_current_object()).extensions['tareas']
+
+
+# Las rutas, los helpers y asgi.py usan el estado de la aplicación actual con
+# estos nombres
+repo = LocalProxy(lambda: estado().repo)
+metricas = LocalProxy(lambda: estado().metricas)
+cache_usuarios = LocalProxy(lambda: estado().cache_usuarios)
+cache_tokens = LocalProxy(lambda: estado().cache_tokens)
+revocaciones = LocalProxy(lambda: estado().revocaciones)
+cache_estatus = LocalProxy(lambda: estado().cache_estatus)
+cache_categorias = LocalProxy(lambda: estado().cache_categorias)
+cache_tableros = LocalProxy(lambda: estado().cache_tableros)
+contrasenas = LocalProxy(lambda: estado().contrasenas)
+politica_backend = LocalProxy(lambda: estado().politica_backend)
+
+# Rutas de la API; create_app() las registra en la aplicación
+api = Blueprint('api', __name__)
+
+
+def create_app(config=None, repositorio=None, entorno=None):
+    configuracion = configuracion_de_entorno(entorno)
+    configuracion.update(config or {})
+    validar_configuracion(configuracion)
+
+    nueva = Flask(__name__)
+    nueva.json = ProveedorJSON(nueva)
+    nueva.config.update(configuracion)
+
+    CORS(nueva, resources={
+        r"/*": {
+            "origins": nueva.config['CORS_ORIGINS'],
+            "methods": CORS_METODOS,
+            "allow_headers": CORS_CABECERAS,
+            "expose_headers": ["ETag"],
+            "supports_credentials": True,
+            "max_age": nueva.config['CORS_MAX_AGE']
+        }
+    })
+
+    # Las métricas se registran antes que la compresión para que la latencia la incluya
+    metricas_app = Metricas()
+    instrumentar(nueva, metricas_app)
+
+    estado_app = nueva.extensions['tareas'] = Estado(nueva.config, metricas_app, repositorio)
+    estado_app.registro_viajes.instalar(nueva)
+    instalar_plazo(nueva, nueva.config['BACKEND_DEADLINE'])
+    instalar_perfilado(nueva, estado_app.perfilador)
+
+    nueva.after_request(Compresor(
+        minimo=nueva.config['COMPRESSION_MIN_BYTES'],
+        codificaciones=nueva.config['COMPRESSION_ENCODINGS'],
+        cache=estado_app.cache_comprimidos
+    ))
+
+    nueva.register_blueprint(api)
+
+    if nueva.config['WARMUP']:
+        nueva.before_request(_calentar_en_primera_peticion)
+    return nueva
+
+
+# ========================== CALENTAMIENTO ==========================
+
+# Deja listo lo que la primera petición de un worker pagaría: conexiones del
+# pool HTTP, tabla de estatus en cache, procesos del pool de contraseñas,
+# patrón de email compilado, JSON, JWT y el mapa de URLs de Flask. Un paso que
+# falla (p. ej. backend caído al arrancar) solo se registra en el log. Se hace
+# una vez por proceso, nunca antes de un fork (ver post_fork).
+def calentar(app):
+    estado_app = estado(app)
+    with estado_app.lock_calentamiento:
+        if estado_app.calentada_en != os.getpid():
+            _calentar_pasos(app, estado_app)
+            estado_app.calentada_en = os.getpid()
+
+
+def _calentar_pasos(app, estado_app):
+    pasos = (
+        ('conexiones', lambda: getattr(estado_app.repo, 'calentar', lambda: None)()),
+        ('estatus', lambda: [estado_app.cache_estatus.guardar(fila['nombre'], fila['id_estatus'])
+                             for fila in estado_app.repo.listar_estatus()]),
+        ('contraseñas', estado_app.contrasenas.calentar),
+        ('peticiones', lambda: _calentar_peticiones(app))
+    )
+    for nombre, paso in pasos:
+        try:
+            paso()
+        except Exception as e:
+            app.logger.warning(f'Calentamiento de {nombre} fallido: {e}')
+
+
+def _calentar_peticiones(app):
+    validar_email('calentar@ejemplo.com')
+    token = jwt.encode({'usuario_id': 0}, app.config['SECRET_KEY'], algorithm='HS256')
+    jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+    with app.test_request_context('/health'):
+        app.json.loads(jsonify({'status': 'ok', 'fecha': datetime.now()}).get_data())
+
+
+# Hook post_fork de gunicorn (en gunicorn.conf.py: 'from app import
+# post_fork'). Se ejecuta en el worker recién creado, antes de atender
+# peticiones; con --preload la aplicación se creó en el proceso maestro sin
+# calentar y lo heredado (conexiones, pool de contraseñas) ya se descartó
+def post_fork(server, worker):
+    aplicacion = worker.app.wsgi()
+    if aplicacion.config['WARMUP']:
+        calentar(aplicacion)
+
+
+# Sin gunicorn (flask run, uvicorn) la primera petición de cada proceso calienta
+def _calentar_en_primera_peticion():
+    aplicacion = current_app._get_current_object()
+    if estado(aplicacion).calentada_en != os.getpid():
+        calentar(aplicacion)
+
+
+# La aplicación se crea al pedir 'app' por primera vez (flask run, gunicorn
+# app:app, asgi.py), no al importar el módulo: importarlo es barato y no lee
+# el entorno
+def __getattr__(nombre):
+    if nombre == 'app':
+        globals()['app'] = aplicacion = create_app()
+        return aplicacion
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+# Manejador único de OPTIONS: responde 204 con las cabeceras ya preparadas
+# (sin cuerpo JSON ni pasar por la ruta ni sus decoradores); un origen no
+# permitido recibe la respuesta sin cabeceras CORS y el navegador la rechaza
+@api.before_app_request
 def handle_preflight():
     if request.method == "OPTIONS":
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "GET,POST,PUT,DELETE,OPTIONS")
-        response.headers.add("Access-Control-Allow-Credentials", "true")
+        return current_app.response_class(status=204, headers=estado().cabeceras_preflight.get(request.headers.get("Origin"), (("Vary", "Origin"),)))
+
+# Categorías por defecto para los proyectos de un grupo
+def categorias_default(id_grupo):
+    return current_app.config['CATEGORIAS_POR_GRUPO'].get(id_grupo, current_app.config['CATEGORIAS_DEFAULT'])
+
+# Obtener el id de un estatus por nombre, creándolo si no existe
+def resolver_estatus(nombre):
+    id_estatus = cache_estatus.obtener(nombre)
+    if id_estatus is None:
+        estatus = repo.obtener_o_crear_estatus(nombre)
+        if not estatus:
+            return None
+        id_estatus = estatus['id_estatus']
+        cache_estatus.guardar(nombre, id_estatus)
+    return id_estatus
+
+# Obtener el id de una categoría del proyecto por nombre, creándola si no existe
+def resolver_categoria(id_proyecto, nombre):
+    clave = (id_proyecto, nombre)
+    id_categoria = cache_categorias.obtener(clave)
+    if id_categoria is None:
+        categoria = repo.obtener_o_crear_categoria(id_proyecto, nombre)
+        if not categoria:
+            return None
+        id_categoria = categoria['id_categoria']
+        cache_categorias.guardar(clave, id_categoria)
+    return id_categoria
+
+# Resolver en bloque ids de categorías y estatus: un solo viaje por tabla para los que no están en cache
+def resolver_nombres_en_lote(pares_categoria, nombres_estatus):
+    categorias = {}
+    faltantes = []
+    for par in set(pares_categoria):
+        id_categoria = cache_categorias.obtener(par)
+        if id_categoria is None:
+            faltantes.append(par)
+        else:
+            categorias[par] = id_categoria
+    if faltantes:
+        for categoria in repo.obtener_o_crear_categorias(faltantes):
+            par = (categoria['id_proyecto'], categoria['nombre'])
+            categorias[par] = categoria['id_categoria']
+            cache_categorias.guardar(par, categoria['id_categoria'])
+    
+    estatus = {}
+    faltantes = []
+    for nombre in set(nombres_estatus):
+        id_estatus = cache_estatus.obtener(nombre)
+        if id_estatus is None:
+            faltantes.append(nombre)
+        else:
+            estatus[nombre] = id_estatus
+    if faltantes:
+        for fila in repo.obtener_o_crear_varios_estatus(faltantes):
+            estatus[fila['nombre']] = fila['id_estatus']
+            cache_estatus.guardar(fila['nombre'], fila['id_estatus'])
+    
+    return categorias, estatus
+
+# Número entero de JSON (en Python los booleanos también son int)
+def es_entero(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+# Validar los campos comunes de una tarea nueva o de sus cambios (solo los
+# presentes en 'datos'); devuelve los valores normalizados o un error. Cada
+# tarea de un lote se valida por separado: un valor de tipo incorrecto es un
+# 400 de esa tarea y no un error de todo el lote
+def validar_campos_tarea(datos):
+    valores = {}
+    
+    for campo in ('titulo', 'nombre_categoria', 'nombre_estatus'):
+        if campo in datos:
+            if not isinstance(datos[campo], str):
+                return None, f'{campo} debe ser texto'
+            valores[campo] = datos[campo].strip()
+    
+    if 'titulo' in valores and len(valores['titulo']) < 2:
+        return None, 'El título debe tener al menos 2 caracteres'
+    
+    for campo in ('nombre_categoria', 'nombre_estatus'):
+        if campo in valores and not valores[campo]:
+            return None, f'{campo} no puede estar vacío'
+    
+    if 'descripcion' in datos:
+        descripcion = datos['descripcion']
+        if descripcion is not None and not isinstance(descripcion, str):
+            return None, 'descripcion debe ser texto'
+        valores['descripcion'] = (descripcion or '').strip()
+    
+    if 'prioridad' in datos:
+        if not es_entero(datos['prioridad']) or datos['prioridad'] not in [1, 2, 3, 4, 5]:
+            return None, 'La prioridad debe ser entre 1 y 5'
+        valores['prioridad'] = datos['prioridad']
+    
+    if 'fecha_vencimiento' in datos:
+        fecha = datos['fecha_vencimiento']
+        if fecha is not None:
+            try:
+                datetime.fromisoformat(fecha)
+            except (TypeError, ValueError):
+                return None, 'fecha_vencimiento debe ser una fecha ISO 8601'
+        valores['fecha_vencimiento'] = fecha
+    
+    return valores, None
+
+# Validar los datos de una tarea nueva; devuelve (tarea, error)
+def preparar_tarea_nueva(datos):
+    if not isinstance(datos, dict) or not datos.get('titulo') or not datos.get('id_proyecto') or not datos.get('nombre_categoria') or not datos.get('nombre_estatus'):
+        return None, 'Título, id_proyecto, nombre_categoria y nombre_estatus son requeridos'
+    
+    if not es_entero(datos['id_proyecto']):
+        return None, 'id_proyecto debe ser un número entero'
+    
+    valores, error = validar_campos_tarea(datos)
+    if error:
+        return None, error
+    
+    tarea = {
+        'titulo': valores['titulo'],
+        'descripcion': valores.get('descripcion', ''),
+        'id_proyecto': datos['id_proyecto'],
+        'nombre_categoria': valores['nombre_categoria'],
+        'nombre_estatus': valores['nombre_estatus'],
+        'prioridad': valores.get('prioridad', 3),
+        'fecha_vencimiento': valores.get('fecha_vencimiento')
+    }
+    
+    return tarea, None
+
+# Validar los cambios de una tarea; devuelve (cambios, nombre_categoria, nombre_estatus, error)
+def preparar_cambios_tarea(datos):
+    if not isinstance(datos, dict):
+        return None, None, None, 'No se enviaron datos válidos para actualizar'
+    
+    valores, error = validar_campos_tarea(datos)
+    if error:
+        return None, None, None, error
+    
+    nombre_categoria = valores.pop('nombre_categoria', None)
+    nombre_estatus = valores.pop('nombre_estatus', None)
+    cambios = valores
+    
+    if not cambios and nombre_categoria is None and nombre_estatus is None:
+        return None, None, None, 'No se enviaron datos válidos para actualizar'
+    
+    return cambios, nombre_categoria, nombre_estatus, None
+
+# Formato de respuesta de una tarea con los nombres de categoría y estatus
+def formatear_tarea(tarea, categoria=None, estatus=None):
+    if categoria is None and estatus is None:
+        return serializar_tarea(tarea)
+    return serializar_tarea_insertada(tarea, categoria, estatus)
+
+# Cursor opaco para la paginación por clave
+# El cursor lleva su tipo ('k'): 'id' es el último id de la página (keyset) y
+# 'off' la posición del siguiente resultado; el de posición lleva además el
+# orden ('s') con el que se calculó. Un cursor de otro tipo u orden es inválido
+def codificar_cursor(valor, tipo='id', orden=None):
+    datos = {'k': tipo, 'v': valor}
+    if orden:
+        datos['s'] = firma_orden(orden)
+    return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode().rstrip('=')
+
+def decodificar_cursor(cursor, tipo='id', orden=None):
+    relleno = '=' * (-len(cursor) % 4)
+    datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    valor = datos['v']
+    if datos['k'] != tipo or datos.get('s') != (firma_orden(orden) if orden else None):
+        raise ValueError('Cursor inválido')
+    if not es_entero(valor) or valor < 0:
+        raise ValueError('Cursor inválido')
+    return valor
+
+def firma_orden(orden):
+    return ','.join(('-' if descendente else '') + columna for columna, descendente in orden)
+
+# Leer ?limit= y ?cursor= (del tipo y orden esperados); devuelve (limite, despues_de, error)
+def parametros_paginacion(tipo='id', orden=None):
+    limite = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    
+    if limite is not None:
+        try:
+            limite = int(limite)
+        except ValueError:
+            return None, None, 'limit debe ser un número entero'
+        if limite < 1 or limite > current_app.config['PAGE_MAX_LIMIT']:
+            return None, None, f"limit debe estar entre 1 y {current_app.config['PAGE_MAX_LIMIT']}"
+    
+    despues_de = None
+    if cursor:
+        try:
+            despues_de = decodificar_cursor(cursor, tipo, orden)
+        except Exception:
+            return None, None, 'Cursor inválido'
+    
+    return limite, despues_de, None
+
+# Columnas por las que se pueden ordenar las tareas (?sort=)
+ORDEN_TAREAS = ('id_tarea', 'titulo', 'prioridad', 'fecha_creacion', 'fecha_vencimiento')
+
+# Leer los filtros de tareas (?prioridad_min=, ?prioridad_max=, ?estatus=,
+# ?id_categoria=, ?vence_antes=, ?vence_despues=) y el orden
+# (?sort=prioridad,-fecha_vencimiento); devuelve (filtros, orden, error). El
+# orden termina siempre en id_tarea para que las páginas sean estables
+def parametros_filtro():
+    filtros = {}
+    
+    for nombre in ('prioridad_min', 'prioridad_max'):
+        valor = request.args.get(nombre)
+        if valor is None:
+            continue
+        try:
+            valor = int(valor)
+        except ValueError:
+            return None, None, f'{nombre} debe ser un número entero'
+        if valor < 1 or valor > 5:
+            return None, None, f'{nombre} debe estar entre 1 y 5'
+        filtros[nombre] = valor
+    
+    estatus = request.args.get('estatus')
+    if estatus:
+        nombres = list(dict.fromkeys(nombre.strip() for nombre in estatus.split(',') if nombre.strip()))
+        if not nombres:
+            return None, None, 'estatus no puede estar vacío'
+        filtros['estatus'] = nombres
+    
+    categorias = request.args.get('id_categoria')
+    if categorias:
+        try:
+            filtros['id_categoria'] = list(dict.fromkeys(int(valor) for valor in categorias.split(',')))
+        except ValueError:
+            return None, None, 'id_categoria debe ser una lista de números enteros'
+    
+    for nombre in ('vence_antes', 'vence_despues'):
+        valor = request.args.get(nombre)
+        if not valor:
+            continue
+        try:
+            datetime.fromisoformat(valor)
+        except ValueError:
+            return None, None, f'{nombre} debe ser una fecha ISO 8601'
+        filtros[nombre] = valor
+    
+    orden = []
+    sort = request.args.get('sort')
+    if sort:
+        for campo in sort.split(','):
+            campo = campo.strip()
+            descendente = campo.startswith('-')
+            columna = campo[1:] if descendente else campo
+            if columna not in ORDEN_TAREAS:
+                return None, None, f'No se puede ordenar por: {columna}'
+            if all(columna != anterior for anterior, _ in orden):
+                orden.append((columna, descendente))
+        if all(columna != 'id_tarea' for columna, _ in orden):
+            orden.append(('id_tarea', False))
+    
+    return filtros, orden, None
+
+# Leer ?fields=; devuelve (campos, error) con campos None si no se pidió
+def campos_solicitados(permitidos):
+    valor = request.args.get('fields')
+    if not valor:
+        return None, None
+    campos = []
+    for campo in valor.split(','):
+        campo = campo.strip()
+        if campo not in permitidos:
+            return None, f'Campo no permitido: {campo}'
+        if campo not in campos:
+            campos.append(campo)
+    return campos, None
+
+# ETag fuerte de una vista del proyecto: depende de su versión, la ruta y los parámetros
+def etag_proyecto(version):
+    vista = f'{request.path}?{request.query_string.decode()}'
+    return f'{version}-{hashlib.sha1(vista.encode()).hexdigest()[:16]}'
+
+# Respuesta 304 si el cliente ya tiene la versión actual (If-None-Match)
+def no_modificado(etag):
+    # Comparación débil: las respuestas comprimidas llevan el ETag como W/"..."
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Añadir ETag a una respuesta completa para que el cliente pueda revalidarla
+def con_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Revalidación barata: solo si el cliente manda If-None-Match se consulta la
+# versión antes que los datos; devuelve 404, 304 o None para seguir
+def revalidar_proyecto(proyecto_id, usuario_id):
+    if not request.if_none_match:
+        return None
+    version = repo.version_proyecto(proyecto_id, usuario_id)
+    if version is None:
+        return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
+    return no_modificado(etag_proyecto(version))
+
+# Descartar los tableros en cache de los proyectos modificados
+def invalidar_tableros(*proyecto_ids):
+    for proyecto_id in proyecto_ids:
+        cache_tableros.invalidar(proyecto_id)
+
+# Respuestas de las lecturas por proyecto (compartidas por las vistas WSGI y
+# las asíncronas de asgi.py)
+def respuesta_categorias(version, resultado):
+    etag = etag_proyecto(version)
+    
+    categorias = []
+    if resultado:
+        for categoria in resultado:
+            categorias.append({
+                'id_categoria': categoria['id_categoria'],
+                'nombre': categoria['nombre'],
+                'id_proyecto': categoria['id_proyecto']
+            })
+    
+    return con_etag(jsonify({
+        'categorias': categorias
+    }), etag), 200
+
+# Columnas de 'tareas' necesarias para los campos pedidos (None = todas)
+def columnas_tarea(campos):
+    if not campos:
+        return None
+    return ['id_tarea'] + [campo for campo in campos if campo in COLUMNAS_TAREA and campo != 'id_tarea']
+
+# Con ?sort= el cursor es la posición del siguiente resultado (desplazamiento)
+# en lugar del último id
+def respuesta_tareas(version, resultado, campos, limite, desplazamiento=None, orden=None):
+    etag = etag_proyecto(version)
+    
+    siguiente = None
+    if limite and len(resultado) > limite:
+        resultado = resultado[:limite]
+        if desplazamiento is None:
+            siguiente = codificar_cursor(resultado[-1]['id_tarea'])
+        else:
+            siguiente = codificar_cursor(desplazamiento + limite, 'off', orden)
+    
+    serializar = serializador_tarea(tuple(campos)) if campos else remodelar_tarea
+    tareas = [serializar(tarea) for tarea in resultado]
+    
+    respuesta = {
+        'tareas': tareas
+    }
+    if limite:
+        respuesta['siguiente'] = siguiente
+    
+    return con_etag(jsonify(respuesta), etag), 200
+
+# En la búsqueda el cursor es la posición del siguiente resultado (el orden es
+# por relevancia, no por id)
+def respuesta_busqueda(version, resultado, campos, desplazamiento, limite):
+    etag = etag_proyecto(version)
+    
+    siguiente = None
+    if len(resultado) > limite:
+        resultado = resultado[:limite]
+        siguiente = codificar_cursor(desplazamiento + limite, 'off')
+    
+    serializar = serializador_tarea(tuple(campos)) if campos else serializar_tarea
+    tareas = []
+    for tarea in resultado:
+        item = serializar(tarea)
+        item['relevancia'] = round(tarea['relevancia'], 6)
+        tareas.append(item)
+    
+    return con_etag(jsonify({'tareas': tareas, 'siguiente': siguiente}), etag), 200
+
+# 304 o tablero en cache si la versión del proyecto no ha cambiado (None si hay que reconstruirlo)
+def tablero_vigente(version, snapshot):
+    etag = etag_proyecto(version)
+    response = no_modificado(etag)
+    if response:
         return response
+    
+    # Servir el tablero ya serializado si corresponde a la versión actual
+    if snapshot and snapshot['version'] == version:
+        response = current_app.response_class(snapshot['cuerpo'], mimetype='application/json')
+        response.clave_compresion = etag
+        return con_etag(response, etag), 200
+    return None
+
+# Tablero completo a partir del proyecto y sus tareas; guarda el snapshot
+# serializado salvo que sea una vista filtrada
+def respuesta_tablero(proyecto, resultado_tareas, guardar=True):
+    etag = etag_proyecto(proyecto['version'])
+    
+    # Organizar tareas por categoría (estatus)
+    categorias_tablero = {
+        'To Do': [],
+        'In Progress': [],
+        'Hot Fix': [],
+        'Done': []
+    }
+    
+    # Contadores para resumen
+    total_tareas = 0
+    por_categoria = {
+        'To Do': 0,
+        'In Progress': 0,
+        'Hot Fix': 0,
+        'Done': 0
+    }
+    por_prioridad = {
+        '1': 0,
+        '2': 0,
+        '3': 0,
+        '4': 0,
+        '5': 0
+    }
+    
+    if resultado_tareas:
+        for tarea in resultado_tareas:
+            total_tareas += 1
+            
+            tarea_formateada = remodelar_tarea(tarea)
+            
+            estatus = tarea_formateada['estatus']
+            
+            # Agregar a la categoría correspondiente
+            if estatus in categorias_tablero:
+                categorias_tablero[estatus].append(tarea_formateada)
+                por_categoria[estatus] += 1
+            else:
+                # Si el estatus no está en las categorías por defecto, agregarlo a "To Do"
+                categorias_tablero['To Do'].append(tarea_formateada)
+                por_categoria['To Do'] += 1
+            
+            # Contar por prioridad
+            prioridad_str = str(tarea['prioridad'])
+            if prioridad_str in por_prioridad:
+                por_prioridad[prioridad_str] += 1
+            
+    # Construir respuesta del tablero
+    tablero = {
+        'proyecto': serializar_proyecto(proyecto),
+        'categorias': categorias_tablero,
+        'resumen': {
+            'total_tareas': total_tareas,
+            'por_categoria': por_categoria,
+            'por_prioridad': por_prioridad
+        }
+    }
+    
+    response = jsonify(tablero)
+    if guardar:
+        cuerpo = response.get_data()
+        cache_tableros.guardar(proyecto['id_proyecto'], {
+            'version': proyecto['version'],
+            'cuerpo': cuerpo,
+            'resumen': tablero['resumen']
+        }, len(cuerpo))
+    
+    response.clave_compresion = etag
+    return con_etag(response, etag), 200
+
+# Validar una lista de ids de tareas recibida en un lote
+def ids_de_lote(valores):
+    if not isinstance(valores, list) or not valores:
+        return None, 'Se requiere una lista de ids de tareas'
+    if len(valores) > current_app.config['BULK_MAX_TAREAS']:
+        return None, f"Se permiten como máximo {current_app.config['BULK_MAX_TAREAS']} tareas por lote"
+    if not all(es_entero(valor) for valor in valores):
+        return None, 'Los ids de tareas deben ser números enteros'
+    return valores, None
 
 # Función para validar email
 def validar_email(email):
     patron = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(patron, email) is not None
 
+# Emitir el par de tokens de un usuario: (acceso, refresco)
+def emitir_tokens(usuario):
+    ahora = datetime.utcnow()
+    acceso = jwt.encode({
+        'usuario_id': usuario['id_usuario'],
+        'email': usuario['email'],
+        'tipo': 'acceso',
+        'epoca': usuario.get('epoca_tokens', 0),
+        'exp': ahora + timedelta(seconds=current_app.config['ACCESS_TOKEN_TTL'])
+    }, current_app.config['SECRET_KEY'], algorithm='HS256')
+    refresco = jwt.encode({
+        'usuario_id': usuario['id_usuario'],
+        'tipo': 'refresco',
+        'epoca': usuario.get('epoca_tokens', 0),
+        'exp': ahora + timedelta(seconds=current_app.config['REFRESH_TOKEN_TTL'])
+    }, current_app.config['SECRET_KEY'], algorithm='HS256')
+    return acceso, refresco
+
+# Token de la cabecera Authorization sin el prefijo 'Bearer '
+def token_de_peticion():
+    token = request.headers.get('Authorization')
+    if token and token.startswith('Bearer '):
+        token = token[7:]
+    return token
+
+# Épocas revocadas por usuario en este proceso (logout o cambio de
+# contraseña): los tokens de acceso de una época anterior se rechazan sin
+# consultar 'usuarios'. No es una cache, no descarta entradas por tamaño; cada
+# una se retira cuando ya han caducado todos los tokens de acceso anteriores.
+# En otros procesos esos tokens valen hasta caducar; los de refresco se
+# comprueban siempre contra la época guardada en 'usuarios'.
+class Revocaciones:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._epocas = {}  # usuario_id -> (época mínima, instante de retirada)
+        self._lock = threading.Lock()
+    
+    def revocar(self, usuario_id, epoca):
+        ahora = time.monotonic()
+        with self._lock:
+            for clave in [clave for clave, (_, retirada) in self._epocas.items() if retirada <= ahora]:
+                del self._epocas[clave]
+            self._epocas[usuario_id] = (epoca, ahora + self.ttl)
+    
+    def revocado(self, data):
+        revocacion = self._epocas.get(data['usuario_id'])
+        return revocacion is not None and data.get('epoca', 0) < revocacion[0] and time.monotonic() < revocacion[1]
+
+# Datos de un token verificado; la firma solo se comprueba la primera vez
+# (lanza las excepciones de jwt, o InvalidTokenError si se revocó aquí)
+def verificar_token(token):
+    clave = hashlib.sha256(token.encode()).digest()
+    data = cache_tokens.obtener(clave)
+    if data is None:
+        data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        restante = data['exp'] - time.time() if 'exp' in data else current_app.config['ACCESS_TOKEN_TTL']
+        if restante > 0:
+            cache_tokens.guardar(clave, data, ttl=restante)
+    if 'usuario_id' in data and revocaciones.revocado(data):
+        raise jwt.InvalidTokenError('Token revocado')
+    return data
+
+# Datos del token de la petición; devuelve (data, error) con el error ya como
+# respuesta 401. Los tokens de refresco no sirven para acceder.
+def datos_de_token():
+    token = token_de_peticion()
+    
+    if not token:
+        return None, (jsonify({'error': 'Token es requerido'}), 401)
+    
+    try:
+        data = verificar_token(token)
+        if data.get('tipo') == 'refresco':
+            return None, (jsonify({'error': 'Token inválido'}), 401)
+        return data, None
+        
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({'error': 'Token ha expirado'}), 401)
+    except jwt.InvalidTokenError:
+        return None, (jsonify({'error': 'Token inválido'}), 401)
+    except Exception:
+        return None, (jsonify({'error': 'Error al validar token'}), 401)
+
+# Los tokens de acceso de corta duración no consultan 'usuarios' (la revocación
+# se aplica al refrescarlos); los emitidos antes, de 24 horas, sí
+def requiere_comprobar_usuario(data):
+    return data.get('tipo') != 'acceso' and cache_usuarios.obtener(data['usuario_id']) is None
+
+# Respuesta de una excepción no prevista en una ruta: 503 con Retry-After si el
+# backend no está disponible (plazo agotado, circuito abierto o error de red
+# tras los reintentos), 409 si choca con una clave única, 500 en otro caso
+def error_interno(e):
+    if isinstance(e, Duplicado):
+        return jsonify({'error': 'El registro ya existe'}), 409
+    if no_disponible(e):
+        segundos = politica_backend.segundos_hasta_reintento() if isinstance(e, CircuitoAbierto) else 1
+        return jsonify({'error': 'Servicio no disponible temporalmente, intente de nuevo en unos segundos'}), 503, {
+            'Retry-After': str(max(1, round(segundos)))}
+    return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+
 # Decorator para rutas protegidas
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'error': 'Token es requerido'}), 401
+        data, error = datos_de_token()
+        if error:
+            return error
+        usuario_id = data['usuario_id']
         
         try:
-            # Remover 'Bearer ' del token si existe
-            if token.startswith('Bearer '):
-                token = token[7:]
-            
-            # Decodificar el token
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            usuario_id = data['usuario_id']
+            # Verificar que el usuario existe (primero en la cache)
+            if requiere_comprobar_usuario(data):
+                if not repo.usuario_existe(usuario_id):
+                    return jsonify({'error': 'Usuario no encontrado'}), 401
+                cache_usuarios.guardar(usuario_id, True)
             
-            # Verificar que el usuario existe
-            resultado = supabase.table('usuarios').select('*').eq('id_usuario', usuario_id).execute()
-            if not resultado.data:
-                return jsonify({'error': 'Usuario no encontrado'}), 401
-            
-            # Pasar el usuario actual a la función
-            return f(usuario_id, *args, **kwargs)
-            
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token ha expirado'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token inválido'}), 401
         except Exception as e:
+            if no_disponible(e):
+                return error_interno(e)
             return jsonify({'error': 'Error al validar token'}), 401
+        
+        # Pasar el usuario actual a la función
+        return f(usuario_id, *args, **kwargs)
     
     return decorated
 
 # ========================== RUTAS DE AUTENTICACIÓN ==========================
 
 # Ruta de registro
-@app.route('/registro', methods=['POST', 'OPTIONS'])
+@api.route('/registro', methods=['POST'])
+@presupuesto_viajes(2)
 def registro():
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "POST,OPTIONS")
-        return response
-        
     try:
         datos = request.get_json()
         
@@ -114,12 +1123,11 @@ def registro():
             return jsonify({'error': 'La contraseña debe tener al menos 6 caracteres'}), 400
         
         # Verificar si el email ya existe
-        resultado = supabase.table('usuarios').select('id_usuario').eq('email', email).execute()
-        if resultado.data:
+        if repo.email_registrado(email):
             return jsonify({'error': 'El email ya está registrado'}), 400
         
         # Cifrar contraseña
-        contrasena_cifrada = generate_password_hash(contrasena)
+        contrasena_cifrada = contrasenas.cifrar(contrasena)
         
         # Crear usuario
         nuevo_usuario = {
@@ -131,10 +1139,9 @@ def registro():
             'id_usuario_creador': 1  # Usuario creador por defecto
         }
         
-        resultado = supabase.table('usuarios').insert(nuevo_usuario).execute()
+        usuario_creado = repo.crear_usuario(nuevo_usuario)
         
-        if resultado.data:
-            usuario_creado = resultado.data[0]
+        if usuario_creado:
             return jsonify({
                 'mensaje': 'Usuario registrado exitosamente',
                 'usuario': {
@@ -150,19 +1157,15 @@ def registro():
         else:
             return jsonify({'error': 'Error al crear usuario'}), 500
             
+    except ContrasenasOcupadas:
+        return jsonify({'error': 'Servicio ocupado, intente de nuevo en unos segundos'}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # Ruta de inicio de sesión
-@app.route('/login', methods=['POST', 'OPTIONS'])
+@api.route('/login', methods=['POST'])
+@presupuesto_viajes(2)
 def login():
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "POST,OPTIONS")
-        return response
-        
     try:
         datos = request.get_json()
         
@@ -174,29 +1177,33 @@ def login():
         contrasena = datos['contrasena']
         
         # Buscar usuario por email
-        resultado = supabase.table('usuarios').select('*').eq('email', email).execute()
+        usuario = repo.obtener_usuario_por_email(email)
         
-        if not resultado.data:
+        if not usuario:
             return jsonify({'error': 'Credenciales inválidas'}), 401
         
-        usuario = resultado.data[0]
-        
         # Verificar contraseña
-        if not check_password_hash(usuario['contrasena'], contrasena):
+        valida, contrasena_renovada = contrasenas.verificar(usuario['contrasena'], contrasena)
+        if not valida:
             return jsonify({'error': 'Credenciales inválidas'}), 401
         
-        # Generar token JWT
-        token_payload = {
-            'usuario_id': usuario['id_usuario'],
-            'email': usuario['email'],
-            'exp': datetime.utcnow() + timedelta(hours=24)  # Token válido por 24 horas
-        }
+        # Guardar el hash con los parámetros actuales si el guardado usa otros
+        # (si falla, el inicio de sesión sigue: se reintenta en el siguiente)
+        if contrasena_renovada:
+            try:
+                repo.actualizar_usuario(usuario['id_usuario'], {'contrasena': contrasena_renovada})
+            except Exception as e:
+                metricas.contar('app_password_rehash_failures_total')
+                current_app.logger.warning(f"No se pudo renovar el hash del usuario {usuario['id_usuario']}: {e}")
         
-        token = jwt.encode(token_payload, app.config['SECRET_KEY'], algorithm='HS256')
+        # Generar tokens JWT (acceso y refresco)
+        token, refresh_token = emitir_tokens(usuario)
         
         return jsonify({
             'mensaje': 'Inicio de sesión exitoso',
             'token': token,
+            'refresh_token': refresh_token,
+            'expira_en': current_app.config['ACCESS_TOKEN_TTL'],
             'usuario': {
                 'id_usuario': usuario['id_usuario'],
                 'nombre': usuario['nombre'],
@@ -208,29 +1215,80 @@ def login():
             }
         }), 200
         
+    except ContrasenasOcupadas:
+        return jsonify({'error': 'Servicio ocupado, intente de nuevo en unos segundos'}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        return error_interno(e)
+
+# Renovar el token de acceso con un token de refresco
+@api.route('/refresh', methods=['POST'])
+@presupuesto_viajes(1)
+def refrescar_token():
+    try:
+        datos = request.get_json(silent=True)
+        
+        if not datos or not datos.get('refresh_token'):
+            return jsonify({'error': 'refresh_token es requerido'}), 400
+        
+        try:
+            data = jwt.decode(datos['refresh_token'], current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token de refresco expirado'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Token inválido'}), 401
+        
+        if data.get('tipo') != 'refresco':
+            return jsonify({'error': 'Token inválido'}), 401
+        
+        # Verificar que el usuario existe y no ha revocado sus sesiones
+        usuario = repo.obtener_usuario(data['usuario_id'])
+        
+        if not usuario or usuario.get('epoca_tokens', 0) != data.get('epoca'):
+            return jsonify({'error': 'Sesión revocada'}), 401
+        
+        token, refresh_token = emitir_tokens(usuario)
+        
+        return jsonify({
+            'token': token,
+            'refresh_token': refresh_token,
+            'expira_en': current_app.config['ACCESS_TOKEN_TTL']
+        }), 200
+        
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
+
+# Cerrar sesión: invalida los tokens de refresco del usuario; los de acceso
+# emitidos caducan solos (y en este proceso se rechazan ya)
+@api.route('/logout', methods=['POST'])
+@presupuesto_viajes(1)
+@token_required
+def cerrar_sesion(usuario_id):
+    try:
+        epoca = repo.revocar_tokens(usuario_id)
+        if epoca is None:
+            return jsonify({'error': 'Usuario no encontrado'}), 404
+        
+        revocaciones.revocar(usuario_id, epoca)
+        
+        return jsonify({
+            'mensaje': 'Sesión cerrada exitosamente'
+        }), 200
+        
+    except Exception as e:
+        return error_interno(e)
 
 # Ruta para obtener perfil del usuario autenticado
-@app.route('/perfil', methods=['GET', 'OPTIONS'])
+@api.route('/perfil', methods=['GET'])
+@presupuesto_viajes(1)
 @token_required
 def perfil(usuario_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "GET,OPTIONS")
-        return response
-        
     try:
         # Obtener datos del usuario
-        resultado = supabase.table('usuarios').select('*').eq('id_usuario', usuario_id).execute()
+        usuario = repo.obtener_usuario(usuario_id)
         
-        if not resultado.data:
+        if not usuario:
             return jsonify({'error': 'Usuario no encontrado'}), 404
         
-        usuario = resultado.data[0]
-        
         return jsonify({
             'usuario': {
                 'id_usuario': usuario['id_usuario'],
@@ -244,19 +1302,13 @@ def perfil(usuario_id):
         }), 200
         
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # Ruta para actualizar perfil
-@app.route('/perfil', methods=['PUT', 'OPTIONS'])
+@api.route('/perfil', methods=['PUT'])
+@presupuesto_viajes(2)
 @token_required
 def actualizar_perfil(usuario_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "PUT,OPTIONS")
-        return response
-        
     try:
         datos = request.get_json()
         
@@ -278,8 +1330,7 @@ def actualizar_perfil(usuario_id):
                 return jsonify({'error': 'Email inválido'}), 400
             
             # Verificar si el email ya existe (excluyendo el usuario actual)
-            resultado = supabase.table('usuarios').select('id_usuario').eq('email', email).neq('id_usuario', usuario_id).execute()
-            if resultado.data:
+            if repo.email_registrado(email, excluir_id=usuario_id):
                 return jsonify({'error': 'El email ya está registrado'}), 400
             
             datos_actualizacion['email'] = email
@@ -288,10 +1339,10 @@ def actualizar_perfil(usuario_id):
             return jsonify({'error': 'No se enviaron datos válidos para actualizar'}), 400
         
         # Actualizar usuario
-        resultado = supabase.table('usuarios').update(datos_actualizacion).eq('id_usuario', usuario_id).execute()
+        usuario_actualizado = repo.actualizar_usuario(usuario_id, datos_actualizacion)
+        cache_usuarios.invalidar(usuario_id)
         
-        if resultado.data:
-            usuario_actualizado = resultado.data[0]
+        if usuario_actualizado:
             return jsonify({
                 'mensaje': 'Perfil actualizado exitosamente',
                 'usuario': {
@@ -308,19 +1359,13 @@ def actualizar_perfil(usuario_id):
             return jsonify({'error': 'Error al actualizar perfil'}), 500
             
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # Ruta para cambiar contraseña
-@app.route('/cambiar-contrasena', methods=['PUT', 'OPTIONS'])
+@api.route('/cambiar-contrasena', methods=['PUT'])
+@presupuesto_viajes(2)
 @token_required
 def cambiar_contrasena(usuario_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "PUT,OPTIONS")
-        return response
-        
     try:
         datos = request.get_json()
         
@@ -335,48 +1380,46 @@ def cambiar_contrasena(usuario_id):
             return jsonify({'error': 'La nueva contraseña debe tener al menos 6 caracteres'}), 400
         
         # Obtener usuario
-        resultado = supabase.table('usuarios').select('contrasena').eq('id_usuario', usuario_id).execute()
+        contrasena_guardada = repo.obtener_contrasena(usuario_id)
         
-        if not resultado.data:
+        if not contrasena_guardada:
             return jsonify({'error': 'Usuario no encontrado'}), 404
         
-        usuario = resultado.data[0]
+        # Verificar contraseña actual y cifrar la nueva (una sola operación en el pool)
+        nueva_contrasena_cifrada = contrasenas.cambiar(contrasena_guardada, contrasena_actual, contrasena_nueva)
         
-        # Verificar contraseña actual
-        if not check_password_hash(usuario['contrasena'], contrasena_actual):
+        if not nueva_contrasena_cifrada:
             return jsonify({'error': 'Contraseña actual incorrecta'}), 401
         
-        # Cifrar nueva contraseña
-        nueva_contrasena_cifrada = generate_password_hash(contrasena_nueva)
-        
-        # Actualizar contraseña
-        resultado = supabase.table('usuarios').update({
-            'contrasena': nueva_contrasena_cifrada
-        }).eq('id_usuario', usuario_id).execute()
+        # Guardar la contraseña e invalidar los tokens emitidos con la anterior
+        # (como en el logout); la respuesta lleva un par de tokens nuevo
+        usuario = repo.cambiar_contrasena(usuario_id, nueva_contrasena_cifrada)
+        cache_usuarios.invalidar(usuario_id)
         
-        if resultado.data:
+        if usuario:
+            revocaciones.revocar(usuario_id, usuario['epoca_tokens'])
+            token, refresh_token = emitir_tokens(usuario)
             return jsonify({
-                'mensaje': 'Contraseña actualizada exitosamente'
+                'mensaje': 'Contraseña actualizada exitosamente',
+                'token': token,
+                'refresh_token': refresh_token,
+                'expira_en': current_app.config['ACCESS_TOKEN_TTL']
             }), 200
         else:
             return jsonify({'error': 'Error al actualizar contraseña'}), 500
             
+    except ContrasenasOcupadas:
+        return jsonify({'error': 'Servicio ocupado, intente de nuevo en unos segundos'}), 503, {'Retry-After': '1'}
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # ========================== RUTAS DE PROYECTOS ==========================
 
 # Crear proyecto
-@app.route('/proyectos', methods=['POST', 'OPTIONS'])
+@api.route('/proyectos', methods=['POST'])
+@presupuesto_viajes(1)
 @token_required
 def crear_proyecto(usuario_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "POST,OPTIONS")
-        return response
-        
     try:
         datos = request.get_json()
         
@@ -388,94 +1431,74 @@ def crear_proyecto(usuario_id):
         if len(nombre) < 2:
             return jsonify({'error': 'El nombre del proyecto debe tener al menos 2 caracteres'}), 400
         
-        # Crear proyecto
+        # Crear proyecto junto con sus categorías por defecto (una sola transacción)
         nuevo_proyecto = {
             'nombre': nombre,
             'id_grupo': 1,  # Grupo por defecto
             'id_usuario_creador': usuario_id
         }
         
-        resultado = supabase.table('proyectos').insert(nuevo_proyecto).execute()
+        proyecto_creado, categorias_creadas = repo.crear_proyecto_con_categorias(
+            nuevo_proyecto, categorias_default(nuevo_proyecto['id_grupo']))
         
-        if resultado.data:
-            proyecto_creado = resultado.data[0]
-            
-            # Crear categorías por defecto
-            categorias_default = ['To Do', 'In Progress', 'Hot Fix', 'Done']
-            categorias_creadas = []
-            
-            for categoria_nombre in categorias_default:
-                categoria = {
-                    'nombre': categoria_nombre,
-                    'id_proyecto': proyecto_creado['id_proyecto']
-                }
-                resultado_categoria = supabase.table('categorias').insert(categoria).execute()
-                if resultado_categoria.data:
-                    categorias_creadas.append(resultado_categoria.data[0])
-            
+        if proyecto_creado:
             return jsonify({
                 'mensaje': 'Proyecto creado exitosamente',
-                'proyecto': {
-                    'id_proyecto': proyecto_creado['id_proyecto'],
-                    'nombre': proyecto_creado['nombre'],
-                    'id_grupo': proyecto_creado['id_grupo'],
-                    'id_usuario_creador': proyecto_creado['id_usuario_creador'],
-                    'fecha_creacion': proyecto_creado['fecha_creacion']
-                },
+                'proyecto': serializar_proyecto(proyecto_creado),
                 'categorias': categorias_creadas
             }), 201
         else:
             return jsonify({'error': 'Error al crear proyecto'}), 500
             
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # Listar proyectos
-@app.route('/proyectos', methods=['GET', 'OPTIONS'])
+@api.route('/proyectos', methods=['GET'])
+@presupuesto_viajes(1)
 @token_required
 def listar_proyectos(usuario_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "GET,OPTIONS")
-        return response
-        
     try:
-        # Obtener proyectos del usuario
-        resultado = supabase.table('proyectos').select('*').eq('id_usuario_creador', usuario_id).execute()
-        
-        proyectos = []
-        if resultado.data:
-            for proyecto in resultado.data:
-                proyectos.append({
-                    'id_proyecto': proyecto['id_proyecto'],
-                    'nombre': proyecto['nombre'],
-                    'id_grupo': proyecto['id_grupo'],
-                    'id_usuario_creador': proyecto['id_usuario_creador'],
-                    'fecha_creacion': proyecto['fecha_creacion']
-                })
+        campos, error = campos_solicitados(CAMPOS_RESPUESTA_PROYECTO)
+        if error:
+            return jsonify({'error': error}), 400
         
-        return jsonify({
+        limite, despues_de, error = parametros_paginacion()
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Obtener proyectos del usuario (solo las columnas pedidas, una página más uno
+        # para saber si hay siguiente)
+        campos = campos or list(CAMPOS_RESPUESTA_PROYECTO)
+        columnas = campos if 'id_proyecto' in campos else ['id_proyecto'] + campos
+        resultado = repo.listar_proyectos(usuario_id, columnas, despues_de, limite + 1 if limite else None)
+        
+        siguiente = None
+        if limite and len(resultado) > limite:
+            resultado = resultado[:limite]
+            siguiente = codificar_cursor(resultado[-1]['id_proyecto'])
+        
+        serializar = serializador_proyecto(tuple(campos))
+        proyectos = [serializar(proyecto) for proyecto in resultado]
+        
+        respuesta = {
             'proyectos': proyectos
-        }), 200
+        }
+        if limite:
+            respuesta['siguiente'] = siguiente
+        
+        return jsonify(respuesta), 200
         
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # ========================== RUTAS DE CATEGORÍAS ==========================
 
 # Crear categoría
-@app.route('/categorias', methods=['POST', 'OPTIONS'])
+@api.route('/categorias', methods=['POST'])
+@presupuesto_viajes(1)
 @token_required
 def crear_categoria(usuario_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "POST,OPTIONS")
-        return response
-        
     try:
         datos = request.get_json()
         
@@ -488,22 +1511,19 @@ def crear_categoria(usuario_id):
         if len(nombre) < 2:
             return jsonify({'error': 'El nombre de la categoría debe tener al menos 2 caracteres'}), 400
         
-        # Verificar que el proyecto existe y pertenece al usuario
-        resultado_proyecto = supabase.table('proyectos').select('id_proyecto').eq('id_proyecto', proyecto_id).eq('id_usuario_creador', usuario_id).execute()
+        # Crear categoría solo si el proyecto existe y pertenece al usuario
+        try:
+            categoria_creada = repo.crear_categoria_de_usuario(proyecto_id, usuario_id, nombre)
+        except Duplicado:
+            return jsonify({'error': 'La categoría ya existe en el proyecto'}), 409
         
-        if not resultado_proyecto.data:
+        if categoria_creada is None:
             return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
         
-        # Crear categoría
-        nueva_categoria = {
-            'nombre': nombre,
-            'id_proyecto': proyecto_id
-        }
-        
-        resultado = supabase.table('categorias').insert(nueva_categoria).execute()
+        invalidar_tableros(proyecto_id)
         
-        if resultado.data:
-            categoria_creada = resultado.data[0]
+        if categoria_creada:
+            cache_categorias.guardar((proyecto_id, categoria_creada['nombre']), categoria_creada['id_categoria'])
             return jsonify({
                 'mensaje': 'Categoría creada exitosamente',
                 'categoria': {
@@ -516,378 +1536,236 @@ def crear_categoria(usuario_id):
             return jsonify({'error': 'Error al crear categoría'}), 500
             
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # Listar categorías por proyecto
-@app.route('/proyectos/<int:proyecto_id>/categorias', methods=['GET', 'OPTIONS'])
+@api.route('/proyectos/<int:proyecto_id>/categorias', methods=['GET'])
+@presupuesto_viajes(2)
 @token_required
 def listar_categorias(usuario_id, proyecto_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "GET,OPTIONS")
-        return response
-        
     try:
-        # Verificar que el proyecto existe y pertenece al usuario
-        resultado_proyecto = supabase.table('proyectos').select('id_proyecto').eq('id_proyecto', proyecto_id).eq('id_usuario_creador', usuario_id).execute()
+        response = revalidar_proyecto(proyecto_id, usuario_id)
+        if response:
+            return response
         
-        if not resultado_proyecto.data:
-            return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
-        
-        # Obtener categorías del proyecto
-        resultado = supabase.table('categorias').select('*').eq('id_proyecto', proyecto_id).execute()
+        # Obtener categorías del proyecto y su versión; None si no es del usuario
+        resultado = repo.listar_categorias(proyecto_id, usuario_id)
         
-        categorias = []
-        if resultado.data:
-            for categoria in resultado.data:
-                categorias.append({
-                    'id_categoria': categoria['id_categoria'],
-                    'nombre': categoria['nombre'],
-                    'id_proyecto': categoria['id_proyecto']
-                })
+        if resultado is None:
+            return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
         
-        return jsonify({
-            'categorias': categorias
-        }), 200
+        version, resultado = resultado
+        return respuesta_categorias(version, resultado)
         
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # ========================== RUTAS DE TAREAS ==========================
 
 # Crear tarea
-@app.route('/tareas', methods=['POST', 'OPTIONS'])
+@api.route('/tareas', methods=['POST'])
+@presupuesto_viajes(4)
 @token_required
 def crear_tarea(usuario_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "POST,OPTIONS")
-        return response
-        
     try:
         datos = request.get_json()
         
-        if not datos or not datos.get('titulo') or not datos.get('id_proyecto') or not datos.get('nombre_categoria') or not datos.get('nombre_estatus'):
-            return jsonify({'error': 'Título, id_proyecto, nombre_categoria y nombre_estatus son requeridos'}), 400
-        
-        titulo = datos['titulo'].strip()
-        descripcion = datos.get('descripcion', '').strip()
-        id_proyecto = datos['id_proyecto']
-        nombre_categoria = datos['nombre_categoria'].strip()
-        nombre_estatus = datos['nombre_estatus'].strip()
-        prioridad = datos.get('prioridad', 3)
-        fecha_vencimiento = datos.get('fecha_vencimiento')
+        tarea, error = preparar_tarea_nueva(datos)
+        if error:
+            return jsonify({'error': error}), 400
         
-        if len(titulo) < 2:
-            return jsonify({'error': 'El título debe tener al menos 2 caracteres'}), 400
+        id_proyecto = tarea['id_proyecto']
+        nombre_categoria = tarea['nombre_categoria']
+        nombre_estatus = tarea['nombre_estatus']
         
         # Verificar que el proyecto existe y pertenece al usuario
-        resultado_proyecto = supabase.table('proyectos').select('id_proyecto').eq('id_proyecto', id_proyecto).eq('id_usuario_creador', usuario_id).execute()
-        
-        if not resultado_proyecto.data:
+        if not repo.obtener_proyecto(id_proyecto, usuario_id, 'id_proyecto'):
             return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
         
         # Buscar o crear categoría
-        resultado_categoria = supabase.table('categorias').select('id_categoria').eq('nombre', nombre_categoria).eq('id_proyecto', id_proyecto).execute()
-        
-        if not resultado_categoria.data:
-            # Crear categoría
-            nueva_categoria = {
-                'nombre': nombre_categoria,
-                'id_proyecto': id_proyecto
-            }
-            resultado_categoria = supabase.table('categorias').insert(nueva_categoria).execute()
-            if resultado_categoria.data:
-                id_categoria = resultado_categoria.data[0]['id_categoria']
-            else:
-                return jsonify({'error': 'Error al crear categoría'}), 500
-        else:
-            id_categoria = resultado_categoria.data[0]['id_categoria']
+        id_categoria = resolver_categoria(id_proyecto, nombre_categoria)
+        if id_categoria is None:
+            return jsonify({'error': 'Error al crear categoría'}), 500
         
         # Buscar o crear estatus
-        resultado_estatus = supabase.table('estatus').select('id_estatus').eq('nombre', nombre_estatus).execute()
-        
-        if not resultado_estatus.data:
-            # Crear estatus
-            nuevo_estatus = {
-                'nombre': nombre_estatus
-            }
-            resultado_estatus = supabase.table('estatus').insert(nuevo_estatus).execute()
-            if resultado_estatus.data:
-                id_estatus = resultado_estatus.data[0]['id_estatus']
-            else:
-                return jsonify({'error': 'Error al crear estatus'}), 500
-        else:
-            id_estatus = resultado_estatus.data[0]['id_estatus']
+        id_estatus = resolver_estatus(nombre_estatus)
+        if id_estatus is None:
+            return jsonify({'error': 'Error al crear estatus'}), 500
         
         # Crear tarea
         nueva_tarea = {
-            'titulo': titulo,
-            'descripcion': descripcion,
+            'titulo': tarea['titulo'],
+            'descripcion': tarea['descripcion'],
             'id_proyecto': id_proyecto,
             'id_categoria': id_categoria,
             'id_estatus': id_estatus,
-            'prioridad': prioridad,
-            'fecha_vencimiento': fecha_vencimiento
+            'prioridad': tarea['prioridad'],
+            'fecha_vencimiento': tarea['fecha_vencimiento']
         }
         
-        resultado = supabase.table('tareas').insert(nueva_tarea).execute()
+        tarea_creada = repo.crear_tarea(nueva_tarea)
+        invalidar_tableros(id_proyecto)
         
-        if resultado.data:
-            tarea_creada = resultado.data[0]
+        if tarea_creada:
             return jsonify({
                 'mensaje': 'Tarea creada exitosamente',
-                'tarea': {
-                    'id_tarea': tarea_creada['id_tarea'],
-                    'titulo': tarea_creada['titulo'],
-                    'descripcion': tarea_creada['descripcion'],
-                    'prioridad': tarea_creada['prioridad'],
-                    'fecha_creacion': tarea_creada['fecha_creacion'],
-                    'fecha_vencimiento': tarea_creada['fecha_vencimiento'],
-                    'categoria': nombre_categoria,
-                    'estatus': nombre_estatus,
-                    'id_proyecto': tarea_creada['id_proyecto'],
-                    'id_categoria': tarea_creada['id_categoria'],
-                    'id_estatus': tarea_creada['id_estatus']
-                }
+                'tarea': formatear_tarea(tarea_creada, nombre_categoria, nombre_estatus)
             }), 201
         else:
             return jsonify({'error': 'Error al crear tarea'}), 500
             
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # Listar tareas por proyecto
-@app.route('/proyectos/<int:proyecto_id>/tareas', methods=['GET', 'OPTIONS'])
+@api.route('/proyectos/<int:proyecto_id>/tareas', methods=['GET'])
+@presupuesto_viajes(2)
 @token_required
 def listar_tareas(usuario_id, proyecto_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "GET,OPTIONS")
-        return response
-        
     try:
-        # Verificar que el proyecto existe y pertenece al usuario
-        resultado_proyecto = supabase.table('proyectos').select('id_proyecto').eq('id_proyecto', proyecto_id).eq('id_usuario_creador', usuario_id).execute()
-        
-        if not resultado_proyecto.data:
+        campos, error = campos_solicitados(CAMPOS_RESPUESTA_TAREA)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        filtros, orden, error = parametros_filtro()
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Con orden propio se pagina por posición
+        limite, despues_de, error = parametros_paginacion('off' if orden else 'id', orden)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        desplazamiento = None
+        if orden:
+            desplazamiento, despues_de = despues_de or 0, None
+            if desplazamiento and not limite:
+                return jsonify({'error': 'Cursor inválido'}), 400
+        
+        response = revalidar_proyecto(proyecto_id, usuario_id)
+        if response:
+            return response
+        
+        # Obtener tareas con joins, filtradas y ordenadas en la base de datos
+        # (solo las columnas pedidas, una página más uno para saber si hay siguiente)
+        resultado = repo.listar_tareas(proyecto_id, usuario_id, columnas_tarea(campos), despues_de,
+                                       limite + 1 if limite else None, filtros, orden, desplazamiento)
+        
+        if resultado is None:
             return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
         
-        # Obtener tareas con joins
-        resultado = supabase.table('tareas').select('''
-            id_tarea,
-            titulo,
-            descripcion,
-            prioridad,
-            fecha_creacion,
-            fecha_vencimiento,
-            id_proyecto,
-            id_categoria,
-            id_estatus,
-            categorias!inner(nombre),
-            estatus!inner(nombre)
-        ''').eq('id_proyecto', proyecto_id).execute()
-        
-        tareas = []
-        if resultado.data:
-            for tarea in resultado.data:
-                tareas.append({
-                    'id_tarea': tarea['id_tarea'],
-                    'titulo': tarea['titulo'],
-                    'descripcion': tarea['descripcion'],
-                    'prioridad': tarea['prioridad'],
-                    'fecha_creacion': tarea['fecha_creacion'],
-                    'fecha_vencimiento': tarea['fecha_vencimiento'],
-                    'categoria': tarea['categorias']['nombre'],
-                    'estatus': tarea['estatus']['nombre'],
-                    'id_proyecto': tarea['id_proyecto'],
-                    'id_categoria': tarea['id_categoria'],
-                    'id_estatus': tarea['id_estatus']
-                })
+        version, resultado = resultado
+        return respuesta_tareas(version, resultado, campos, limite, desplazamiento, orden)
         
-        return jsonify({
-            'tareas': tareas
-        }), 200
+    except Exception as e:
+        return error_interno(e)
+
+# Buscar tareas del proyecto por título y descripción (?q=), de la más a la
+# menos relevante; admite ?fields=, ?limit= y ?cursor= como el listado
+@api.route('/proyectos/<int:proyecto_id>/tareas/buscar', methods=['GET'])
+@presupuesto_viajes(2)
+@token_required
+def buscar_tareas(usuario_id, proyecto_id):
+    try:
+        terminos = terminos_busqueda(request.args.get('q', ''))
+        if not terminos:
+            return jsonify({'error': 'El parámetro q es requerido'}), 400
+        if len(terminos) > MAX_TERMINOS:
+            return jsonify({'error': f'La búsqueda admite como máximo {MAX_TERMINOS} términos'}), 400
+        
+        campos, error = campos_solicitados(CAMPOS_RESPUESTA_TAREA)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        limite, desplazamiento, error = parametros_paginacion('off')
+        if error:
+            return jsonify({'error': error}), 400
+        limite = limite or current_app.config['SEARCH_PAGE_SIZE']
+        desplazamiento = desplazamiento or 0
+        
+        response = revalidar_proyecto(proyecto_id, usuario_id)
+        if response:
+            return response
+        
+        # Una página más uno para saber si hay siguiente
+        resultado = repo.buscar_tareas(proyecto_id, usuario_id, terminos, desplazamiento, limite + 1)
+        
+        if resultado is None:
+            return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
+        
+        version, resultado = resultado
+        return respuesta_busqueda(version, resultado, campos, desplazamiento, limite)
         
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # Actualizar tarea
-@app.route('/tareas/<int:tarea_id>', methods=['PUT', 'OPTIONS'])
+@api.route('/tareas/<int:tarea_id>', methods=['PUT'])
+@presupuesto_viajes(1)
 @token_required
 def actualizar_tarea(usuario_id, tarea_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "PUT,OPTIONS")
-        return response
-        
     try:
         datos = request.get_json()
         
         if not datos:
             return jsonify({'error': 'No se enviaron datos'}), 400
         
-        # Verificar que la tarea existe y pertenece a un proyecto del usuario
-        resultado_tarea = supabase.table('tareas').select('''
-            id_tarea,
-            id_proyecto,
-            id_categoria,
-            id_estatus,
-            proyectos!inner(id_usuario_creador)
-        ''').eq('id_tarea', tarea_id).execute()
-        
-        if not resultado_tarea.data:
-            return jsonify({'error': 'Tarea no encontrada'}), 404
-        
-        tarea = resultado_tarea.data[0]
-        
-        if tarea['proyectos']['id_usuario_creador'] != usuario_id:
-            return jsonify({'error': 'No autorizado'}), 403
-        
-        # Preparar datos para actualizar
-        datos_actualizacion = {}
-        
-        if 'titulo' in datos:
-            titulo = datos['titulo'].strip()
-            if len(titulo) < 2:
-                return jsonify({'error': 'El título debe tener al menos 2 caracteres'}), 400
-            datos_actualizacion['titulo'] = titulo
+        # Preparar datos para actualizar (la categoría se busca o crea dentro de la misma actualización)
+        datos_actualizacion, nombre_categoria, nombre_estatus, error = preparar_cambios_tarea(datos)
+        if error:
+            return jsonify({'error': error}), 400
         
-        if 'descripcion' in datos:
-            datos_actualizacion['descripcion'] = datos['descripcion'].strip()
+        # Usar el id del estatus en cache si lo hay; si no, se resuelve en la misma actualización
+        if nombre_estatus is not None:
+            id_estatus = cache_estatus.obtener(nombre_estatus)
+            if id_estatus is not None:
+                datos_actualizacion['id_estatus'] = id_estatus
+                nombre_estatus = None
         
-        if 'prioridad' in datos:
-            prioridad = datos['prioridad']
-            if prioridad not in [1, 2, 3, 4, 5]:
-                return jsonify({'error': 'La prioridad debe ser entre 1 y 5'}), 400
-            datos_actualizacion['prioridad'] = prioridad
+        # Verificar propietario, actualizar y obtener la tarea con joins en un solo viaje
+        codigo, tarea_actualizada = repo.actualizar_tarea_de_usuario(
+            tarea_id, usuario_id, datos_actualizacion, nombre_categoria, nombre_estatus)
         
-        if 'fecha_vencimiento' in datos:
-            datos_actualizacion['fecha_vencimiento'] = datos['fecha_vencimiento']
-        
-        if 'nombre_categoria' in datos:
-            nombre_categoria = datos['nombre_categoria'].strip()
-            # Buscar o crear categoría
-            resultado_categoria = supabase.table('categorias').select('id_categoria').eq('nombre', nombre_categoria).eq('id_proyecto', tarea['id_proyecto']).execute()
-            
-            if not resultado_categoria.data:
-                # Crear categoría
-                nueva_categoria = {
-                    'nombre': nombre_categoria,
-                    'id_proyecto': tarea['id_proyecto']
-                }
-                resultado_categoria = supabase.table('categorias').insert(nueva_categoria).execute()
-                if resultado_categoria.data:
-                    datos_actualizacion['id_categoria'] = resultado_categoria.data[0]['id_categoria']
-                else:
-                    return jsonify({'error': 'Error al crear categoría'}), 500
-            else:
-                datos_actualizacion['id_categoria'] = resultado_categoria.data[0]['id_categoria']
-        
-        if 'nombre_estatus' in datos:
-            nombre_estatus = datos['nombre_estatus'].strip()
-            # Buscar o crear estatus
-            resultado_estatus = supabase.table('estatus').select('id_estatus').eq('nombre', nombre_estatus).execute()
-            
-            if not resultado_estatus.data:
-                # Crear estatus
-                nuevo_estatus = {
-                    'nombre': nombre_estatus
-                }
-                resultado_estatus = supabase.table('estatus').insert(nuevo_estatus).execute()
-                if resultado_estatus.data:
-                    datos_actualizacion['id_estatus'] = resultado_estatus.data[0]['id_estatus']
-                else:
-                    return jsonify({'error': 'Error al crear estatus'}), 500
-            else:
-                datos_actualizacion['id_estatus'] = resultado_estatus.data[0]['id_estatus']
+        if codigo == 'no_encontrada':
+            return jsonify({'error': 'Tarea no encontrada'}), 404
         
-        if not datos_actualizacion:
-            return jsonify({'error': 'No se enviaron datos válidos para actualizar'}), 400
+        if codigo == 'no_autorizado':
+            return jsonify({'error': 'No autorizado'}), 403
         
-        # Actualizar tarea
-        resultado = supabase.table('tareas').update(datos_actualizacion).eq('id_tarea', tarea_id).execute()
-        
-        if resultado.data:
-            # Obtener tarea actualizada con joins
-            resultado_actualizada = supabase.table('tareas').select('''
-                id_tarea,
-                titulo,
-                descripcion,
-                prioridad,
-                fecha_creacion,
-                fecha_vencimiento,
-                id_proyecto,
-                id_categoria,
-                id_estatus,
-                categorias!inner(nombre),
-                estatus!inner(nombre)
-            ''').eq('id_tarea', tarea_id).execute()
-            
-            if resultado_actualizada.data:
-                tarea_actualizada = resultado_actualizada.data[0]
-                return jsonify({
-                    'mensaje': 'Tarea actualizada exitosamente',
-                    'tarea': {
-                        'id_tarea': tarea_actualizada['id_tarea'],
-                        'titulo': tarea_actualizada['titulo'],
-                        'descripcion': tarea_actualizada['descripcion'],
-                        'prioridad': tarea_actualizada['prioridad'],
-                        'fecha_creacion': tarea_actualizada['fecha_creacion'],
-                        'fecha_vencimiento': tarea_actualizada['fecha_vencimiento'],
-                        'categoria': tarea_actualizada['categorias']['nombre'],
-                        'estatus': tarea_actualizada['estatus']['nombre'],
-                        'id_proyecto': tarea_actualizada['id_proyecto'],
-                        'id_categoria': tarea_actualizada['id_categoria'],
-                        'id_estatus': tarea_actualizada['id_estatus']
-                    }
-                }), 200
-            else:
-                return jsonify({'error': 'Error al obtener tarea actualizada'}), 500
+        if tarea_actualizada:
+            invalidar_tableros(tarea_actualizada['id_proyecto'])
+            cache_categorias.guardar((tarea_actualizada['id_proyecto'], tarea_actualizada['categorias']['nombre']), tarea_actualizada['id_categoria'])
+            cache_estatus.guardar(tarea_actualizada['estatus']['nombre'], tarea_actualizada['id_estatus'])
+            return jsonify({
+                'mensaje': 'Tarea actualizada exitosamente',
+                'tarea': formatear_tarea(tarea_actualizada)
+            }), 200
         else:
             return jsonify({'error': 'Error al actualizar tarea'}), 500
             
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
 # Eliminar tarea
-@app.route('/tareas/<int:tarea_id>', methods=['DELETE', 'OPTIONS'])
+@api.route('/tareas/<int:tarea_id>', methods=['DELETE'])
+@presupuesto_viajes(2)
 @token_required
 def eliminar_tarea(usuario_id, tarea_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "DELETE,OPTIONS")
-        return response
-        
     try:
         # Verificar que la tarea existe y pertenece a un proyecto del usuario
-        resultado_tarea = supabase.table('tareas').select('''
-            id_tarea,
-            proyectos!inner(id_usuario_creador)
-        ''').eq('id_tarea', tarea_id).execute()
+        tarea = repo.obtener_tarea_con_propietario(tarea_id)
         
-        if not resultado_tarea.data:
+        if not tarea:
             return jsonify({'error': 'Tarea no encontrada'}), 404
         
-        tarea = resultado_tarea.data[0]
-        
         if tarea['proyectos']['id_usuario_creador'] != usuario_id:
             return jsonify({'error': 'No autorizado'}), 403
         
         # Eliminar tarea
-        resultado = supabase.table('tareas').delete().eq('id_tarea', tarea_id).execute()
+        tarea_eliminada = repo.eliminar_tarea(tarea_id)
+        invalidar_tableros(tarea['id_proyecto'])
         
-        if resultado.data:
+        if tarea_eliminada:
             return jsonify({
                 'mensaje': 'Tarea eliminada exitosamente'
             }), 200
@@ -895,150 +1773,304 @@ def eliminar_tarea(usuario_id, tarea_id):
             return jsonify({'error': 'Error al eliminar tarea'}), 500
             
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
 
-# ========================== RUTA DEL TABLERO ==========================
+# ========================== RUTAS DE TAREAS EN LOTE ==========================
 
-# Obtener tablero completo de un proyecto
-@app.route('/proyectos/<int:proyecto_id>/tablero', methods=['GET', 'OPTIONS'])
+# Crear tareas en lote
+@api.route('/tareas/bulk', methods=['POST'])
+@presupuesto_viajes(4)
 @token_required
-def obtener_tablero(usuario_id, proyecto_id):
-    if request.method == 'OPTIONS':
-        response = jsonify()
-        response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-        response.headers.add("Access-Control-Allow-Methods", "GET,OPTIONS")
-        return response
-        
+def crear_tareas_lote(usuario_id):
     try:
-        # Verificar que el proyecto existe y pertenece al usuario
-        resultado_proyecto = supabase.table('proyectos').select('*').eq('id_proyecto', proyecto_id).eq('id_usuario_creador', usuario_id).execute()
+        datos = request.get_json()
+        lista = datos.get('tareas') if isinstance(datos, dict) else None
         
-        if not resultado_proyecto.data:
-            return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
+        if not isinstance(lista, list) or not lista:
+            return jsonify({'error': 'Se requiere una lista de tareas'}), 400
         
-        proyecto = resultado_proyecto.data[0]
-        
-        # Obtener todas las tareas del proyecto con joins
-        resultado_tareas = supabase.table('tareas').select('''
-            id_tarea,
-            titulo,
-            descripcion,
-            prioridad,
-            fecha_creacion,
-            fecha_vencimiento,
-            id_proyecto,
-            id_categoria,
-            id_estatus,
-            categorias!inner(nombre),
-            estatus!inner(nombre)
-        ''').eq('id_proyecto', proyecto_id).execute()
-        
-        # Organizar tareas por categoría (estatus)
-        categorias_tablero = {
-            'To Do': [],
-            'In Progress': [],
-            'Hot Fix': [],
-            'Done': []
-        }
+        if len(lista) > current_app.config['BULK_MAX_TAREAS']:
+            return jsonify({'error': f"Se permiten como máximo {current_app.config['BULK_MAX_TAREAS']} tareas por lote"}), 400
         
-        # Contadores para resumen
-        total_tareas = 0
-        por_categoria = {
-            'To Do': 0,
-            'In Progress': 0,
-            'Hot Fix': 0,
-            'Done': 0
-        }
-        por_prioridad = {
-            '1': 0,
-            '2': 0,
-            '3': 0,
-            '4': 0,
-            '5': 0
-        }
+        # Validar todo el lote antes de escribir
+        resultados = [None] * len(lista)
+        validas = []
+        for indice, item in enumerate(lista):
+            tarea, error = preparar_tarea_nueva(item)
+            if error:
+                resultados[indice] = {'indice': indice, 'estado': 400, 'error': error}
+            else:
+                validas.append((indice, tarea))
+        
+        # Verificar una sola vez la propiedad de cada proyecto
+        proyectos_propios = repo.proyectos_de_usuario({tarea['id_proyecto'] for _, tarea in validas}, usuario_id) if validas else set()
+        autorizadas = []
+        for indice, tarea in validas:
+            if tarea['id_proyecto'] in proyectos_propios:
+                autorizadas.append((indice, tarea))
+            else:
+                resultados[indice] = {'indice': indice, 'estado': 404, 'error': 'Proyecto no encontrado o no autorizado'}
         
-        if resultado_tareas.data:
-            for tarea in resultado_tareas.data:
-                total_tareas += 1
-                
-                tarea_formateada = {
-                    'id_tarea': tarea['id_tarea'],
-                    'titulo': tarea['titulo'],
-                    'descripcion': tarea['descripcion'],
-                    'prioridad': tarea['prioridad'],
-                    'fecha_creacion': tarea['fecha_creacion'],
-                    'fecha_vencimiento': tarea['fecha_vencimiento'],
-                    'categoria': tarea['categorias']['nombre'],
-                    'estatus': tarea['estatus']['nombre'],
-                    'id_proyecto': tarea['id_proyecto'],
-                    'id_categoria': tarea['id_categoria'],
-                    'id_estatus': tarea['id_estatus']
-                }
-                
-                estatus = tarea['estatus']['nombre']
-                
-                # Agregar a la categoría correspondiente
-                if estatus in categorias_tablero:
-                    categorias_tablero[estatus].append(tarea_formateada)
-                    por_categoria[estatus] += 1
+        if autorizadas:
+            # Resolver categorías y estatus de todo el lote
+            categorias, estatus = resolver_nombres_en_lote(
+                [(tarea['id_proyecto'], tarea['nombre_categoria']) for _, tarea in autorizadas],
+                [tarea['nombre_estatus'] for _, tarea in autorizadas])
+            
+            # Insertar todas las tareas con una sola sentencia
+            nuevas_tareas = [{
+                'titulo': tarea['titulo'],
+                'descripcion': tarea['descripcion'],
+                'id_proyecto': tarea['id_proyecto'],
+                'id_categoria': categorias[(tarea['id_proyecto'], tarea['nombre_categoria'])],
+                'id_estatus': estatus[tarea['nombre_estatus']],
+                'prioridad': tarea['prioridad'],
+                'fecha_vencimiento': tarea['fecha_vencimiento']
+            } for _, tarea in autorizadas]
+            
+            tareas_creadas = repo.crear_tareas(nuevas_tareas)
+            invalidar_tableros(*{tarea['id_proyecto'] for _, tarea in autorizadas})
+            
+            # La inserción ya está confirmada: cada tarea se informa con la fila
+            # devuelta y las que no vuelven quedan como aceptadas (202), para que
+            # el cliente consulte el proyecto en lugar de reintentar el lote
+            for posicion, (indice, tarea) in enumerate(autorizadas):
+                if posicion < len(tareas_creadas):
+                    resultados[indice] = {
+                        'indice': indice,
+                        'estado': 201,
+                        'tarea': formatear_tarea(tareas_creadas[posicion], tarea['nombre_categoria'], tarea['nombre_estatus'])
+                    }
                 else:
-                    # Si el estatus no está en las categorías por defecto, agregarlo a "To Do"
-                    categorias_tablero['To Do'].append(tarea_formateada)
-                    por_categoria['To Do'] += 1
-                
-                # Contar por prioridad
-                prioridad_str = str(tarea['prioridad'])
-                if prioridad_str in por_prioridad:
-                    por_prioridad[prioridad_str] += 1
-        
-        # Construir respuesta del tablero
-        tablero = {
-            'proyecto': {
-                'id_proyecto': proyecto['id_proyecto'],
-                'nombre': proyecto['nombre'],
-                'id_grupo': proyecto['id_grupo'],
-                'id_usuario_creador': proyecto['id_usuario_creador'],
-                'fecha_creacion': proyecto['fecha_creacion']
-            },
-            'categorias': categorias_tablero,
-            'resumen': {
-                'total_tareas': total_tareas,
-                'por_categoria': por_categoria,
-                'por_prioridad': por_prioridad
-            }
-        }
+                    resultados[indice] = {'indice': indice, 'estado': 202, 'error': 'Tarea enviada sin confirmación del backend'}
         
-        return jsonify(tablero), 200
+        creadas = sum(1 for resultado in resultados if resultado['estado'] == 201)
+        return jsonify({
+            'mensaje': 'Lote de tareas procesado',
+            'creadas': creadas,
+            'fallidas': sum(1 for resultado in resultados if resultado['estado'] >= 400),
+            'resultados': resultados
+        }), 200
         
     except Exception as e:
-        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+        return error_interno(e)
+
+# Actualizar (o mover) tareas en lote
+@api.route('/tareas/bulk', methods=['PUT'])
+@presupuesto_viajes(4)
+@token_required
+def actualizar_tareas_lote(usuario_id):
+    try:
+        datos = request.get_json()
+        lista = datos.get('tareas') if isinstance(datos, dict) else None
+        
+        if not isinstance(lista, list) or not lista:
+            return jsonify({'error': 'Se requiere una lista de tareas'}), 400
+        
+        if len(lista) > current_app.config['BULK_MAX_TAREAS']:
+            return jsonify({'error': f"Se permiten como máximo {current_app.config['BULK_MAX_TAREAS']} tareas por lote"}), 400
+        
+        # Validar todo el lote antes de escribir
+        resultados = [None] * len(lista)
+        validas = []
+        vistas = set()
+        for indice, item in enumerate(lista):
+            tarea_id = item.get('id_tarea') if isinstance(item, dict) else None
+            if not es_entero(tarea_id):
+                resultados[indice] = {'indice': indice, 'estado': 400, 'error': 'id_tarea es requerido'}
+                continue
+            if tarea_id in vistas:
+                resultados[indice] = {'indice': indice, 'id_tarea': tarea_id, 'estado': 400, 'error': 'Tarea repetida en el lote'}
+                continue
+            vistas.add(tarea_id)
+            cambios, nombre_categoria, nombre_estatus, error = preparar_cambios_tarea(item)
+            if error:
+                resultados[indice] = {'indice': indice, 'id_tarea': tarea_id, 'estado': 400, 'error': error}
+            else:
+                validas.append((indice, tarea_id, cambios, nombre_categoria, nombre_estatus))
+        
+        # Verificar la propiedad de todas las tareas con una sola consulta
+        propietarios = {}
+        if validas:
+            for fila in repo.tareas_con_propietario([tarea_id for _, tarea_id, _, _, _ in validas]):
+                propietarios[fila['id_tarea']] = fila
+        
+        autorizadas = []
+        for indice, tarea_id, cambios, nombre_categoria, nombre_estatus in validas:
+            fila = propietarios.get(tarea_id)
+            if fila is None:
+                resultados[indice] = {'indice': indice, 'id_tarea': tarea_id, 'estado': 404, 'error': 'Tarea no encontrada'}
+            elif fila['proyectos']['id_usuario_creador'] != usuario_id:
+                resultados[indice] = {'indice': indice, 'id_tarea': tarea_id, 'estado': 403, 'error': 'No autorizado'}
+            else:
+                autorizadas.append((indice, tarea_id, fila['id_proyecto'], cambios, nombre_categoria, nombre_estatus))
+        
+        actualizadas = 0
+        if autorizadas:
+            # Resolver categorías y estatus de todo el lote
+            categorias, estatus = resolver_nombres_en_lote(
+                [(id_proyecto, nombre) for _, _, id_proyecto, _, nombre, _ in autorizadas if nombre is not None],
+                [nombre for _, _, _, _, _, nombre in autorizadas if nombre is not None])
+            
+            lote = []
+            for _, tarea_id, id_proyecto, cambios, nombre_categoria, nombre_estatus in autorizadas:
+                cambios = dict(cambios, id_tarea=tarea_id)
+                if nombre_categoria is not None:
+                    cambios['id_categoria'] = categorias[(id_proyecto, nombre_categoria)]
+                if nombre_estatus is not None:
+                    cambios['id_estatus'] = estatus[nombre_estatus]
+                lote.append(cambios)
+            
+            # Aplicar todos los cambios con una sola sentencia
+            tareas_actualizadas = {tarea['id_tarea']: tarea for tarea in repo.actualizar_tareas(lote)}
+            invalidar_tableros(*{id_proyecto for _, _, id_proyecto, _, _, _ in autorizadas})
+            
+            for indice, tarea_id, _, _, _, _ in autorizadas:
+                tarea = tareas_actualizadas.get(tarea_id)
+                if tarea is None:
+                    resultados[indice] = {'indice': indice, 'id_tarea': tarea_id, 'estado': 500, 'error': 'Error al actualizar tarea'}
+                else:
+                    actualizadas += 1
+                    resultados[indice] = {'indice': indice, 'id_tarea': tarea_id, 'estado': 200, 'tarea': formatear_tarea(tarea)}
+        
+        return jsonify({
+            'mensaje': 'Lote de tareas procesado',
+            'actualizadas': actualizadas,
+            'fallidas': len(lista) - actualizadas,
+            'resultados': resultados
+        }), 200
+        
+    except Exception as e:
+        return error_interno(e)
+
+# Eliminar tareas en lote
+@api.route('/tareas/bulk', methods=['DELETE'])
+@presupuesto_viajes(2)
+@token_required
+def eliminar_tareas_lote(usuario_id):
+    try:
+        datos = request.get_json(silent=True)
+        tarea_ids, error = ids_de_lote(datos.get('ids') if isinstance(datos, dict) else None)
+        
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Verificar la propiedad de todas las tareas con una sola consulta
+        propietarios = {fila['id_tarea']: fila for fila in repo.tareas_con_propietario(set(tarea_ids))}
+        
+        resultados = []
+        autorizadas = []
+        vistas = set()
+        for indice, tarea_id in enumerate(tarea_ids):
+            fila = propietarios.get(tarea_id)
+            if tarea_id in vistas:
+                resultados.append({'indice': indice, 'id_tarea': tarea_id, 'estado': 400, 'error': 'Tarea repetida en el lote'})
+                continue
+            vistas.add(tarea_id)
+            if fila is None:
+                resultados.append({'indice': indice, 'id_tarea': tarea_id, 'estado': 404, 'error': 'Tarea no encontrada'})
+            elif fila['proyectos']['id_usuario_creador'] != usuario_id:
+                resultados.append({'indice': indice, 'id_tarea': tarea_id, 'estado': 403, 'error': 'No autorizado'})
+            else:
+                resultados.append(None)
+                autorizadas.append((indice, tarea_id))
+        
+        # Eliminar todas las tareas autorizadas con una sola sentencia
+        eliminadas = set()
+        if autorizadas:
+            eliminadas = {tarea['id_tarea'] for tarea in repo.eliminar_tareas({tarea_id for _, tarea_id in autorizadas})}
+            invalidar_tableros(*{propietarios[tarea_id]['id_proyecto'] for _, tarea_id in autorizadas})
+        
+        for indice, tarea_id in autorizadas:
+            if tarea_id in eliminadas:
+                resultados[indice] = {'indice': indice, 'id_tarea': tarea_id, 'estado': 200}
+            else:
+                resultados[indice] = {'indice': indice, 'id_tarea': tarea_id, 'estado': 404, 'error': 'Tarea no encontrada'}
+        
+        total_eliminadas = sum(1 for resultado in resultados if resultado['estado'] == 200)
+        return jsonify({
+            'mensaje': 'Lote de tareas procesado',
+            'eliminadas': total_eliminadas,
+            'fallidas': len(tarea_ids) - total_eliminadas,
+            'resultados': resultados
+        }), 200
+        
+    except Exception as e:
+        return error_interno(e)
+
+# ========================== RUTA DEL TABLERO ==========================
+
+# Obtener tablero completo de un proyecto
+@api.route('/proyectos/<int:proyecto_id>/tablero', methods=['GET'])
+@presupuesto_viajes(2)
+@token_required
+def obtener_tablero(usuario_id, proyecto_id):
+    try:
+        filtros, orden, error = parametros_filtro()
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # El snapshot solo guarda el tablero completo; las vistas filtradas u
+        # ordenadas se revalidan con If-None-Match pero no se cachean
+        filtrado = bool(filtros or orden)
+        
+        # Con snapshot o If-None-Match basta con comprobar la versión del proyecto
+        snapshot = None if filtrado else cache_tableros.obtener(proyecto_id)
+        if snapshot or request.if_none_match:
+            version = repo.version_proyecto(proyecto_id, usuario_id)
+            
+            if version is None:
+                return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
+            
+            response = tablero_vigente(version, snapshot)
+            if response:
+                return response
+        
+        # Obtener el proyecto y sus tareas con joins; None si no es del usuario
+        resultado = repo.obtener_tablero(proyecto_id, usuario_id, filtros, orden)
+        
+        if resultado is None:
+            return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
+        
+        proyecto, resultado_tareas = resultado
+        return respuesta_tablero(proyecto, resultado_tareas, guardar=not filtrado)
+        
+    except Exception as e:
+        return error_interno(e)
 
 # ========================== MANEJO DE ERRORES ==========================
 
 # Manejo de errores mejorado
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     response = jsonify({'error': 'Ruta no encontrada'})
-    response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
     return response, 404
 
-@app.errorhandler(405)
+@api.app_errorhandler(405)
 def method_not_allowed(error):
     response = jsonify({'error': 'Método no permitido'})
-    response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
     return response, 405
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     response = jsonify({'error': 'Error interno del servidor'})
-    response.headers.add("Access-Control-Allow-Origin", "http://localhost:4200")
     return response, 500
 
 # ========================== RUTA DE SALUD ==========================
 
+# Métricas para Prometheus (formato de texto 0.0.4)
+@api.route('/metrics', methods=['GET'])
+@presupuesto_viajes(0)
+def metrics():
+    token = current_app.config['METRICS_TOKEN']
+    # Comparar bytes: compare_digest no admite str con caracteres no ASCII
+    if token and not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return jsonify({'error': 'No autorizado'}), 401
+    return current_app.response_class(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Ruta de salud del servidor
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
+@presupuesto_viajes(0)
 def health():
     return jsonify({
         'status': 'ok',
@@ -1047,4 +2079,4 @@ def health():
     }), 200
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
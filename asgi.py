@@ -0,0 +1,252 @@
+import asyncio
+import io
+import re
+import sys
+
+import app as aplicacion
+from flask import jsonify, request
+from metricas import ObservadorPool
+from repositorio import crear_repositorio_asincrono
+from resiliencia import no_disponible
+
+# Modo de servicio ASGI (p. ej. uvicorn asgi:asgi_app --workers 2).
+# Las lecturas por proyecto (tablero, tareas, categorías) se atienden con
+# corrutinas sobre el cliente asíncrono de Supabase, de modo que un solo worker
+# mantiene cientos de peticiones esperando E/S; el resto de rutas se delegan a
+# la aplicación Flask a través de asgiref (WsgiToAsgi).
+
+# Ejecutar la vista a la vez que la verificación del usuario (si el token la
+# requiere): ambas dependen solo del token firmado y son de solo lectura
+async def autenticado(repo, vista, **kwargs):
+    data, error = aplicacion.datos_de_token()
+    if error:
+        return error
+    usuario_id = data['usuario_id']
+
+    if not aplicacion.requiere_comprobar_usuario(data):
+        return await vista(repo, usuario_id, **kwargs)
+
+    try:
+        existe, respuesta = await asyncio.gather(repo.usuario_existe(usuario_id), vista(repo, usuario_id, **kwargs))
+    except Exception as e:
+        if no_disponible(e):
+            return aplicacion.error_interno(e)
+        return jsonify({'error': 'Error al validar token'}), 401
+
+    if not existe:
+        return jsonify({'error': 'Usuario no encontrado'}), 401
+    aplicacion.cache_usuarios.guardar(usuario_id, True)
+    return respuesta
+
+
+# ========================== VISTAS ASÍNCRONAS ==========================
+# Mismo comportamiento que las rutas equivalentes de app.py
+
+# Respuesta 304 si el cliente ya tiene la versión actual (solo con If-None-Match)
+async def revalidar_proyecto(repo, proyecto_id, usuario_id):
+    if not request.if_none_match:
+        return None
+    version = await repo.version_proyecto(proyecto_id, usuario_id)
+    if version is None:
+        return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
+    return aplicacion.no_modificado(aplicacion.etag_proyecto(version))
+
+
+async def listar_categorias(repo, usuario_id, proyecto_id):
+    try:
+        response = await revalidar_proyecto(repo, proyecto_id, usuario_id)
+        if response:
+            return response
+
+        resultado = await repo.listar_categorias(proyecto_id, usuario_id)
+
+        if resultado is None:
+            return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
+
+        version, resultado = resultado
+        return aplicacion.respuesta_categorias(version, resultado)
+
+    except Exception as e:
+        return aplicacion.error_interno(e)
+
+
+async def listar_tareas(repo, usuario_id, proyecto_id):
+    try:
+        campos, error = aplicacion.campos_solicitados(aplicacion.CAMPOS_RESPUESTA_TAREA)
+        if error:
+            return jsonify({'error': error}), 400
+
+        filtros, orden, error = aplicacion.parametros_filtro()
+        if error:
+            return jsonify({'error': error}), 400
+
+        limite, despues_de, error = aplicacion.parametros_paginacion('off' if orden else 'id', orden)
+        if error:
+            return jsonify({'error': error}), 400
+
+        desplazamiento = None
+        if orden:
+            desplazamiento, despues_de = despues_de or 0, None
+            if desplazamiento and not limite:
+                return jsonify({'error': 'Cursor inválido'}), 400
+
+        response = await revalidar_proyecto(repo, proyecto_id, usuario_id)
+        if response:
+            return response
+
+        resultado = await repo.listar_tareas(proyecto_id, usuario_id, aplicacion.columnas_tarea(campos), despues_de,
+                                             limite + 1 if limite else None, filtros, orden, desplazamiento)
+
+        if resultado is None:
+            return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
+
+        version, resultado = resultado
+        return aplicacion.respuesta_tareas(version, resultado, campos, limite, desplazamiento, orden)
+
+    except Exception as e:
+        return aplicacion.error_interno(e)
+
+
+async def obtener_tablero(repo, usuario_id, proyecto_id):
+    try:
+        filtros, orden, error = aplicacion.parametros_filtro()
+        if error:
+            return jsonify({'error': error}), 400
+        filtrado = bool(filtros or orden)
+
+        # Con snapshot o If-None-Match basta con comprobar la versión del proyecto
+        snapshot = None if filtrado else aplicacion.cache_tableros.obtener(proyecto_id)
+        if snapshot or request.if_none_match:
+            version = await repo.version_proyecto(proyecto_id, usuario_id)
+
+            if version is None:
+                return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
+
+            response = aplicacion.tablero_vigente(version, snapshot)
+            if response:
+                return response
+
+        resultado = await repo.obtener_tablero(proyecto_id, usuario_id, filtros, orden)
+
+        if resultado is None:
+            return jsonify({'error': 'Proyecto no encontrado o no autorizado'}), 404
+
+        proyecto, resultado_tareas = resultado
+        return aplicacion.respuesta_tablero(proyecto, resultado_tareas, guardar=not filtrado)
+
+    except Exception as e:
+        return aplicacion.error_interno(e)
+
+
+RUTAS_ASINCRONAS = [
+    (re.compile(r'^/proyectos/(\d+)/categorias$'), listar_categorias),
+    (re.compile(r'^/proyectos/(\d+)/tareas$'), listar_tareas),
+    (re.compile(r'^/proyectos/(\d+)/tablero$'), obtener_tablero)
+]
+
+
+# ========================== ADAPTADOR ASGI ==========================
+
+# Entorno WSGI de una petición ASGI sin cuerpo, para el contexto de Flask
+def entorno_wsgi(scope):
+    servidor = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for nombre, valor in scope.get('headers', []):
+        nombre = nombre.decode('latin1').upper().replace('-', '_')
+        if nombre not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            nombre = f'HTTP_{nombre}'
+        valor = valor.decode('latin1')
+        environ[nombre] = f'{environ[nombre]},{valor}' if nombre in environ else valor
+    return environ
+
+
+class AplicacionASGI:
+    def __init__(self, app):
+        self.app = app
+        self._wsgi = None
+        self.repo_asincrono = None
+        self._lock_repo = None
+
+    # Repositorio asíncrono de esta aplicación, creado una vez dentro del bucle
+    # de eventos y conectado a sus métricas y su política de resiliencia
+    async def obtener_repo_asincrono(self):
+        if self.repo_asincrono is None:
+            if self._lock_repo is None:
+                self._lock_repo = asyncio.Lock()
+            async with self._lock_repo:
+                if self.repo_asincrono is None:
+                    config = self.app.config
+                    estado = aplicacion.estado(self.app)
+                    self.repo_asincrono = estado.conectar(await crear_repositorio_asincrono(
+                        config['DATA_BACKEND'], config['DATABASE_URL'], config['DATABASE_KEY'], repo=estado.repo,
+                        conexiones=config['SUPABASE_POOL'], observador_pool=ObservadorPool(estado.metricas, 'asincrono')))
+        return self.repo_asincrono
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._ciclo_de_vida(receive, send)
+
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            for patron, vista in RUTAS_ASINCRONAS:
+                coincidencia = patron.match(scope['path'])
+                if coincidencia:
+                    return await self._servir(scope, send, vista, int(coincidencia.group(1)))
+
+        await self._aplicacion_wsgi()(scope, receive, send)
+
+    # El adaptador WSGI solo se carga si llega alguna ruta no asíncrona
+    def _aplicacion_wsgi(self):
+        if self._wsgi is None:
+            from asgiref.wsgi import WsgiToAsgi
+            self._wsgi = WsgiToAsgi(self.app)
+        return self._wsgi
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                try:
+                    await self.obtener_repo_asincrono()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # Atender la vista dentro de un contexto de petición de Flask para reutilizar
+    # los hooks (before/after_request, CORS) y los helpers de app.py
+    async def _servir(self, scope, send, vista, proyecto_id):
+        with self.app.request_context(entorno_wsgi(scope)):
+            response = self.app.preprocess_request()
+            if response is None:
+                response = await autenticado(await self.obtener_repo_asincrono(), vista, proyecto_id=proyecto_id)
+            response = self.app.process_response(self.app.make_response(response))
+            cuerpo = response.get_data()
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(nombre.lower().encode('latin1'), valor.encode('latin1')) for nombre, valor in response.headers.items()]
+        })
+        await send({'type': 'http.response.body', 'body': cuerpo})
+
+
+asgi_app = AplicacionASGI(aplicacion.app)
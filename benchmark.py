@@ -0,0 +1,439 @@
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DATA_BACKEND', 'memoria')
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-no-usar-en-produccion')
+# Las rutas que superan su presupuesto de viajes o repiten consultas responden 500
+os.environ.setdefault('ROUNDTRIP_BUDGETS', 'enforce')
+
+import app as aplicacion
+from repositorio import RepositorioMemoria, RepositorioMemoriaAsincrono
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# Benchmark de carga y latencia de las rutas principales contra el backend en
+# memoria. Uso: python benchmark.py --tamanos 10,1000,50000 --latencia 0.002
+# En modo asgi solo las rutas asíncronas (tareas, tareas_filtro, tablero) funcionan sin asgiref.
+
+EMAIL = 'benchmark@example.com'
+CONTRASENA = 'benchmark123'
+ESTATUS = ['To Do', 'In Progress', 'Hot Fix', 'Done']
+RUTAS = ['login', 'proyectos', 'tareas', 'tareas_filtro', 'buscar', 'tablero', 'tablero_frio', 'tablero_304',
+         'crear_proyecto', 'crear_tarea', 'crear_lote', 'mover_tarea']
+# Se miden después de las lecturas y escriben en un proyecto aparte, para que
+# cada fila de lecturas mida el proyecto del tamaño que indica
+RUTAS_ESCRITURA = ('crear_proyecto', 'crear_tarea', 'crear_lote', 'mover_tarea')
+TAREAS_POR_LOTE = 100
+
+
+# ========================== DATOS DE PRUEBA ==========================
+
+# Crear un usuario con un proyecto de 'n_tareas' tareas para las lecturas y
+# otro con una sola tarea para las escrituras; devuelve
+# {'lectura': id_proyecto, 'escritura': id_proyecto, 'tarea': id_tarea}
+def sembrar(repo, n_tareas):
+    from werkzeug.security import generate_password_hash
+
+    usuario = repo.crear_usuario({
+        'nombre': 'Benchmark',
+        'email': EMAIL,
+        'contrasena': generate_password_hash(CONTRASENA),
+        'es_admin': False,
+        'id_grupo': 1,
+        'id_usuario_creador': 1
+    })
+    proyecto = repo.crear_proyecto({
+        'nombre': f'Proyecto {n_tareas}',
+        'id_grupo': 1,
+        'id_usuario_creador': usuario['id_usuario']
+    })
+    categorias = [repo.crear_categoria({'nombre': nombre, 'id_proyecto': proyecto['id_proyecto']}) for nombre in ESTATUS]
+    estatus = [repo.crear_estatus({'nombre': nombre}) for nombre in ESTATUS]
+
+    for i in range(n_tareas):
+        repo.crear_tarea({
+            'titulo': f'Tarea {i}',
+            'descripcion': f'Descripción de la tarea número {i} del benchmark',
+            'id_proyecto': proyecto['id_proyecto'],
+            'id_categoria': categorias[i % 4]['id_categoria'],
+            'id_estatus': estatus[i % 4]['id_estatus'],
+            'prioridad': i % 5 + 1,
+            'fecha_vencimiento': None
+        })
+
+    escritura = repo.crear_proyecto({
+        'nombre': 'Proyecto escrituras',
+        'id_grupo': 1,
+        'id_usuario_creador': usuario['id_usuario']
+    })
+    tarea = repo.crear_tarea({
+        'titulo': 'Tarea a mover',
+        'descripcion': '',
+        'id_proyecto': escritura['id_proyecto'],
+        'id_categoria': repo.crear_categoria({'nombre': ESTATUS[0], 'id_proyecto': escritura['id_proyecto']})['id_categoria'],
+        'id_estatus': estatus[0]['id_estatus'],
+        'prioridad': 3,
+        'fecha_vencimiento': None
+    })
+    return {'lectura': proyecto['id_proyecto'], 'escritura': escritura['id_proyecto'], 'tarea': tarea['id_tarea']}
+
+
+# Aplicación nueva (caches vacías, circuito cerrado) sobre un repositorio recién sembrado
+def preparar_app(repo):
+    return aplicacion.create_app(repositorio=repo)
+
+
+# Peticiones que ejecuta cada ruta del benchmark: (método, ruta, cuerpo, autenticada)
+def peticion(ruta, ids):
+    proyecto_id = ids['lectura']
+    if ruta == 'login':
+        return 'POST', '/login', {'email': EMAIL, 'contrasena': CONTRASENA}, False
+    if ruta == 'proyectos':
+        return 'GET', '/proyectos', None, True
+    if ruta == 'crear_proyecto':
+        return 'POST', '/proyectos', {'nombre': 'Proyecto benchmark'}, True
+    if ruta == 'crear_tarea':
+        return 'POST', '/tareas', {
+            'titulo': 'Tarea benchmark',
+            'id_proyecto': ids['escritura'],
+            'nombre_categoria': 'To Do',
+            'nombre_estatus': 'To Do'
+        }, True
+    if ruta == 'crear_lote':
+        return 'POST', '/tareas/bulk', {'tareas': [{
+            'titulo': f'Tarea lote {i}',
+            'id_proyecto': ids['escritura'],
+            'nombre_categoria': ESTATUS[i % 4],
+            'nombre_estatus': ESTATUS[i % 4]
+        } for i in range(TAREAS_POR_LOTE)]}, True
+    if ruta == 'mover_tarea':
+        return 'PUT', f"/tareas/{ids['tarea']}", {'nombre_categoria': 'Done', 'nombre_estatus': 'Done'}, True
+    if ruta == 'tareas':
+        return 'GET', f'/proyectos/{proyecto_id}/tareas', None, True
+    if ruta == 'tareas_filtro':
+        return 'GET', f'/proyectos/{proyecto_id}/tareas?prioridad_min=5&sort=-fecha_creacion&limit=50', None, True
+    if ruta == 'buscar':
+        return 'GET', f'/proyectos/{proyecto_id}/tareas/buscar?q=tarea+numero+1', None, True
+    if ruta in ('tablero', 'tablero_frio', 'tablero_304'):
+        return 'GET', f'/proyectos/{proyecto_id}/tablero', None, True
+    raise ValueError(f'Ruta desconocida: {ruta}')
+
+
+# ========================== CLIENTES ==========================
+
+class ClientePrueba:
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def enviar(self, metodo, ruta, cuerpo, cabeceras):
+        respuesta = self.cliente.open(ruta, method=metodo, json=cuerpo, headers=cabeceras)
+        return respuesta.status_code, respuesta.get_data()
+
+    def etag(self, metodo, ruta, cabeceras):
+        return self.cliente.open(ruta, method=metodo, headers=cabeceras).headers.get('ETag', '')
+
+    def cerrar(self):
+        pass
+
+
+class ManejadorSilencioso(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+# Servidor WSGI real (werkzeug, con hilos) y conexiones HTTP persistentes por hilo
+class ClienteWSGI:
+    def __init__(self, app):
+        self.servidor = make_server('127.0.0.1', 0, app, threaded=True, request_handler=ManejadorSilencioso)
+        self.puerto = self.servidor.server_port
+        self.hilo = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        self.hilo.start()
+        self.local = threading.local()
+
+    def enviar(self, metodo, ruta, cuerpo, cabeceras):
+        conexion = getattr(self.local, 'conexion', None)
+        if conexion is None:
+            conexion = self.local.conexion = http.client.HTTPConnection('127.0.0.1', self.puerto)
+        cabeceras = dict(cabeceras)
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo)
+            cabeceras['Content-Type'] = 'application/json'
+        conexion.request(metodo, ruta, body=datos, headers=cabeceras)
+        respuesta = conexion.getresponse()
+        return respuesta.status, respuesta.read()
+
+    def etag(self, metodo, ruta, cabeceras):
+        conexion = http.client.HTTPConnection('127.0.0.1', self.puerto)
+        conexion.request(metodo, ruta, headers=cabeceras)
+        respuesta = conexion.getresponse()
+        respuesta.read()
+        conexion.close()
+        return respuesta.getheader('ETag', '')
+
+    def cerrar(self):
+        self.servidor.shutdown()
+
+
+# Aplicación ASGI (asgi.py) en un bucle de eventos propio: los hilos del
+# benchmark solo encolan peticiones y la concurrencia la da el bucle
+class ClienteASGI:
+    def __init__(self, app):
+        import asgi
+        self.aplicacion = asgi.AplicacionASGI(app)
+        estado = aplicacion.estado(app)
+        self.repo_asincrono = self.aplicacion.repo_asincrono = estado.conectar(RepositorioMemoriaAsincrono(estado.repo))
+        self.bucle = asyncio.new_event_loop()
+        self.hilo = threading.Thread(target=self.bucle.run_forever, daemon=True)
+        self.hilo.start()
+
+    async def _peticion(self, metodo, ruta, cuerpo, cabeceras):
+        ruta, _, consulta = ruta.partition('?')
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else b''
+        lista_cabeceras = [(nombre.lower().encode('latin1'), valor.encode('latin1')) for nombre, valor in cabeceras.items()]
+        if cuerpo is not None:
+            lista_cabeceras += [(b'content-type', b'application/json'), (b'content-length', str(len(datos)).encode())]
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': metodo,
+            'scheme': 'http',
+            'path': ruta,
+            'raw_path': ruta.encode(),
+            'query_string': consulta.encode(),
+            'root_path': '',
+            'headers': lista_cabeceras,
+            'client': ('127.0.0.1', 0),
+            'server': ('127.0.0.1', 80)
+        }
+        respuesta = {'cuerpo': b''}
+
+        async def recibir():
+            return {'type': 'http.request', 'body': datos, 'more_body': False}
+
+        async def enviar(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                respuesta['estado'] = mensaje['status']
+                respuesta['cabeceras'] = {nombre.decode('latin1').lower(): valor.decode('latin1') for nombre, valor in mensaje['headers']}
+            else:
+                respuesta['cuerpo'] += mensaje.get('body', b'')
+
+        await self.aplicacion(scope, recibir, enviar)
+        return respuesta
+
+    def _ejecutar(self, metodo, ruta, cuerpo, cabeceras):
+        return asyncio.run_coroutine_threadsafe(self._peticion(metodo, ruta, cuerpo, cabeceras), self.bucle).result()
+
+    def enviar(self, metodo, ruta, cuerpo, cabeceras):
+        respuesta = self._ejecutar(metodo, ruta, cuerpo, cabeceras)
+        return respuesta['estado'], respuesta['cuerpo']
+
+    def etag(self, metodo, ruta, cabeceras):
+        return self._ejecutar(metodo, ruta, None, cabeceras)['cabeceras'].get('etag', '')
+
+    def cerrar(self):
+        self.bucle.call_soon_threadsafe(self.bucle.stop)
+
+
+# Viajes al backend sumando los repositorios síncrono y asíncrono
+class ContadorLlamadas:
+    def __init__(self, *repos):
+        self.repos = repos
+
+    @property
+    def llamadas(self):
+        return sum(repo.llamadas for repo in self.repos)
+
+
+# ========================== MEDICIÓN ==========================
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def obtener_token(cliente):
+    estado, cuerpo = cliente.enviar('POST', '/login', {'email': EMAIL, 'contrasena': CONTRASENA}, {})
+    if estado != 200:
+        raise RuntimeError(f'No se pudo iniciar sesión para el benchmark: {estado} {cuerpo[:200]!r}')
+    return json.loads(cuerpo)['token']
+
+
+def medir(app, cliente, repo, ruta, ids, token, peticiones, concurrencia, max_tiempo, accept_encoding=None):
+    metodo, url, cuerpo, autenticada = peticion(ruta, ids)
+    cabeceras = {'Authorization': f'Bearer {token}'} if autenticada else {}
+    if accept_encoding:
+        cabeceras['Accept-Encoding'] = accept_encoding
+    if ruta == 'tablero_304':
+        # Sondeo del tablero sin cambios: el cliente envía el ETag de la respuesta anterior
+        cabeceras['If-None-Match'] = cliente.etag(metodo, url, cabeceras)
+    latencias = []
+    errores = []
+    limite = time.perf_counter() + max_tiempo
+
+    def una():
+        if time.perf_counter() > limite and len(latencias) >= 5:
+            return
+        if ruta == 'tablero_frio':
+            # Tablero construido en cada petición (sin el snapshot serializado)
+            aplicacion.estado(app).cache_tableros.limpiar()
+        inicio = time.perf_counter()
+        estado, _ = cliente.enviar(metodo, url, cuerpo, cabeceras)
+        latencias.append(time.perf_counter() - inicio)
+        if estado >= 400:
+            errores.append(estado)
+
+    # Calentamiento (no se mide); tamaño de la respuesta tal como viaja
+    bytes_respuesta = len(cliente.enviar(metodo, url, cuerpo, cabeceras)[1])
+
+    # Pico de memoria asignada durante una petición (fuera de la medición de tiempos)
+    tracemalloc.start()
+    una()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencias.clear()
+    errores.clear()
+
+    registro = aplicacion.estado(app).registro_viajes
+    registro.infracciones.clear()
+    llamadas_inicio = repo.llamadas
+    inicio = time.perf_counter()
+    if concurrencia <= 1:
+        for _ in range(peticiones):
+            una()
+    else:
+        with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+            for _ in range(peticiones):
+                ejecutor.submit(una)
+    duracion = time.perf_counter() - inicio
+    total = len(latencias) or 1
+    viajes = (repo.llamadas - llamadas_inicio) / total
+
+    return {
+        'ruta': ruta,
+        'peticiones': len(latencias),
+        'bytes': bytes_respuesta,
+        'errores': len(errores),
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p95_ms': percentil(latencias, 95) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'rps': len(latencias) / duracion if duracion else 0.0,
+        'viajes': viajes,
+        'pico_kb': pico / 1024,
+        # Presupuestos declarados con @presupuesto_viajes (sin repetir el mismo mensaje)
+        'infracciones': list(dict.fromkeys(registro.infracciones))
+    }
+
+
+# 'degradacion': fallos, lentas y latencia_lenta del RepositorioMemoria
+def ejecutar(modo, tamanos, rutas, peticiones, concurrencia, latencia, max_tiempo, accept_encoding=None, degradacion=None):
+    resultados = []
+    for tamano in tamanos:
+        repo = RepositorioMemoria()
+        ids = sembrar(repo, tamano)
+        repo.latencia = latencia
+        for atributo, valor in (degradacion or {}).items():
+            setattr(repo, atributo, valor)
+        app = preparar_app(repo)
+        contador = repo
+        if modo == 'asgi':
+            cliente = ClienteASGI(app)
+            contador = ContadorLlamadas(repo, cliente.repo_asincrono)
+        elif modo == 'wsgi':
+            cliente = ClienteWSGI(app)
+        else:
+            cliente = ClientePrueba(app)
+        try:
+            # /login no es una ruta asíncrona: el token se obtiene siempre por Flask
+            token = obtener_token(ClientePrueba(app))
+            for ruta in sorted(rutas, key=lambda ruta: ruta in RUTAS_ESCRITURA):
+                resultado = medir(app, cliente, contador, ruta, ids, token, peticiones, concurrencia, max_tiempo, accept_encoding)
+                resultado['tamano'] = tamano
+                resultado['modo'] = modo
+                resultados.append(resultado)
+                imprimir_fila(resultado)
+        finally:
+            cliente.cerrar()
+            aplicacion.estado(app).cerrar()
+    return resultados
+
+
+# Una ruta cuyo número de viajes crece con el tamaño del proyecto es una regresión (N+1)
+def detectar_regresiones(resultados, max_viajes=None):
+    problemas = []
+    por_ruta = {}
+    for resultado in resultados:
+        por_ruta.setdefault(resultado['ruta'], []).append(resultado)
+        if resultado['errores']:
+            problemas.append(f"{resultado['ruta']} ({resultado['tamano']} tareas): {resultado['errores']} respuestas con error")
+        if max_viajes is not None and resultado['viajes'] > max_viajes:
+            problemas.append(f"{resultado['ruta']} ({resultado['tamano']} tareas): {resultado['viajes']:.1f} viajes por petición (máximo {max_viajes})")
+    for ruta, filas in por_ruta.items():
+        filas.sort(key=lambda fila: fila['tamano'])
+        if len(filas) > 1 and filas[-1]['viajes'] > filas[0]['viajes'] + 0.5:
+            problemas.append(f"{ruta}: los viajes al backend crecen con el tamaño ({filas[0]['viajes']:.1f} -> {filas[-1]['viajes']:.1f})")
+    problemas.extend(dict.fromkeys(infraccion for resultado in resultados for infraccion in resultado.get('infracciones', ())))
+    return problemas
+
+
+def imprimir_cabecera():
+    print(f"{'modo':<8}{'tareas':>8}  {'ruta':<15}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'viajes':>8}{'pico KB':>10}{'resp KB':>10}")
+
+
+def imprimir_fila(r):
+    print(f"{r['modo']:<8}{r['tamano']:>8}  {r['ruta']:<15}{r['peticiones']:>6}{r['errores']:>5}"
+          f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['rps']:>10.1f}{r['viajes']:>8.2f}{r['pico_kb']:>10.0f}{r['bytes'] / 1024:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de latencia y rendimiento de la API')
+    parser.add_argument('--modo', choices=['cliente', 'wsgi', 'asgi', 'ambos'], default='cliente')
+    parser.add_argument('--tamanos', default='10,1000,10000,50000', help='Tareas por proyecto, separadas por comas')
+    parser.add_argument('--rutas', default=','.join(RUTAS))
+    parser.add_argument('--peticiones', type=int, default=100)
+    parser.add_argument('--concurrencia', type=int, default=1)
+    parser.add_argument('--latencia', type=float, default=0.0, help='Latencia simulada por llamada al backend (segundos)')
+    parser.add_argument('--fallos', type=float, default=0.0, help='Probabilidad de error de conexión simulado por llamada')
+    parser.add_argument('--lentas', type=float, default=0.0, help='Probabilidad de que una llamada sea lenta (backend degradado)')
+    parser.add_argument('--latencia-lenta', type=float, default=1.0, help='Latencia añadida a las llamadas lentas (segundos)')
+    parser.add_argument('--max-tiempo', type=float, default=10.0, help='Tiempo máximo por escenario (segundos)')
+    parser.add_argument('--max-viajes', type=float, default=None, help='Falla si una ruta supera estos viajes por petición')
+    parser.add_argument('--accept-encoding', default=None, help="Cabecera Accept-Encoding de las peticiones (p. ej. 'gzip')")
+    parser.add_argument('--json', dest='salida_json', default=None, help='Guardar los resultados en un archivo JSON')
+    args = parser.parse_args(argv)
+
+    tamanos = [int(valor) for valor in args.tamanos.split(',') if valor]
+    rutas = [valor for valor in args.rutas.split(',') if valor]
+    modos = ['cliente', 'wsgi'] if args.modo == 'ambos' else [args.modo]
+
+    imprimir_cabecera()
+    resultados = []
+    for modo in modos:
+        resultados.extend(ejecutar(modo, tamanos, rutas, args.peticiones, args.concurrencia, args.latencia, args.max_tiempo,
+                                   args.accept_encoding, {'fallos': args.fallos, 'lentas': args.lentas, 'latencia_lenta': args.latencia_lenta}))
+
+    if args.salida_json:
+        with open(args.salida_json, 'w') as archivo:
+            json.dump(resultados, archivo, indent=2)
+
+    problemas = detectar_regresiones(resultados, args.max_viajes)
+    for problema in problemas:
+        print(f'REGRESIÓN: {problema}')
+    return 1 if problemas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+
+# Búsqueda de tareas por título y descripción. Los términos se normalizan
+# igual que en migraciones/008_busqueda_tareas.sql (minúsculas, sin acentos,
+# solo letras y dígitos) para que ambos backends encuentren lo mismo: todos los
+# términos deben aparecer y el último también cuenta como prefijo (búsqueda
+# mientras se escribe). La relevancia pondera el título 1.0 y la descripción
+# 0.4, los pesos por defecto de ts_rank para 'A' y 'B'; en memoria se
+# multiplica además por la rareza de cada término en el proyecto.
+
+MAX_TERMINOS = 10
+PESO_TITULO = 1.0
+PESO_DESCRIPCION = 0.4
+
+_PALABRA = re.compile(r'[^\W_]+')
+_DIACRITICOS = re.compile('[\u0300-\u036f]')
+
+
+# Como lower(unaccent(...)): la descomposición separa las tildes, que se quitan
+def normalizar(texto):
+    if texto.isascii():
+        return texto.lower()
+    return _DIACRITICOS.sub('', unicodedata.normalize('NFKD', texto.lower()))
+
+
+def terminos(texto):
+    return _PALABRA.findall(normalizar(texto or ''))
+
+
+# Peso de cada término en una tarea
+def _pesos(tarea):
+    pesos = {}
+    for termino in terminos(tarea.get('titulo')):
+        pesos[termino] = pesos.get(termino, 0.0) + PESO_TITULO
+    for termino in terminos(tarea.get('descripcion')):
+        pesos[termino] = pesos.get(termino, 0.0) + PESO_DESCRIPCION
+    return pesos
+
+
+class _IndiceProyecto:
+    def __init__(self):
+        self.publicaciones = {}  # término -> {id_tarea: peso}
+        self.vocabulario = []  # Términos ordenados, para los prefijos
+        self._nuevos = set()  # Términos aún no ordenados en el vocabulario
+        self.documentos = 0
+        # [(-peso, id_tarea)] ordenado de los términos ya buscados solos; se
+        # mantiene con cada alta y baja en lugar de recalcularlo
+        self._ordenes = {}
+
+    def agregar(self, id_tarea, pesos):
+        self.documentos += 1
+        for termino, peso in pesos.items():
+            publicacion = self.publicaciones.get(termino)
+            if publicacion is None:
+                publicacion = self.publicaciones[termino] = {}
+                self._nuevos.add(termino)
+            publicacion[id_tarea] = peso
+            orden = self._ordenes.get(termino)
+            if orden is not None:
+                insort(orden, (-peso, id_tarea))
+
+    def eliminar(self, id_tarea, pesos):
+        self.documentos -= 1
+        for termino in pesos:
+            publicacion = self.publicaciones[termino]
+            peso = publicacion.pop(id_tarea)
+            orden = self._ordenes.get(termino)
+            if orden is not None:
+                del orden[bisect_left(orden, (-peso, id_tarea))]
+            if not publicacion:
+                del self.publicaciones[termino]
+                self._ordenes.pop(termino, None)
+                if termino in self._nuevos:
+                    self._nuevos.discard(termino)
+                else:
+                    del self.vocabulario[bisect_left(self.vocabulario, termino)]
+
+    # Los términos nuevos se ordenan en la siguiente búsqueda: unos pocos se
+    # intercalan; muchos (una carga masiva) se ordenan de una vez
+    def _ordenar_vocabulario(self):
+        if len(self._nuevos) <= 64:
+            for termino in self._nuevos:
+                insort(self.vocabulario, termino)
+        else:
+            self.vocabulario.extend(self._nuevos)
+            self.vocabulario.sort()
+        self._nuevos.clear()
+
+    # Peso por tarea del último término: el mayor entre las palabras que
+    # empiezan por él. Devuelve también la palabra si solo hay una.
+    def _prefijo(self, prefijo):
+        if self._nuevos:
+            self._ordenar_vocabulario()
+        inicio = bisect_left(self.vocabulario, prefijo)
+        fin = bisect_left(self.vocabulario, prefijo + '\U0010ffff', inicio)
+        if fin - inicio == 1:
+            termino = self.vocabulario[inicio]
+            return termino, self.publicaciones[termino]
+        pesos = {}
+        for termino in self.vocabulario[inicio:fin]:
+            for id_tarea, peso in self.publicaciones[termino].items():
+                if peso > pesos.get(id_tarea, 0.0):
+                    pesos[id_tarea] = peso
+        return None, pesos
+
+    def _orden(self, termino):
+        orden = self._ordenes.get(termino)
+        if orden is None:
+            orden = self._ordenes[termino] = sorted((-peso, id_tarea) for id_tarea, peso in self.publicaciones[termino].items())
+        return orden
+
+    def buscar(self, consulta, cantidad):
+        termino, ultima = self._prefijo(consulta[-1])
+        # Un solo término: su orden se calcula una vez y se reutiliza, así
+        # que una palabra presente en todas las tareas no obliga a puntuarlas
+        # en cada búsqueda
+        if len(consulta) == 1 and termino is not None:
+            factor = math.log(1 + self.documentos / len(ultima))
+            return [(-peso * factor, id_tarea) for peso, id_tarea in self._orden(termino)[:cantidad]]
+        listas = [self.publicaciones.get(termino, {}) for termino in consulta[:-1]]
+        listas.append(ultima)
+        if not all(listas):
+            return []
+        # Se recorre la lista más corta y se comprueba en las demás
+        listas.sort(key=len)
+        factores = [math.log(1 + self.documentos / len(lista)) for lista in listas]
+        resto = list(zip(listas[1:], factores[1:]))
+        puntuadas = []
+        for id_tarea, peso in listas[0].items():
+            relevancia = peso * factores[0]
+            for lista, factor in resto:
+                otro = lista.get(id_tarea)
+                if otro is None:
+                    break
+                relevancia += otro * factor
+            else:
+                puntuadas.append((relevancia, id_tarea))
+        return heapq.nsmallest(cantidad, puntuadas, key=lambda par: (-par[0], par[1]))
+
+
+# Índice invertido incremental por proyecto para el backend en memoria: se
+# actualiza con cada alta, cambio o baja de tarea (sin reconstruirlo) y una
+# búsqueda solo recorre las tareas que contienen el término menos frecuente
+class IndiceTareas:
+    def __init__(self):
+        self._proyectos = {}
+        self._documentos = {}  # id_tarea -> (id_proyecto, pesos)
+
+    def agregar(self, tarea):
+        pesos = _pesos(tarea)
+        self._documentos[tarea['id_tarea']] = (tarea['id_proyecto'], pesos)
+        self._proyectos.setdefault(tarea['id_proyecto'], _IndiceProyecto()).agregar(tarea['id_tarea'], pesos)
+
+    def eliminar(self, id_tarea):
+        documento = self._documentos.pop(id_tarea, None)
+        if documento is not None:
+            self._proyectos[documento[0]].eliminar(id_tarea, documento[1])
+
+    # Solo se reindexa si cambió el texto o el proyecto
+    def actualizar(self, tarea):
+        documento = self._documentos.get(tarea['id_tarea'])
+        pesos = _pesos(tarea)
+        if documento is not None and documento == (tarea['id_proyecto'], pesos):
+            return
+        self.eliminar(tarea['id_tarea'])
+        self.agregar(tarea)
+
+    # [(relevancia, id_tarea)] de mayor a menor relevancia
+    def buscar(self, proyecto_id, consulta, desplazamiento=0, limite=20):
+        indice = self._proyectos.get(proyecto_id)
+        if indice is None or not consulta:
+            return []
+        return indice.buscar(consulta, desplazamiento + limite)[desplazamiento:]
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# Cache en memoria acotada por tamaño (LRU) y por antigüedad (TTL)
+class CacheTTL:
+    def __init__(self, max_entradas=1024, ttl=60):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, por_defecto=None):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] <= ahora:
+                if entrada is not None:
+                    del self._datos[clave]
+                self.fallos += 1
+                return por_defecto
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def guardar(self, clave, valor, ttl=None):
+        if self.max_entradas <= 0:
+            return
+        expira = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._datos[clave] = (expira, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def estadisticas(self):
+        return {
+            'entradas': len(self._datos),
+            'aciertos': self.aciertos,
+            'fallos': self.fallos
+        }
+
+
+# Cache LRU acotada por el tamaño total en bytes de sus valores
+class CacheBytes:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, por_defecto=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return por_defecto
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def guardar(self, clave, valor, tamano):
+        if tamano > self.max_bytes:
+            self.invalidar(clave)
+            return
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[0]
+            self._datos[clave] = (tamano, valor)
+            self.bytes += tamano
+            while self.bytes > self.max_bytes:
+                _, (tamano_expulsado, _) = self._datos.popitem(last=False)
+                self.bytes -= tamano_expulsado
+
+    def invalidar(self, clave):
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[0]
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._datos)
+
+    def estadisticas(self):
+        return {
+            'entradas': len(self._datos),
+            'bytes': self.bytes,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos
+        }
@@ -0,0 +1,90 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Compresores disponibles: codificación -> función(datos, nivel)
+COMPRESORES = {
+    'gzip': lambda datos, nivel: gzip.compress(datos, compresslevel=nivel, mtime=0)
+}
+if brotli is not None:
+    COMPRESORES['br'] = lambda datos, nivel: brotli.compress(datos, quality=nivel)
+if zstandard is not None:
+    COMPRESORES['zstd'] = lambda datos, nivel: zstandard.ZstdCompressor(level=nivel).compress(datos)
+
+# Niveles por defecto: buena relación tamaño/CPU para respuestas dinámicas
+NIVELES = {'gzip': 6, 'br': 4, 'zstd': 3}
+
+TIPOS_COMPRIMIBLES = ('application/json', 'application/javascript', 'image/svg+xml', 'text/')
+
+
+# Hook after_request que comprime la respuesta según Accept-Encoding, solo por
+# encima de 'minimo' bytes y para tipos de contenido comprimibles. Si la
+# respuesta trae el atributo 'clave_compresion' (p. ej. el ETag de un tablero
+# en cache), la variante comprimida se guarda en 'cache' con esa clave y no se
+# vuelve a comprimir.
+class Compresor:
+    def __init__(self, minimo=1024, codificaciones=('zstd', 'br', 'gzip'), niveles=None, cache=None):
+        self.minimo = minimo
+        self.codificaciones = [codificacion for codificacion in codificaciones if codificacion in COMPRESORES]
+        self.niveles = dict(NIVELES, **(niveles or {}))
+        self.cache = cache
+
+    # La codificación aceptada con mayor calidad; a igual calidad, el orden configurado
+    def elegir(self, aceptadas):
+        mejor = None
+        mejor_calidad = 0
+        for codificacion in self.codificaciones:
+            calidad = aceptadas.quality(codificacion)
+            if calidad > mejor_calidad:
+                mejor, mejor_calidad = codificacion, calidad
+        return mejor
+
+    def comprimir(self, datos, codificacion):
+        return COMPRESORES[codificacion](datos, self.niveles[codificacion])
+
+    def __call__(self, response):
+        if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+        if not (response.mimetype or '').startswith(TIPOS_COMPRIMIBLES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.content_length is not None and response.content_length < self.minimo:
+            return response
+        codificacion = self.elegir(request.accept_encodings)
+        if codificacion is None:
+            return response
+
+        clave = getattr(response, 'clave_compresion', None)
+        comprimido = None
+        if clave is not None and self.cache is not None:
+            comprimido = self.cache.obtener((clave, codificacion))
+        if comprimido is None:
+            datos = response.get_data()
+            if len(datos) < self.minimo:
+                return response
+            comprimido = self.comprimir(datos, codificacion)
+            if len(comprimido) >= len(datos):
+                return response
+            if clave is not None and self.cache is not None:
+                self.cache.guardar((clave, codificacion), comprimido, len(comprimido))
+
+        response.set_data(comprimido)
+        response.headers['Content-Encoding'] = codificacion
+        # El ETag fuerte identifica la representación sin comprimir
+        etag, debil = response.get_etag()
+        if etag and not debil:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,117 @@
+import time
+
+from resiliencia import restante
+
+# Pool de conexiones HTTP hacia Supabase (httpx). Los clientes se crean en cada
+# proceso la primera vez que se usan (ver RepositorioSupabase), nunca antes de
+# un fork, así que los workers no comparten sockets. El observador opcional
+# recibe pool_creado(max_conexiones), peticion_iniciada() y
+# peticion_terminada(espera, conexion_nueva) para medir la saturación.
+
+OPCIONES_POR_DEFECTO = {
+    'max_conexiones': 20,
+    'max_keepalive': 20,
+    'keepalive_expiry': 30.0,  # Segundos que una conexión libre sigue abierta
+    'timeout_conexion': 3.0,
+    'timeout_lectura': 10.0,
+    'timeout_pool': 5.0,  # Espera máxima por una conexión libre
+    'http2': False
+}
+
+
+def _configuracion(opciones):
+    import httpx
+
+    opciones = dict(OPCIONES_POR_DEFECTO, **(opciones or {}))
+    limites = httpx.Limits(
+        max_connections=opciones['max_conexiones'],
+        max_keepalive_connections=opciones['max_keepalive'],
+        keepalive_expiry=opciones['keepalive_expiry']
+    )
+    timeout = httpx.Timeout(
+        connect=opciones['timeout_conexion'],
+        read=opciones['timeout_lectura'],
+        write=opciones['timeout_lectura'],
+        pool=opciones['timeout_pool']
+    )
+    return limites, timeout, opciones['http2'], opciones['max_conexiones']
+
+
+# Espera por una conexión del pool: desde que la petición entra en el
+# transporte hasta que empieza a abrir una conexión nueva o a enviar las
+# cabeceras por una ya abierta (eventos 'trace' de httpcore)
+class _Medicion:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.espera = None
+        self.conexion_nueva = False
+
+    def evento(self, nombre):
+        if self.espera is None and (nombre == 'connection.connect_tcp.started' or nombre.endswith('send_request_headers.started')):
+            self.espera = time.perf_counter() - self.inicio
+        if nombre == 'connection.connect_tcp.started':
+            self.conexion_nueva = True
+
+
+# Con plazo de petición (resiliencia.plazo_actual), ninguna espera de red de
+# la llamada (conexión, pool, escritura o cada lectura) pasa de lo que queda
+# de él: una llamada síncrona bloqueada no se puede cancelar desde fuera
+def _limitar_al_plazo(request):
+    segundos = restante()
+    if segundos is None:
+        return
+    segundos = max(segundos, 0.001)
+    request.extensions = dict(request.extensions, timeout={
+        fase: segundos if valor is None else min(valor, segundos)
+        for fase, valor in request.extensions.get('timeout', {}).items()})
+
+
+def cliente_http(opciones=None, observador=None):
+    import httpx
+
+    limites, timeout, http2, max_conexiones = _configuracion(opciones)
+    if observador:
+        observador.pool_creado(max_conexiones)
+
+    class TransporteConPlazo(httpx.HTTPTransport):
+        def handle_request(self, request):
+            _limitar_al_plazo(request)
+            return super().handle_request(request)
+
+    class TransporteMedido(TransporteConPlazo):
+        def handle_request(self, request):
+            medicion = _Medicion()
+            request.extensions = dict(request.extensions, trace=lambda nombre, info: medicion.evento(nombre))
+            observador.peticion_iniciada()
+            try:
+                return super().handle_request(request)
+            finally:
+                observador.peticion_terminada(medicion.espera, medicion.conexion_nueva)
+
+    transporte = (TransporteMedido if observador else TransporteConPlazo)(limits=limites, http2=http2)
+    return httpx.Client(transport=transporte, timeout=timeout, http2=http2)
+
+
+def cliente_http_asincrono(opciones=None, observador=None):
+    import httpx
+
+    limites, timeout, http2, max_conexiones = _configuracion(opciones)
+    if observador:
+        observador.pool_creado(max_conexiones)
+
+    class TransporteMedido(httpx.AsyncHTTPTransport):
+        async def handle_async_request(self, request):
+            medicion = _Medicion()
+
+            async def trace(nombre, info):
+                medicion.evento(nombre)
+
+            request.extensions = dict(request.extensions, trace=trace)
+            observador.peticion_iniciada()
+            try:
+                return await super().handle_async_request(request)
+            finally:
+                observador.peticion_terminada(medicion.espera, medicion.conexion_nueva)
+
+    transporte = (TransporteMedido if observador else httpx.AsyncHTTPTransport)(limits=limites, http2=http2)
+    return httpx.AsyncClient(transport=transporte, timeout=timeout, http2=http2)
@@ -0,0 +1,155 @@
+import threading
+import time
+from concurrent.futures import BrokenExecutor, TimeoutError as TimeoutFuturo
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from procesos import descartar_tras_fork
+
+
+# No hay hueco en la cola o el cálculo no terminó a tiempo
+class ContrasenasOcupadas(Exception):
+    pass
+
+
+# Prefijo que werkzeug escribe en el hash para un método ('scrypt:32768:8:1',
+# 'pbkdf2:sha256:1000000'); sirve para detectar hashes con parámetros antiguos
+def metodo_normalizado(metodo):
+    nombre, *argumentos = metodo.split(':')
+    if nombre == 'scrypt':
+        n, r, p = map(int, argumentos) if argumentos else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if nombre == 'pbkdf2':
+        algoritmo = argumentos[0] if argumentos else 'sha256'
+        iteraciones = int(argumentos[1]) if len(argumentos) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{algoritmo}:{iteraciones}'
+    raise ValueError(f'Método de hash de contraseñas no soportado: {metodo}')
+
+
+# ---------- Trabajo en los procesos del pool (funciones de módulo, serializables) ----------
+
+def _cifrar(contrasena, metodo):
+    return generate_password_hash(contrasena, metodo)
+
+
+# (válida, hash nuevo si el guardado usa parámetros distintos de los actuales)
+def _verificar(guardada, contrasena, metodo):
+    if not check_password_hash(guardada, contrasena):
+        return False, None
+    if guardada.split('$', 1)[0] != metodo:
+        return True, generate_password_hash(contrasena, metodo)
+    return True, None
+
+
+def _cambiar(guardada, actual, nueva, metodo):
+    if not check_password_hash(guardada, actual):
+        return None
+    return generate_password_hash(nueva, metodo)
+
+
+def _listo():
+    return True
+
+
+# Cifrado y verificación fuera del hilo de la petición: un pool de procesos
+# acotado (no retiene el GIL) con límite de peticiones pendientes y timeout.
+# Con procesos=0 se calcula en el propio hilo.
+class ServicioContrasenas:
+    def __init__(self, metodo='scrypt', procesos=0, max_pendientes=64, timeout=10.0):
+        self.metodo = metodo_normalizado(metodo)
+        self.procesos = procesos
+        self.timeout = timeout
+        self._cupos = threading.BoundedSemaphore(max_pendientes)
+        self._pool = None
+        self._lock = threading.Lock()
+        # Función opcional (operación, segundos) con la duración de cada
+        # operación, incluida la espera en la cola del pool
+        self.observador = None
+        # El pool no sobrevive a un fork: el proceso hijo crea el suyo
+        descartar_tras_fork(self)
+
+    def descartar_heredado(self):
+        self._pool = None
+        self._lock = threading.Lock()
+
+    # El pool se crea con la primera petición (o al calentar); 'spawn' evita
+    # heredar los hilos y conexiones del servidor. multiprocessing se importa
+    # aquí para no pagarlo al arrancar si no hay pool.
+    def _obtener_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+                    self._pool = ProcessPoolExecutor(max_workers=self.procesos,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    # Un proceso que muere (p. ej. por falta de memoria) deja el pool roto para
+    # siempre: se cierra y el siguiente uso crea otro
+    def _reemplazar_pool(self, roto):
+        with self._lock:
+            if self._pool is roto:
+                roto.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+        return self._obtener_pool()
+
+    def _ejecutar(self, funcion, *argumentos):
+        if self.observador is None:
+            return self._calcular(funcion, *argumentos)
+        inicio = time.perf_counter()
+        try:
+            return self._calcular(funcion, *argumentos)
+        finally:
+            self.observador(funcion.__name__.lstrip('_'), time.perf_counter() - inicio)
+
+    # Las operaciones no tienen efectos, así que si el pool está roto se
+    # reintentan una vez en uno nuevo
+    def _calcular(self, funcion, *argumentos):
+        if self.procesos <= 0:
+            return funcion(*argumentos)
+        pool = self._obtener_pool()
+        try:
+            return self._en_pool(pool, funcion, argumentos)
+        except BrokenExecutor:
+            return self._en_pool(self._reemplazar_pool(pool), funcion, argumentos)
+
+    def _en_pool(self, pool, funcion, argumentos):
+        if not self._cupos.acquire(blocking=False):
+            raise ContrasenasOcupadas('Demasiadas operaciones de contraseña pendientes')
+        try:
+            futuro = pool.submit(funcion, *argumentos)
+        except Exception:
+            self._cupos.release()
+            raise
+        # El cupo se libera cuando el proceso termina, aunque la petición ya no espere
+        futuro.add_done_callback(lambda _: self._cupos.release())
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutFuturo:
+            futuro.cancel()
+            raise ContrasenasOcupadas('La operación de contraseña superó el tiempo máximo')
+
+    def cifrar(self, contrasena):
+        return self._ejecutar(_cifrar, contrasena, self.metodo)
+
+    def verificar(self, guardada, contrasena):
+        return self._ejecutar(_verificar, guardada, contrasena, self.metodo)
+
+    # Hash de la nueva contraseña, o None si la actual no coincide
+    def cambiar(self, guardada, actual, nueva):
+        return self._ejecutar(_cambiar, guardada, actual, nueva, self.metodo)
+
+    # Arrancar todos los procesos del pool antes de la primera petición (con
+    # 'spawn' cada uno importa de nuevo el intérprete y werkzeug)
+    def calentar(self):
+        if self.procesos <= 0:
+            return
+        pool = self._obtener_pool()
+        for futuro in [pool.submit(_listo) for _ in range(self.procesos)]:
+            futuro.result(timeout=self.timeout)
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
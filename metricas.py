@@ -0,0 +1,233 @@
+import bisect
+import threading
+import time
+import weakref
+
+from flask import g, has_request_context, request
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_LLAMADAS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class _Fragmento(dict):
+    pass
+
+
+class _Testigo:
+    pass
+
+
+# Registro de métricas con contadores por hilo: cada hilo escribe solo en su
+# fragmento (sin locks en el camino caliente) y la exportación los suma. Al
+# terminar un hilo su fragmento se acumula en el global.
+class Metricas:
+    def __init__(self):
+        self._definiciones = {}
+        self._fragmentos = {}
+        self._retirado = _Fragmento()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # tipo: 'counter', 'gauge' o 'histogram'
+    def declarar(self, nombre, tipo, ayuda, buckets=None):
+        self._definiciones[nombre] = (tipo, ayuda, tuple(buckets or ()))
+
+    def _fragmento(self):
+        fragmento = getattr(self._local, 'fragmento', None)
+        if fragmento is None:
+            fragmento = self._local.fragmento = _Fragmento()
+            self._local.testigo = testigo = _Testigo()
+            with self._lock:
+                self._fragmentos[id(fragmento)] = fragmento
+            weakref.finalize(testigo, self._retirar, fragmento)
+        return fragmento
+
+    def _retirar(self, fragmento):
+        with self._lock:
+            self._fragmentos.pop(id(fragmento), None)
+            self._sumar(self._retirado, fragmento)
+
+    def _sumar(self, destino, origen):
+        for clave, valor in list(origen.items()):
+            if isinstance(valor, list):
+                acumulado = destino.get(clave)
+                if acumulado is None:
+                    destino[clave] = list(valor)
+                else:
+                    for indice, parcial in enumerate(valor):
+                        acumulado[indice] += parcial
+            else:
+                destino[clave] = destino.get(clave, 0) + valor
+
+    def contar(self, nombre, etiquetas=(), valor=1):
+        fragmento = self._fragmento()
+        clave = (nombre, etiquetas)
+        fragmento[clave] = fragmento.get(clave, 0) + valor
+
+    # Un histograma se guarda como [cuenta por bucket..., +Inf, suma]
+    def observar(self, nombre, valor, etiquetas=()):
+        fragmento = self._fragmento()
+        clave = (nombre, etiquetas)
+        buckets = self._definiciones[nombre][2]
+        serie = fragmento.get(clave)
+        if serie is None:
+            serie = fragmento[clave] = [0] * (len(buckets) + 2)
+        serie[bisect.bisect_left(buckets, valor)] += 1
+        serie[-1] += valor
+
+    # Valor fijo (p. ej. un límite de configuración), fuera de los fragmentos
+    def fijar(self, nombre, valor, etiquetas=()):
+        with self._lock:
+            self._retirado[(nombre, etiquetas)] = valor
+
+    def valores(self):
+        total = _Fragmento()
+        with self._lock:
+            self._sumar(total, self._retirado)
+            for fragmento in list(self._fragmentos.values()):
+                self._sumar(total, fragmento)
+        return total
+
+    # Texto en el formato de exposición de Prometheus (0.0.4)
+    def exportar(self):
+        series = {}
+        for (nombre, etiquetas), valor in self.valores().items():
+            series.setdefault(nombre, []).append((etiquetas, valor))
+
+        lineas = []
+        for nombre, (tipo, ayuda, buckets) in self._definiciones.items():
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            for etiquetas, valor in sorted(series.get(nombre, []), key=lambda serie: serie[0]):
+                if tipo != 'histogram':
+                    lineas.append(f'{nombre}{_etiquetas(etiquetas)} {_numero(valor)}')
+                    continue
+                acumulado = 0
+                for limite, cuenta in zip(buckets + (float('inf'),), valor[:-1]):
+                    acumulado += cuenta
+                    le = '+Inf' if limite == float('inf') else _numero(limite)
+                    lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas + (("le", le),))} {acumulado}')
+                lineas.append(f'{nombre}_sum{_etiquetas(etiquetas)} {_numero(valor[-1])}')
+                lineas.append(f'{nombre}_count{_etiquetas(etiquetas)} {acumulado}')
+        return '\n'.join(lineas) + '\n'
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ''
+    partes = []
+    for nombre, valor in etiquetas:
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{nombre}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def _numero(valor):
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+# ========================== INSTRUMENTACIÓN DE FLASK ==========================
+
+def declarar_metricas(metricas):
+    metricas.declarar('app_http_requests_total', 'counter', 'Peticiones HTTP por ruta, método y estado')
+    metricas.declarar('app_http_request_duration_seconds', 'histogram', 'Duración de las peticiones HTTP', BUCKETS_SEGUNDOS)
+    metricas.declarar('app_http_requests_in_flight', 'gauge', 'Peticiones HTTP en curso por ruta')
+    metricas.declarar('app_backend_calls_total', 'counter', 'Llamadas al backend de datos por operación')
+    metricas.declarar('app_backend_errors_total', 'counter', 'Llamadas al backend que lanzaron una excepción')
+    metricas.declarar('app_backend_call_duration_seconds', 'histogram', 'Duración de las llamadas al backend', BUCKETS_SEGUNDOS)
+    metricas.declarar('app_backend_calls_per_request', 'histogram', 'Llamadas al backend hechas durante cada petición', BUCKETS_LLAMADAS)
+    metricas.declarar('app_backend_time_per_request_seconds', 'histogram', 'Tiempo en el backend durante cada petición', BUCKETS_SEGUNDOS)
+    metricas.declarar('app_backend_pool_max_connections', 'gauge', 'Conexiones máximas del pool HTTP hacia el backend')
+    metricas.declarar('app_backend_pool_in_use', 'gauge', 'Peticiones HTTP en curso en el pool (saturado si llega al máximo)')
+    metricas.declarar('app_backend_pool_wait_seconds', 'histogram', 'Espera por una conexión libre del pool', BUCKETS_SEGUNDOS)
+    metricas.declarar('app_backend_pool_connections_opened_total', 'counter', 'Conexiones nuevas abiertas por el pool')
+    metricas.declarar('app_backend_resilience_events_total', 'counter', 'Reintentos, copias cubiertas, plazos agotados y llamadas rechazadas por el circuito')
+    metricas.declarar('app_backend_circuit_open', 'gauge', '1 si el circuito hacia el backend está abierto')
+    metricas.declarar('app_password_hash_duration_seconds', 'histogram', 'Duración del cifrado y verificación de contraseñas (incluye la cola)', BUCKETS_SEGUNDOS)
+    metricas.declarar('app_password_rehash_failures_total', 'counter', 'Hashes renovados al iniciar sesión que no se pudieron guardar')
+
+
+# Ruta con la plantilla de Flask (p. ej. /tareas/<int:tarea_id>) para no
+# crear una serie por cada id
+def _ruta():
+    regla = request.url_rule
+    return regla.rule if regla is not None else 'sin_ruta'
+
+
+# Observador de las llamadas al backend (Repositorio._ejecutar)
+def observador_backend(metricas):
+    def observar(nombre, segundos, error):
+        etiquetas = (('operacion', nombre),)
+        metricas.contar('app_backend_calls_total', etiquetas)
+        metricas.observar('app_backend_call_duration_seconds', segundos, etiquetas)
+        if error is not None:
+            metricas.contar('app_backend_errors_total', etiquetas + (('error', type(error).__name__),))
+        if has_request_context():
+            g.llamadas_backend = g.get('llamadas_backend', 0) + 1
+            g.tiempo_backend = g.get('tiempo_backend', 0.0) + segundos
+    return observar
+
+
+# Observador del pool HTTP hacia Supabase (conexiones.py); 'cliente' distingue
+# el pool síncrono del asíncrono
+class ObservadorPool:
+    def __init__(self, metricas, cliente):
+        self.metricas = metricas
+        self.etiquetas = (('cliente', cliente),)
+
+    def pool_creado(self, max_conexiones):
+        self.metricas.fijar('app_backend_pool_max_connections', max_conexiones, self.etiquetas)
+
+    def peticion_iniciada(self):
+        self.metricas.contar('app_backend_pool_in_use', self.etiquetas)
+
+    def peticion_terminada(self, espera, conexion_nueva):
+        self.metricas.contar('app_backend_pool_in_use', self.etiquetas, -1)
+        if espera is not None:
+            self.metricas.observar('app_backend_pool_wait_seconds', espera, self.etiquetas)
+        if conexion_nueva:
+            self.metricas.contar('app_backend_pool_connections_opened_total', self.etiquetas)
+
+
+# Eventos de la política de resiliencia (resiliencia.Politica y Disyuntor)
+def observador_resiliencia(metricas):
+    def al_evento(evento, nombre):
+        metricas.contar('app_backend_resilience_events_total', (('evento', evento), ('operacion', nombre)))
+
+    def al_cambiar(abierto):
+        metricas.fijar('app_backend_circuit_open', int(abierto))
+    return al_evento, al_cambiar
+
+
+# Observador del servicio de contraseñas
+def observador_contrasenas(metricas):
+    def observar(operacion, segundos):
+        metricas.observar('app_password_hash_duration_seconds', segundos, (('operacion', operacion),))
+    return observar
+
+
+def instrumentar(app, metricas):
+    declarar_metricas(metricas)
+
+    @app.before_request
+    def iniciar_medicion():
+        g.inicio_peticion = time.perf_counter()
+        g.ruta_metricas = _ruta()
+        metricas.contar('app_http_requests_in_flight', (('ruta', g.ruta_metricas),))
+
+    @app.after_request
+    def registrar_medicion(response):
+        inicio = g.get('inicio_peticion')
+        if inicio is None:
+            return response
+        ruta = g.ruta_metricas
+        metricas.contar('app_http_requests_total', (('ruta', ruta), ('metodo', request.method), ('estado', response.status_code)))
+        metricas.observar('app_http_request_duration_seconds', time.perf_counter() - inicio, (('ruta', ruta), ('metodo', request.method)))
+        metricas.observar('app_backend_calls_per_request', g.get('llamadas_backend', 0), (('ruta', ruta),))
+        metricas.observar('app_backend_time_per_request_seconds', g.get('tiempo_backend', 0.0), (('ruta', ruta),))
+        return response
+
+    @app.teardown_request
+    def terminar_medicion(error=None):
+        if g.pop('inicio_peticion', None) is not None:
+            metricas.contar('app_http_requests_in_flight', (('ruta', g.ruta_metricas),), -1)
@@ -0,0 +1,36 @@
+-- Crear un proyecto y sus categorías por defecto en una sola transacción
+-- (un único viaje de ida y vuelta desde la API).
+create or replace function crear_proyecto_con_categorias(
+    p_nombre text,
+    p_id_grupo integer,
+    p_id_usuario_creador integer,
+    p_categorias text[]
+)
+returns json
+language plpgsql
+as $$
+declare
+    v_proyecto proyectos;
+    v_categorias json;
+begin
+    insert into proyectos (nombre, id_grupo, id_usuario_creador)
+    values (p_nombre, p_id_grupo, p_id_usuario_creador)
+    returning * into v_proyecto;
+
+    with insertadas as (
+        insert into categorias (nombre, id_proyecto)
+        select t.nombre, v_proyecto.id_proyecto
+        from unnest(p_categorias) with ordinality as t(nombre, orden)
+        order by t.orden
+        returning *
+    )
+    select coalesce(json_agg(insertadas order by insertadas.id_categoria), '[]'::json)
+    into v_categorias
+    from insertadas;
+
+    return json_build_object(
+        'proyecto', row_to_json(v_proyecto),
+        'categorias', v_categorias
+    );
+end;
+$$;
@@ -0,0 +1,8 @@
+-- Claves únicas necesarias para el "buscar o crear" con upsert (on conflict)
+-- de categorías y estatus. Si ya existen duplicados hay que fusionarlos antes
+-- de aplicar esta migración.
+alter table estatus
+    add constraint estatus_nombre_key unique (nombre);
+
+alter table categorias
+    add constraint categorias_id_proyecto_nombre_key unique (id_proyecto, nombre);
@@ -0,0 +1,89 @@
+-- Actualizar una tarea en un solo viaje: comprueba que pertenece a un proyecto
+-- del usuario, resuelve (o crea) la categoría y el estatus por nombre, aplica
+-- los cambios y devuelve la tarea con los nombres de categoría y estatus.
+-- De p_cambios solo se aplican titulo, descripcion, prioridad,
+-- fecha_vencimiento, id_categoria e id_estatus.
+-- Resultado: {"estado": "ok" | "no_encontrada" | "no_autorizado", "tarea": {...}}
+create or replace function actualizar_tarea_de_usuario(
+    p_id_tarea integer,
+    p_id_usuario integer,
+    p_cambios jsonb,
+    p_nombre_categoria text default null,
+    p_nombre_estatus text default null
+)
+returns json
+language plpgsql
+as $$
+declare
+    v_id_proyecto integer;
+    v_propietario integer;
+    v_id_categoria integer;
+    v_id_estatus integer;
+    v_nuevos tareas;
+    v_tarea jsonb;
+begin
+    select t.id_proyecto, p.id_usuario_creador
+    into v_id_proyecto, v_propietario
+    from tareas t
+    join proyectos p on p.id_proyecto = t.id_proyecto
+    where t.id_tarea = p_id_tarea
+    for update of t;
+
+    if not found then
+        return json_build_object('estado', 'no_encontrada');
+    end if;
+
+    if v_propietario <> p_id_usuario then
+        return json_build_object('estado', 'no_autorizado');
+    end if;
+
+    if p_nombre_categoria is not null then
+        select id_categoria into v_id_categoria
+        from categorias
+        where id_proyecto = v_id_proyecto and nombre = p_nombre_categoria;
+
+        if v_id_categoria is null then
+            insert into categorias (nombre, id_proyecto)
+            values (p_nombre_categoria, v_id_proyecto)
+            on conflict (id_proyecto, nombre) do update set nombre = excluded.nombre
+            returning id_categoria into v_id_categoria;
+        end if;
+    end if;
+
+    if p_nombre_estatus is not null then
+        select id_estatus into v_id_estatus
+        from estatus
+        where nombre = p_nombre_estatus;
+
+        if v_id_estatus is null then
+            insert into estatus (nombre)
+            values (p_nombre_estatus)
+            on conflict (nombre) do update set nombre = excluded.nombre
+            returning id_estatus into v_id_estatus;
+        end if;
+    end if;
+
+    v_nuevos := jsonb_populate_record(null::tareas, p_cambios);
+
+    update tareas set
+        titulo = case when p_cambios ? 'titulo' then v_nuevos.titulo else titulo end,
+        descripcion = case when p_cambios ? 'descripcion' then v_nuevos.descripcion else descripcion end,
+        prioridad = case when p_cambios ? 'prioridad' then v_nuevos.prioridad else prioridad end,
+        fecha_vencimiento = case when p_cambios ? 'fecha_vencimiento' then v_nuevos.fecha_vencimiento else fecha_vencimiento end,
+        -- Ids ya resueltos por la API (cache) en p_cambios o, si no, por nombre
+        id_categoria = coalesce(v_id_categoria, case when p_cambios ? 'id_categoria' then v_nuevos.id_categoria end, id_categoria),
+        id_estatus = coalesce(v_id_estatus, case when p_cambios ? 'id_estatus' then v_nuevos.id_estatus end, id_estatus)
+    where id_tarea = p_id_tarea;
+
+    select to_jsonb(t)
+        || jsonb_build_object('categorias', jsonb_build_object('nombre', c.nombre))
+        || jsonb_build_object('estatus', jsonb_build_object('nombre', e.nombre))
+    into v_tarea
+    from tareas t
+    join categorias c on c.id_categoria = t.id_categoria
+    join estatus e on e.id_estatus = t.id_estatus
+    where t.id_tarea = p_id_tarea;
+
+    return json_build_object('estado', 'ok', 'tarea', v_tarea);
+end;
+$$;
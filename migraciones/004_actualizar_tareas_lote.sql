@@ -0,0 +1,34 @@
+-- Actualizar varias tareas con una sola sentencia. p_cambios es un arreglo de
+-- objetos con 'id_tarea' y solo los campos a modificar. La propiedad de las
+-- tareas se comprueba antes en la API. Devuelve las tareas actualizadas con
+-- los nombres de categoría y estatus.
+create or replace function actualizar_tareas_lote(p_cambios jsonb)
+returns json
+language sql
+as $$
+    with cambios as (
+        select elemento as datos, (jsonb_populate_record(null::tareas, elemento)).*
+        from jsonb_array_elements(p_cambios) as elemento
+    ),
+    actualizadas as (
+        update tareas t set
+            titulo = case when c.datos ? 'titulo' then c.titulo else t.titulo end,
+            descripcion = case when c.datos ? 'descripcion' then c.descripcion else t.descripcion end,
+            prioridad = case when c.datos ? 'prioridad' then c.prioridad else t.prioridad end,
+            fecha_vencimiento = case when c.datos ? 'fecha_vencimiento' then c.fecha_vencimiento else t.fecha_vencimiento end,
+            id_categoria = case when c.datos ? 'id_categoria' then c.id_categoria else t.id_categoria end,
+            id_estatus = case when c.datos ? 'id_estatus' then c.id_estatus else t.id_estatus end
+        from cambios c
+        where t.id_tarea = c.id_tarea
+        returning t.*
+    )
+    select coalesce(json_agg(
+        to_jsonb(a)
+        || jsonb_build_object('categorias', jsonb_build_object('nombre', cat.nombre))
+        || jsonb_build_object('estatus', jsonb_build_object('nombre', e.nombre))
+        order by a.id_tarea
+    ), '[]'::json)
+    from actualizadas a
+    join categorias cat on cat.id_categoria = a.id_categoria
+    join estatus e on e.id_estatus = a.id_estatus;
+$$;
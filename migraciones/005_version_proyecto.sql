@@ -0,0 +1,68 @@
+-- Versión de cada proyecto: se incrementa con cualquier cambio en sus tareas o
+-- categorías. La API la usa para generar ETag y responder 304 sin leer datos.
+alter table proyectos
+    add column if not exists version bigint not null default 0;
+
+create or replace function incrementar_version_proyecto()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'INSERT' then
+        update proyectos set version = version + 1
+        where id_proyecto in (select distinct id_proyecto from filas_nuevas);
+    elsif tg_op = 'UPDATE' then
+        -- Solo las filas que cambiaron de verdad: los upserts con
+        -- 'on conflict do update' de 002/003 reescriben la fila con los mismos
+        -- valores y no deben invalidar ETags ni snapshots. Es el equivalente
+        -- a 'when (old.* is distinct from new.*)', que un trigger por
+        -- sentencia no admite.
+        update proyectos set version = version + 1
+        where id_proyecto in (
+            select id_proyecto from (
+                select * from filas_nuevas
+                except
+                select * from filas_anteriores
+            ) as nuevas
+            union
+            select id_proyecto from (
+                select * from filas_anteriores
+                except
+                select * from filas_nuevas
+            ) as anteriores
+        );
+    else
+        update proyectos set version = version + 1
+        where id_proyecto in (select distinct id_proyecto from filas_anteriores);
+    end if;
+    return null;
+end;
+$$;
+
+-- Triggers por sentencia: un lote de 1000 tareas incrementa la versión una vez.
+-- Se borran antes de crearlos para poder aplicar la migración de nuevo.
+drop trigger if exists tareas_version_insert on tareas;
+create trigger tareas_version_insert after insert on tareas
+    referencing new table as filas_nuevas
+    for each statement execute function incrementar_version_proyecto();
+drop trigger if exists tareas_version_update on tareas;
+create trigger tareas_version_update after update on tareas
+    referencing new table as filas_nuevas old table as filas_anteriores
+    for each statement execute function incrementar_version_proyecto();
+drop trigger if exists tareas_version_delete on tareas;
+create trigger tareas_version_delete after delete on tareas
+    referencing old table as filas_anteriores
+    for each statement execute function incrementar_version_proyecto();
+
+drop trigger if exists categorias_version_insert on categorias;
+create trigger categorias_version_insert after insert on categorias
+    referencing new table as filas_nuevas
+    for each statement execute function incrementar_version_proyecto();
+drop trigger if exists categorias_version_update on categorias;
+create trigger categorias_version_update after update on categorias
+    referencing new table as filas_nuevas old table as filas_anteriores
+    for each statement execute function incrementar_version_proyecto();
+drop trigger if exists categorias_version_delete on categorias;
+create trigger categorias_version_delete after delete on categorias
+    referencing old table as filas_anteriores
+    for each statement execute function incrementar_version_proyecto();
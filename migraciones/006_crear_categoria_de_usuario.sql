@@ -0,0 +1,22 @@
+-- Crear una categoría solo si el proyecto pertenece al usuario, en una sola
+-- sentencia. Devuelve la categoría creada o null si el proyecto no existe o
+-- no es del usuario.
+create or replace function crear_categoria_de_usuario(
+    p_id_proyecto integer,
+    p_id_usuario integer,
+    p_nombre text
+)
+returns json
+language sql
+as $$
+    insert into categorias (nombre, id_proyecto)
+    select p_nombre, p.id_proyecto
+    from proyectos p
+    where p.id_proyecto = p_id_proyecto
+      and p.id_usuario_creador = p_id_usuario
+    returning json_build_object(
+        'id_categoria', id_categoria,
+        'nombre', nombre,
+        'id_proyecto', id_proyecto
+    );
+$$;
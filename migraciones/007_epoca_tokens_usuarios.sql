@@ -0,0 +1,34 @@
+-- Época de los tokens de cada usuario: los tokens de refresco llevan la época
+-- con la que se emitieron y dejan de valer cuando se incrementa (logout o
+-- cambio de contraseña).
+alter table usuarios
+    add column if not exists epoca_tokens integer not null default 0;
+
+-- Incrementar la época en una sola sentencia; devuelve la nueva o null si el
+-- usuario no existe.
+create or replace function revocar_tokens_usuario(p_id_usuario integer)
+returns integer
+language sql
+as $$
+    update usuarios
+    set epoca_tokens = epoca_tokens + 1
+    where id_usuario = p_id_usuario
+    returning epoca_tokens;
+$$;
+
+-- Cambiar la contraseña e incrementar la época en la misma sentencia: los
+-- tokens de refresco emitidos con la contraseña anterior dejan de valer.
+-- Devuelve {"id_usuario", "email", "epoca_tokens"} o null si no existe.
+create or replace function cambiar_contrasena_usuario(p_id_usuario integer, p_contrasena text)
+returns json
+language sql
+as $$
+    with actualizado as (
+        update usuarios
+        set contrasena = p_contrasena,
+            epoca_tokens = epoca_tokens + 1
+        where id_usuario = p_id_usuario
+        returning id_usuario, email, epoca_tokens
+    )
+    select row_to_json(actualizado) from actualizado;
+$$;
@@ -0,0 +1,87 @@
+-- Búsqueda de texto en las tareas de un proyecto (GET /proyectos/<id>/tareas/buscar).
+-- El texto se normaliza como en busqueda.py (minúsculas y sin acentos) y se
+-- indexa con un GIN de expresión por (proyecto, título + descripción): el
+-- índice se mantiene solo con cada insert, update o delete de tareas y no
+-- añade columnas a las filas que devuelve la API.
+create extension if not exists unaccent;
+create extension if not exists btree_gin;
+
+-- unaccent no es inmutable (depende del diccionario); fijándolo se puede usar
+-- en un índice
+create or replace function texto_busqueda(p_texto text)
+returns text
+language sql
+immutable
+parallel safe
+as $$
+    select lower(public.unaccent('public.unaccent'::regdictionary, coalesce(p_texto, '')));
+$$;
+
+-- El título pesa como 'A' y la descripción como 'B' en ts_rank
+create or replace function vector_busqueda_tarea(p_titulo text, p_descripcion text)
+returns tsvector
+language sql
+immutable
+parallel safe
+as $$
+    select setweight(to_tsvector('simple', texto_busqueda(p_titulo)), 'A')
+        || setweight(to_tsvector('simple', texto_busqueda(p_descripcion)), 'B');
+$$;
+
+create index if not exists tareas_busqueda_idx on tareas
+    using gin (id_proyecto, vector_busqueda_tarea(titulo, descripcion));
+
+-- Tareas del proyecto que contienen todos los términos (ya normalizados por
+-- la API; el último también como prefijo), de mayor a menor relevancia y
+-- paginadas por desplazamiento. Resultado: {"version": n, "tareas": [...]}
+-- con los nombres de categoría y estatus, o null si el proyecto no existe o
+-- no es del usuario.
+create or replace function buscar_tareas(
+    p_id_proyecto integer,
+    p_id_usuario integer,
+    p_terminos text[],
+    p_desplazamiento integer default 0,
+    p_limite integer default 20
+)
+returns json
+language sql
+stable
+as $$
+    with proyecto as (
+        select id_proyecto, version
+        from proyectos
+        where id_proyecto = p_id_proyecto
+          and id_usuario_creador = p_id_usuario
+    ),
+    consulta as (
+        select to_tsquery('simple', string_agg(
+            quote_literal(termino) || case when posicion = cardinality(p_terminos) then ':*' else '' end,
+            ' & ' order by posicion)) as q
+        from unnest(p_terminos) with ordinality as t(termino, posicion)
+    ),
+    aciertos as (
+        select t.id_tarea, t.titulo, t.descripcion, t.prioridad, t.fecha_creacion, t.fecha_vencimiento,
+               t.id_proyecto, t.id_categoria, t.id_estatus,
+               ts_rank(vector_busqueda_tarea(t.titulo, t.descripcion), consulta.q) as relevancia
+        from tareas t, consulta, proyecto
+        where t.id_proyecto = proyecto.id_proyecto
+          and vector_busqueda_tarea(t.titulo, t.descripcion) @@ consulta.q
+        order by relevancia desc, t.id_tarea
+        offset p_desplazamiento
+        limit p_limite
+    )
+    select json_build_object(
+        'version', proyecto.version,
+        'tareas', coalesce((
+            select json_agg(
+                to_jsonb(a)
+                    || jsonb_build_object('categorias', jsonb_build_object('nombre', c.nombre))
+                    || jsonb_build_object('estatus', jsonb_build_object('nombre', e.nombre))
+                order by a.relevancia desc, a.id_tarea)
+            from aciertos a
+            join categorias c on c.id_categoria = a.id_categoria
+            join estatus e on e.id_estatus = a.id_estatus
+        ), '[]'::json)
+    )
+    from proyecto;
+$$;
@@ -0,0 +1,41 @@
+-- Índices para los filtros y el orden de GET /proyectos/<id>/tareas y
+-- /tablero (?prioridad_min=, ?prioridad_max=, ?estatus=, ?id_categoria=,
+-- ?vence_antes=, ?vence_despues=, ?sort=). Todas las consultas fijan el
+-- proyecto, así que id_proyecto va primero; id_tarea al final cubre el
+-- desempate ascendente que la API añade siempre al orden y permite leer una
+-- página en orden sin ordenar el resto del proyecto.
+-- Un índice recorrido al revés solo sirve si todas las columnas del orden
+-- son descendentes, y el desempate por id_tarea es siempre ascendente: un
+-- orden descendente necesita su propio índice (solo -prioridad lo tiene; con
+-- -fecha_creacion o -fecha_vencimiento Postgres ordena las filas filtradas).
+--
+-- SIN TRANSACCIÓN: 'create index concurrently' no bloquea las escrituras
+-- mientras se construye, pero falla dentro de una transacción. Este archivo
+-- no debe pasar por un ejecutor de migraciones que envuelva cada archivo en
+-- una transacción; se aplica aparte, sentencia a sentencia en autocommit:
+--     psql "$DATABASE_URL" -f migraciones/009_indices_filtros_tareas_sin_transaccion.sql
+-- Si una construcción falla queda un índice inválido: hay que borrarlo
+-- (drop index concurrently) antes de volver a ejecutar el archivo.
+
+create index concurrently if not exists tareas_proyecto_prioridad_idx
+    on tareas (id_proyecto, prioridad, id_tarea);
+
+-- El orden por prioridad más habitual es de mayor a menor y luego por id
+create index concurrently if not exists tareas_proyecto_prioridad_desc_idx
+    on tareas (id_proyecto, prioridad desc, id_tarea);
+
+-- Rangos de vencimiento (vence_antes / vence_despues) y orden por fecha; los
+-- NULL quedan al final como en el orden ascendente de la API
+create index concurrently if not exists tareas_proyecto_vencimiento_idx
+    on tareas (id_proyecto, fecha_vencimiento, id_tarea);
+
+create index concurrently if not exists tareas_proyecto_creacion_idx
+    on tareas (id_proyecto, fecha_creacion, id_tarea);
+
+-- ?estatus= filtra por nombre a través del join con estatus (tabla pequeña):
+-- el planificador resuelve los ids y busca por (proyecto, estatus)
+create index concurrently if not exists tareas_proyecto_estatus_idx
+    on tareas (id_proyecto, id_estatus, id_tarea);
+
+create index concurrently if not exists tareas_proyecto_categoria_idx
+    on tareas (id_proyecto, id_categoria, id_tarea);
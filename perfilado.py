@@ -0,0 +1,153 @@
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import g, request
+
+CABECERA = 'X-Profile'
+
+logger = logging.getLogger(__name__)
+
+
+# Valor de la cabecera X-Profile: '<expira>:<firma>' con la firma HMAC-SHA256
+# del instante de expiración (unix), para que una cabecera filtrada caduque
+def firmar(secreto, expira):
+    firma = hmac.new(secreto.encode(), str(int(expira)).encode(), hashlib.sha256).hexdigest()
+    return f'{int(expira)}:{firma}'
+
+
+# Una cabecera no ASCII nunca es válida (y compare_digest no admite str con
+# esos caracteres); se comparan bytes
+def firma_valida(secreto, valor):
+    if not valor.isascii():
+        return False
+    expira = valor.partition(':')[0]
+    if not expira.isdigit() or int(expira) < time.time():
+        return False
+    return hmac.compare_digest(firmar(secreto, expira).encode(), valor.encode())
+
+
+# Perfilado de peticiones con cProfile, solo para las elegidas por muestreo
+# (probabilidad 'muestreo', opcionalmente limitado a algunos endpoints) o por
+# una cabecera firmada con 'secreto'. Cada captura se guarda en 'directorio'
+# como <instante>-<método>-<ruta>-<ms>ms.prof (abrir con pstats o snakeviz)
+# junto a un .txt con las etiquetas y las funciones más costosas; se conservan
+# las 'max_capturas' más recientes. Solo se perfila una petición a la vez (en
+# modo ASGI el perfil incluye también las corrutinas intercaladas en el bucle).
+class Perfilador:
+    def __init__(self, directorio, muestreo=0.0, secreto=None, endpoints=None, max_capturas=200):
+        self.directorio = directorio
+        self.muestreo = muestreo
+        self.secreto = secreto
+        self.endpoints = set(endpoints or ())
+        self.max_capturas = max_capturas
+        self._ocupado = threading.Lock()
+        self._lock_archivos = threading.Lock()
+
+    @property
+    def activo(self):
+        return self.muestreo > 0 or bool(self.secreto)
+
+    def elegir(self):
+        valor = request.headers.get(CABECERA)
+        if valor and self.secreto and firma_valida(self.secreto, valor):
+            return True
+        # Los endpoints de la API llevan el prefijo del blueprint ('api.login')
+        if self.endpoints and (request.endpoint or '').rpartition('.')[2] not in self.endpoints:
+            return False
+        return self.muestreo > 0 and random.random() < self.muestreo
+
+    def iniciar(self):
+        if not self.elegir() or not self._ocupado.acquire(blocking=False):
+            return
+        import cProfile
+
+        g.perfil = cProfile.Profile()
+        g.inicio_perfil = time.perf_counter()
+        g.perfil.enable()
+
+    def terminar(self):
+        perfil = g.pop('perfil', None)
+        if perfil is None:
+            return
+        perfil.disable()
+        self._ocupado.release()
+        etiquetas = {
+            'fecha': datetime.now().isoformat(timespec='milliseconds'),
+            'metodo': request.method,
+            'ruta': request.url_rule.rule if request.url_rule is not None else request.path,
+            'endpoint': request.endpoint,
+            'estado': g.get('estado_perfil'),
+            'duracion_ms': round((time.perf_counter() - g.inicio_perfil) * 1000, 3),
+            'llamadas_backend': g.get('llamadas_backend'),
+            'tiempo_backend_ms': round(g.tiempo_backend * 1000, 3) if 'tiempo_backend' in g else None
+        }
+        # Escribir fuera del hilo de la petición
+        threading.Thread(target=self._guardar, args=(perfil, etiquetas), daemon=True).start()
+
+    def _guardar(self, perfil, etiquetas):
+        import pstats
+
+        try:
+            ruta = re.sub(r'[^A-Za-z0-9]+', '_', etiquetas['ruta']).strip('_') or 'raiz'
+            nombre = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{etiquetas['metodo']}-{ruta}-{int(etiquetas['duracion_ms'])}ms"
+            base = os.path.join(self.directorio, nombre)
+            os.makedirs(self.directorio, exist_ok=True)
+            perfil.dump_stats(base + '.prof')
+
+            resumen = io.StringIO()
+            resumen.write(json.dumps(etiquetas, ensure_ascii=False, indent=2) + '\n\n')
+            pstats.Stats(perfil, stream=resumen).sort_stats('cumulative').print_stats(40)
+            with open(base + '.txt', 'w', encoding='utf-8') as archivo:
+                archivo.write(resumen.getvalue())
+            self._rotar()
+        except Exception as e:
+            logger.warning(f'No se pudo guardar el perfil: {e}')
+
+    def _rotar(self):
+        with self._lock_archivos:
+            capturas = sorted(nombre[:-5] for nombre in os.listdir(self.directorio) if nombre.endswith('.prof'))
+            for nombre in capturas[:max(0, len(capturas) - self.max_capturas)]:
+                for extension in ('.prof', '.txt'):
+                    try:
+                        os.remove(os.path.join(self.directorio, nombre + extension))
+                    except FileNotFoundError:
+                        pass
+
+
+# Los hooks solo se registran si el perfilado está activo: desactivado no
+# añade ningún coste a las peticiones
+def instalar(app, perfilador):
+    if not perfilador.activo:
+        return
+
+    @app.before_request
+    def iniciar_perfil():
+        perfilador.iniciar()
+
+    @app.after_request
+    def estado_perfil(response):
+        if 'perfil' in g:
+            g.estado_perfil = response.status_code
+        return response
+
+    @app.teardown_request
+    def terminar_perfil(error=None):
+        perfilador.terminar()
+
+
+# Generar una cabecera firmada: python perfilado.py <secreto> [segundos]
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit('Uso: python perfilado.py <secreto> [segundos de validez]')
+    validez = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    print(f'{CABECERA}: {firmar(sys.argv[1], time.time() + validez)}')
@@ -0,0 +1,23 @@
+import os
+import weakref
+
+# Objetos con recursos propios de cada proceso (pool de procesos de hash,
+# cliente HTTP del backend) que un proceso hijo recién creado con fork debe
+# descartar: los vuelve a crear con su primer uso. Un único hook por proceso
+# recorre los objetos vivos; registrarlos no los mantiene en memoria ni añade
+# un callback por cada aplicación o prueba que los crea.
+_vivos = weakref.WeakSet()
+
+
+# 'objeto' implementa descartar_heredado()
+def descartar_tras_fork(objeto):
+    _vivos.add(objeto)
+
+
+def _descartar_heredados():
+    for objeto in list(_vivos):
+        objeto.descartar_heredado()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_descartar_heredados)
@@ -0,0 +1,982 @@
+import asyncio
+import copy
+import random
+import threading
+import time
+from datetime import datetime
+
+from busqueda import IndiceTareas
+from procesos import descartar_tras_fork
+
+
+# Columnas de una tarea con los nombres de categoría y estatus (joins)
+CAMPOS_TAREA = '''
+    id_tarea,
+    titulo,
+    descripcion,
+    prioridad,
+    fecha_creacion,
+    fecha_vencimiento,
+    id_proyecto,
+    id_categoria,
+    id_estatus,
+    categorias!inner(nombre),
+    estatus!inner(nombre)
+'''
+
+# Columnas de tareas y proyectos que se pueden pedir por separado (fields=)
+COLUMNAS_TAREA = ('id_tarea', 'titulo', 'descripcion', 'prioridad', 'fecha_creacion', 'fecha_vencimiento',
+                  'id_proyecto', 'id_categoria', 'id_estatus')
+COLUMNAS_PROYECTO = ('id_proyecto', 'nombre', 'id_grupo', 'id_usuario_creador', 'fecha_creacion')
+# Columnas de una tarea que se pueden cambiar (migraciones/003 y 004)
+COLUMNAS_ACTUALIZABLES = frozenset({'titulo', 'descripcion', 'prioridad', 'fecha_vencimiento', 'id_categoria', 'id_estatus'})
+
+
+# Selección de tareas con solo algunas columnas (los joins se mantienen para
+# conservar la semántica de !inner)
+def seleccion_tareas(columnas=None):
+    if columnas is None:
+        return CAMPOS_TAREA
+    return ', '.join(list(columnas) + ['categorias!inner(nombre)', 'estatus!inner(nombre)'])
+
+
+# Operaciones que se pueden repetir sin efectos adicionales (lecturas y
+# upserts): la política de resiliencia solo reintenta estas
+OPERACIONES_IDEMPOTENTES = frozenset({
+    'calentar', 'usuarios.existe', 'usuarios.obtener', 'usuarios.por_email', 'usuarios.email_registrado',
+    'usuarios.contrasena', 'proyectos.listar', 'proyectos.obtener', 'proyectos.de_usuario', 'categorias.listar',
+    'categorias.obtener_o_crear', 'categorias.obtener_o_crear_varias', 'estatus.obtener_o_crear',
+    'estatus.listar', 'estatus.obtener_o_crear_varios', 'tareas.listar', 'tareas.buscar', 'tareas.tablero', 'tareas.propietario', 'tareas.propietarios'
+})
+# Lecturas que se cubren con una segunda copia si la primera tarda (tablero y
+# búsqueda, las más costosas)
+OPERACIONES_CUBIERTAS = frozenset({'tareas.tablero', 'tareas.buscar'})
+
+
+# Código de Postgres para la violación de una clave única
+CODIGO_DUPLICADO = '23505'
+
+
+# El registro choca con una clave única (la categoría o el estatus ya existe);
+# las rutas responden 409
+class Duplicado(Exception):
+    pass
+
+
+# Capa de acceso a datos: cada método equivale a un único viaje al backend
+class Repositorio:
+    # Función opcional (nombre, segundos, excepción o None) que se llama tras
+    # cada llamada al backend (con sus reintentos); la usan las métricas
+    observador = None
+    # resiliencia.Politica opcional: plazo, reintentos, copias y disyuntor
+    politica = None
+
+    def __init__(self):
+        self.llamadas = 0
+        self._lock_llamadas = threading.Lock()
+
+    # Punto único por el que pasa toda llamada al backend
+    def _ejecutar(self, nombre, operacion):
+        observador = self.observador
+        if observador is None:
+            return self._con_politica(nombre, operacion)
+        inicio = time.perf_counter()
+        error = None
+        try:
+            return self._con_politica(nombre, operacion)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            observador(nombre, time.perf_counter() - inicio, error)
+
+    def _con_politica(self, nombre, operacion):
+        politica = self.politica
+        if politica is None:
+            return self._viaje(operacion)
+        return politica.ejecutar(nombre, lambda: self._viaje(operacion),
+                                 nombre in OPERACIONES_IDEMPOTENTES, nombre in OPERACIONES_CUBIERTAS)
+
+    # Cada intento (o copia) es un viaje. La violación de una clave única
+    # (APIError de PostgREST con code 23505) se traduce a Duplicado
+    def _viaje(self, operacion):
+        with self._lock_llamadas:
+            self.llamadas += 1
+        try:
+            return operacion()
+        except Exception as e:
+            if getattr(e, 'code', None) == CODIGO_DUPLICADO:
+                raise Duplicado(str(e)) from e
+            raise
+
+    @staticmethod
+    def _primera(filas):
+        return filas[0] if filas else None
+
+    # Versión del proyecto si pertenece al usuario (None si no)
+    def version_proyecto(self, proyecto_id, usuario_id):
+        proyecto = self.obtener_proyecto(proyecto_id, usuario_id, 'version')
+        return proyecto['version'] if proyecto else None
+
+
+# ========================== BACKEND SUPABASE ==========================
+
+# Consultas de lectura compartidas por el cliente síncrono y el asíncrono
+# (el constructor de consultas de PostgREST es el mismo; solo cambia execute)
+class ConsultasSupabase:
+    def _tabla(self, nombre):
+        return self.cliente.table(nombre)
+
+    def _consulta_usuario_existe(self, usuario_id):
+        return self._tabla('usuarios').select('id_usuario').eq('id_usuario', usuario_id)
+
+    def _consulta_proyecto(self, proyecto_id, usuario_id, campos='*'):
+        return self._tabla('proyectos').select(campos).eq('id_proyecto', proyecto_id).eq('id_usuario_creador', usuario_id)
+
+    # Las lecturas por proyecto parten de 'proyectos' filtrado por creador y
+    # traen los datos embebidos: un solo viaje que distingue "no encontrado"
+    # (None) de "sin datos" (lista vacía).
+    def _consulta_categorias(self, proyecto_id, usuario_id):
+        return self._consulta_proyecto(proyecto_id, usuario_id, 'version, categorias(id_categoria, nombre, id_proyecto)')
+
+    # Filtros y orden de las tareas embebidas, resueltos en la base de datos
+    # (índices en migraciones/009_indices_filtros_tareas_sin_transaccion.sql).
+    # El filtro por nombre de estatus actúa sobre el join !inner y descarta la
+    # tarea.
+    @staticmethod
+    def _filtrar_tareas(consulta, filtros, orden):
+        filtros = filtros or {}
+        if 'prioridad_min' in filtros:
+            consulta = consulta.gte('tareas.prioridad', filtros['prioridad_min'])
+        if 'prioridad_max' in filtros:
+            consulta = consulta.lte('tareas.prioridad', filtros['prioridad_max'])
+        if 'estatus' in filtros:
+            consulta = consulta.in_('tareas.estatus.nombre', filtros['estatus'])
+        if 'id_categoria' in filtros:
+            consulta = consulta.in_('tareas.id_categoria', filtros['id_categoria'])
+        if 'vence_antes' in filtros:
+            consulta = consulta.lt('tareas.fecha_vencimiento', filtros['vence_antes'])
+        if 'vence_despues' in filtros:
+            consulta = consulta.gt('tareas.fecha_vencimiento', filtros['vence_despues'])
+        for columna, descendente in orden or ():
+            consulta = consulta.order(columna, desc=descendente, foreign_table='tareas')
+        return consulta
+
+    # Con 'orden' la página se elige por posición ('desplazamiento') en lugar
+    # de por id
+    def _consulta_tareas(self, proyecto_id, usuario_id, columnas=None, despues_de=None, limite=None, filtros=None,
+                         orden=None, desplazamiento=None):
+        consulta = self._consulta_proyecto(proyecto_id, usuario_id, f'version, tareas({seleccion_tareas(columnas)})')
+        if despues_de is not None:
+            consulta = consulta.gt('tareas.id_tarea', despues_de)
+        if not orden and limite is not None:
+            orden = (('id_tarea', False),)
+        consulta = self._filtrar_tareas(consulta, filtros, orden)
+        if limite is not None:
+            desplazamiento = desplazamiento or 0
+            consulta = consulta.range(desplazamiento, desplazamiento + limite - 1, foreign_table='tareas')
+        return consulta
+
+    def _consulta_tablero(self, proyecto_id, usuario_id, filtros=None, orden=None):
+        return self._filtrar_tareas(self._consulta_proyecto(proyecto_id, usuario_id, f'*, tareas({CAMPOS_TAREA})'),
+                                    filtros, orden)
+
+    # (version, filas embebidas) o None si el proyecto no es del usuario
+    @staticmethod
+    def _version_y(proyecto, tabla):
+        if proyecto is None:
+            return None
+        return proyecto['version'], proyecto[tabla] or []
+
+    @staticmethod
+    def _proyecto_y_tareas(proyecto):
+        if proyecto is None:
+            return None
+        return proyecto, proyecto.pop('tareas') or []
+
+
+class RepositorioSupabase(ConsultasSupabase, Repositorio):
+    # Con 'fabrica' el cliente se crea en la primera consulta y se descarta en
+    # los procesos hijos tras un fork: cada worker abre sus propias conexiones
+    def __init__(self, cliente=None, fabrica=None):
+        super().__init__()
+        self._cliente = cliente
+        self._fabrica = fabrica
+        self._lock_cliente = threading.Lock()
+        if fabrica is not None:
+            descartar_tras_fork(self)
+
+    def descartar_heredado(self):
+        self._cliente = None
+        self._lock_cliente = threading.Lock()
+
+    @property
+    def cliente(self):
+        if self._cliente is None:
+            with self._lock_cliente:
+                if self._cliente is None:
+                    self._cliente = self._fabrica()
+        return self._cliente
+
+    # Crear el cliente y abrir una conexión antes de recibir tráfico
+    def calentar(self):
+        self._ejecutar('calentar', lambda: self._tabla('usuarios').select('id_usuario').limit(1).execute())
+
+    # ---------- Usuarios ----------
+
+    def usuario_existe(self, usuario_id):
+        return bool(self._ejecutar('usuarios.existe', lambda: self._consulta_usuario_existe(usuario_id).execute().data))
+
+    def obtener_usuario(self, usuario_id):
+        return self._primera(self._ejecutar('usuarios.obtener', lambda: self._tabla('usuarios').select('*').eq('id_usuario', usuario_id).execute().data))
+
+    def obtener_usuario_por_email(self, email):
+        return self._primera(self._ejecutar('usuarios.por_email', lambda: self._tabla('usuarios').select('*').eq('email', email).execute().data))
+
+    def email_registrado(self, email, excluir_id=None):
+        def operacion():
+            consulta = self._tabla('usuarios').select('id_usuario').eq('email', email)
+            if excluir_id is not None:
+                consulta = consulta.neq('id_usuario', excluir_id)
+            return consulta.execute().data
+        return bool(self._ejecutar('usuarios.email_registrado', operacion))
+
+    def obtener_contrasena(self, usuario_id):
+        usuario = self._primera(self._ejecutar('usuarios.contrasena', lambda: self._tabla('usuarios').select('contrasena').eq('id_usuario', usuario_id).execute().data))
+        return usuario['contrasena'] if usuario else None
+
+    def crear_usuario(self, datos):
+        return self._primera(self._ejecutar('usuarios.crear', lambda: self._tabla('usuarios').insert(datos).execute().data))
+
+    # Invalidar los tokens emitidos hasta ahora; devuelve la nueva época
+    def revocar_tokens(self, usuario_id):
+        return self._ejecutar('usuarios.revocar_tokens', lambda: self.cliente.rpc('revocar_tokens_usuario', {
+            'p_id_usuario': usuario_id
+        }).execute().data)
+
+    # Guardar la nueva contraseña e invalidar los tokens emitidos hasta ahora en
+    # una sola sentencia; devuelve id_usuario, email y la nueva epoca_tokens, o
+    # None si el usuario no existe
+    def cambiar_contrasena(self, usuario_id, contrasena):
+        return self._ejecutar('usuarios.cambiar_contrasena', lambda: self.cliente.rpc('cambiar_contrasena_usuario', {
+            'p_id_usuario': usuario_id,
+            'p_contrasena': contrasena
+        }).execute().data)
+
+    def actualizar_usuario(self, usuario_id, datos):
+        return self._primera(self._ejecutar('usuarios.actualizar', lambda: self._tabla('usuarios').update(datos).eq('id_usuario', usuario_id).execute().data))
+
+    # ---------- Proyectos ----------
+
+    def crear_proyecto(self, datos):
+        return self._primera(self._ejecutar('proyectos.crear', lambda: self._tabla('proyectos').insert(datos).execute().data))
+
+    # Proyecto y categorías por defecto en una sola transacción (RPC)
+    def crear_proyecto_con_categorias(self, datos, categorias):
+        resultado = self._ejecutar('proyectos.crear_con_categorias', lambda: self.cliente.rpc('crear_proyecto_con_categorias', {
+            'p_nombre': datos['nombre'],
+            'p_id_grupo': datos['id_grupo'],
+            'p_id_usuario_creador': datos['id_usuario_creador'],
+            'p_categorias': list(categorias)
+        }).execute().data)
+        if not resultado:
+            return None, []
+        return resultado['proyecto'], resultado['categorias'] or []
+
+    # Paginación por clave (keyset): filas con id mayor que 'despues_de', ordenadas por id
+    def listar_proyectos(self, usuario_id, columnas=None, despues_de=None, limite=None):
+        def operacion():
+            consulta = self._tabla('proyectos').select(', '.join(columnas) if columnas else '*').eq('id_usuario_creador', usuario_id)
+            if despues_de is not None:
+                consulta = consulta.gt('id_proyecto', despues_de)
+            if limite is not None:
+                consulta = consulta.order('id_proyecto').limit(limite)
+            return consulta.execute().data
+        return self._ejecutar('proyectos.listar', operacion) or []
+
+    def obtener_proyecto(self, proyecto_id, usuario_id, campos='*'):
+        return self._primera(self._ejecutar('proyectos.obtener', lambda: self._consulta_proyecto(proyecto_id, usuario_id, campos).execute().data))
+
+    # Ids de los proyectos indicados que pertenecen al usuario
+    def proyectos_de_usuario(self, proyecto_ids, usuario_id):
+        filas = self._ejecutar('proyectos.de_usuario', lambda: self._tabla('proyectos').select('id_proyecto').in_('id_proyecto', list(proyecto_ids)).eq('id_usuario_creador', usuario_id).execute().data)
+        return {fila['id_proyecto'] for fila in filas or []}
+
+    # ---------- Categorías ----------
+
+    def crear_categoria(self, datos):
+        return self._primera(self._ejecutar('categorias.crear', lambda: self._tabla('categorias').insert(datos).execute().data))
+
+    # Crear la categoría solo si el proyecto es del usuario (RPC); None si no lo es
+    def crear_categoria_de_usuario(self, proyecto_id, usuario_id, nombre):
+        return self._ejecutar('categorias.crear_de_usuario', lambda: self.cliente.rpc('crear_categoria_de_usuario', {
+            'p_id_proyecto': proyecto_id,
+            'p_id_usuario': usuario_id,
+            'p_nombre': nombre
+        }).execute().data)
+
+    # (version, categorias) o None si el proyecto no es del usuario
+    def listar_categorias(self, proyecto_id, usuario_id):
+        return self._version_y(self._primera(self._ejecutar('categorias.listar', lambda: self._consulta_categorias(
+            proyecto_id, usuario_id).execute().data)), 'categorias')
+
+    # Buscar o crear en un solo viaje, seguro ante peticiones concurrentes
+    def obtener_o_crear_categoria(self, proyecto_id, nombre):
+        return self._primera(self._ejecutar('categorias.obtener_o_crear', lambda: self._tabla('categorias').upsert(
+            {'nombre': nombre, 'id_proyecto': proyecto_id}, on_conflict='id_proyecto,nombre').execute().data))
+
+    # Varias (id_proyecto, nombre) a la vez; la lista no debe tener repetidos
+    def obtener_o_crear_categorias(self, pares):
+        return self._ejecutar('categorias.obtener_o_crear_varias', lambda: self._tabla('categorias').upsert(
+            [{'id_proyecto': proyecto_id, 'nombre': nombre} for proyecto_id, nombre in pares],
+            on_conflict='id_proyecto,nombre').execute().data) or []
+
+    # ---------- Estatus ----------
+
+    def listar_estatus(self):
+        return self._ejecutar('estatus.listar', lambda: self._tabla('estatus').select('id_estatus, nombre').execute().data) or []
+
+    def crear_estatus(self, datos):
+        return self._primera(self._ejecutar('estatus.crear', lambda: self._tabla('estatus').insert(datos).execute().data))
+
+    def obtener_o_crear_estatus(self, nombre):
+        return self._primera(self._ejecutar('estatus.obtener_o_crear', lambda: self._tabla('estatus').upsert(
+            {'nombre': nombre}, on_conflict='nombre').execute().data))
+
+    def obtener_o_crear_varios_estatus(self, nombres):
+        return self._ejecutar('estatus.obtener_o_crear_varios', lambda: self._tabla('estatus').upsert(
+            [{'nombre': nombre} for nombre in nombres], on_conflict='nombre').execute().data) or []
+
+    # ---------- Tareas ----------
+
+    def crear_tarea(self, datos):
+        return self._primera(self._ejecutar('tareas.crear', lambda: self._tabla('tareas').insert(datos).execute().data))
+
+    def crear_tareas(self, lista):
+        return self._ejecutar('tareas.crear_varias', lambda: self._tabla('tareas').insert(lista).execute().data) or []
+
+    # (version, tareas) o None si el proyecto no es del usuario
+    def listar_tareas(self, proyecto_id, usuario_id, columnas=None, despues_de=None, limite=None, filtros=None,
+                      orden=None, desplazamiento=None):
+        return self._version_y(self._primera(self._ejecutar('tareas.listar', lambda: self._consulta_tareas(
+            proyecto_id, usuario_id, columnas, despues_de, limite, filtros, orden, desplazamiento).execute().data)), 'tareas')
+
+    # Proyecto y sus tareas (todas, o las que pasan los filtros) con joins;
+    # devuelve (proyecto, tareas) o None
+    def obtener_tablero(self, proyecto_id, usuario_id, filtros=None, orden=None):
+        return self._proyecto_y_tareas(self._primera(self._ejecutar('tareas.tablero', lambda: self._consulta_tablero(
+            proyecto_id, usuario_id, filtros, orden).execute().data)))
+
+    # Búsqueda de texto en el proyecto (RPC sobre el índice GIN de
+    # migraciones/008_busqueda_tareas.sql); devuelve (version, tareas con
+    # 'relevancia') de mayor a menor relevancia, o None si el proyecto no es del usuario
+    def buscar_tareas(self, proyecto_id, usuario_id, terminos, desplazamiento=0, limite=20):
+        resultado = self._ejecutar('tareas.buscar', lambda: self.cliente.rpc('buscar_tareas', {
+            'p_id_proyecto': proyecto_id,
+            'p_id_usuario': usuario_id,
+            'p_terminos': terminos,
+            'p_desplazamiento': desplazamiento,
+            'p_limite': limite
+        }).execute().data)
+        if not resultado:
+            return None
+        return resultado['version'], resultado['tareas']
+
+    def obtener_tarea_con_propietario(self, tarea_id):
+        return self._primera(self._ejecutar('tareas.propietario', lambda: self._tabla('tareas').select('''
+            id_tarea,
+            id_proyecto,
+            id_categoria,
+            id_estatus,
+            proyectos!inner(id_usuario_creador)
+        ''').eq('id_tarea', tarea_id).execute().data))
+
+    def tareas_con_propietario(self, tarea_ids):
+        return self._ejecutar('tareas.propietarios', lambda: self._tabla('tareas').select('''
+            id_tarea,
+            id_proyecto,
+            proyectos!inner(id_usuario_creador)
+        ''').in_('id_tarea', list(tarea_ids)).execute().data) or []
+
+    # Cada elemento lleva 'id_tarea' y los campos a modificar (RPC)
+    def actualizar_tareas(self, cambios):
+        return self._ejecutar('tareas.actualizar_varias', lambda: self.cliente.rpc('actualizar_tareas_lote', {
+            'p_cambios': cambios
+        }).execute().data) or []
+
+    # Comprobar propietario, actualizar y devolver la tarea con joins en un solo viaje (RPC).
+    # Devuelve (estado, tarea) con estado 'ok', 'no_encontrada' o 'no_autorizado'
+    def actualizar_tarea_de_usuario(self, tarea_id, usuario_id, cambios, nombre_categoria=None, nombre_estatus=None):
+        resultado = self._ejecutar('tareas.actualizar_de_usuario', lambda: self.cliente.rpc('actualizar_tarea_de_usuario', {
+            'p_id_tarea': tarea_id,
+            'p_id_usuario': usuario_id,
+            'p_cambios': cambios,
+            'p_nombre_categoria': nombre_categoria,
+            'p_nombre_estatus': nombre_estatus
+        }).execute().data)
+        return resultado['estado'], resultado.get('tarea')
+
+    def eliminar_tarea(self, tarea_id):
+        return self._primera(self._ejecutar('tareas.eliminar', lambda: self._tabla('tareas').delete().eq('id_tarea', tarea_id).execute().data))
+
+    def eliminar_tareas(self, tarea_ids):
+        return self._ejecutar('tareas.eliminar_varias', lambda: self._tabla('tareas').delete().in_('id_tarea', list(tarea_ids)).execute().data) or []
+
+
+# ========================== BACKEND EN MEMORIA ==========================
+
+# Sustituto local con la misma semántica que Supabase (incluidos los joins
+# !inner), útil para desarrollo y para medir sin un proyecto real.
+# 'latencia' simula el tiempo de ida y vuelta de cada llamada (segundos);
+# 'fallos' y 'lentas' son las probabilidades de que una llamada falle con un
+# error de conexión o tarde además 'latencia_lenta' (backend degradado).
+class RepositorioMemoria(Repositorio):
+    def __init__(self, latencia=0.0, fallos=0.0, lentas=0.0, latencia_lenta=0.0):
+        super().__init__()
+        self.latencia = latencia
+        self.fallos = fallos
+        self.lentas = lentas
+        self.latencia_lenta = latencia_lenta
+        self.tablas = {
+            'usuarios': {},
+            'proyectos': {},
+            'categorias': {},
+            'estatus': {},
+            'tareas': {}
+        }
+        self._secuencias = {tabla: 0 for tabla in self.tablas}
+        self._lock = threading.RLock()
+        # Equivalente al índice GIN de búsqueda de texto de las tareas
+        self.indice = IndiceTareas()
+
+    # Demora simulada de un viaje (o el error de conexión simulado)
+    def _demora(self):
+        if self.fallos and random.random() < self.fallos:
+            raise ConnectionError('Fallo simulado del backend')
+        if self.lentas and random.random() < self.lentas:
+            return self.latencia + self.latencia_lenta
+        return self.latencia
+
+    # La latencia simulada cuenta como parte de la llamada
+    def _ejecutar(self, nombre, operacion):
+        def con_latencia():
+            demora = self._demora()
+            if demora:
+                time.sleep(demora)
+            with self._lock:
+                return operacion()
+        return super()._ejecutar(nombre, con_latencia)
+
+    def _insertar(self, tabla, clave, datos, **defectos):
+        self._secuencias[tabla] += 1
+        fila = dict(defectos)
+        fila.update(datos)
+        fila[clave] = self._secuencias[tabla]
+        self.tablas[tabla][fila[clave]] = fila
+        if tabla in ('tareas', 'categorias'):
+            self._incrementar_version(fila['id_proyecto'])
+        return dict(fila)
+
+    # Equivalente a los triggers de migraciones/005_version_proyecto.sql
+    def _incrementar_version(self, proyecto_id):
+        proyecto = self.tablas['proyectos'].get(proyecto_id)
+        if proyecto is not None:
+            proyecto['version'] = proyecto.get('version', 0) + 1
+
+    # Como el trigger de migraciones/005, la versión solo sube si algún valor cambió
+    def _cambiar_tarea(self, tarea, datos):
+        if all(tarea.get(columna) == valor for columna, valor in datos.items()):
+            return
+        tarea.update(datos)
+        self.indice.actualizar(tarea)
+        self._incrementar_version(tarea['id_proyecto'])
+
+    def _eliminar_tarea(self, tarea_id):
+        tarea = self.tablas['tareas'].pop(tarea_id, None)
+        if tarea is not None:
+            self.indice.eliminar(tarea_id)
+            self._incrementar_version(tarea['id_proyecto'])
+        return tarea
+
+    def _buscar(self, tabla, **filtros):
+        return [dict(fila) for fila in self.tablas[tabla].values()
+                if all(fila.get(campo) == valor for campo, valor in filtros.items())]
+
+    # Orden, cursor, límite y proyección de columnas como en PostgREST
+    @classmethod
+    def _pagina(cls, filas, clave, columnas, despues_de, limite, extras=(), orden=None, desplazamiento=None):
+        if despues_de is not None:
+            filas = [fila for fila in filas if fila[clave] > despues_de]
+        if orden:
+            filas = cls._ordenar(filas, orden)
+            if limite is not None:
+                desplazamiento = desplazamiento or 0
+                filas = filas[desplazamiento:desplazamiento + limite]
+        elif limite is not None:
+            filas = sorted(filas, key=lambda fila: fila[clave])[:limite]
+        if columnas is not None:
+            filas = [{columna: fila[columna] for columna in list(columnas) + list(extras)} for fila in filas]
+        return filas
+
+    # Equivalente a ConsultasSupabase._filtrar_tareas sobre filas con joins
+    @staticmethod
+    def _filtrar(filas, filtros):
+        if not filtros:
+            return filas
+        condiciones = []
+        if 'prioridad_min' in filtros:
+            condiciones.append(lambda fila, valor=filtros['prioridad_min']: fila['prioridad'] >= valor)
+        if 'prioridad_max' in filtros:
+            condiciones.append(lambda fila, valor=filtros['prioridad_max']: fila['prioridad'] <= valor)
+        if 'estatus' in filtros:
+            condiciones.append(lambda fila, valores=frozenset(filtros['estatus']): fila['estatus']['nombre'] in valores)
+        if 'id_categoria' in filtros:
+            condiciones.append(lambda fila, valores=frozenset(filtros['id_categoria']): fila['id_categoria'] in valores)
+        # Una tarea sin fecha de vencimiento no cumple ninguna comparación (NULL)
+        if 'vence_antes' in filtros:
+            condiciones.append(lambda fila, valor=filtros['vence_antes']:
+                               fila['fecha_vencimiento'] is not None and fila['fecha_vencimiento'] < valor)
+        if 'vence_despues' in filtros:
+            condiciones.append(lambda fila, valor=filtros['vence_despues']:
+                               fila['fecha_vencimiento'] is not None and fila['fecha_vencimiento'] > valor)
+        return [fila for fila in filas if all(condicion(fila) for condicion in condiciones)]
+
+    # Orden por varias columnas como en Postgres: los NULL van al final en
+    # orden ascendente y al principio en descendente
+    @staticmethod
+    def _ordenar(filas, orden):
+        filas = list(filas)
+        for columna, descendente in reversed(orden):
+            filas.sort(key=lambda fila: (fila[columna] is None, fila[columna]), reverse=descendente)
+        return filas
+
+    def _obtener_o_insertar(self, tabla, clave, **campos):
+        return self._primera(self._buscar(tabla, **campos)) or self._insertar(tabla, clave, campos)
+
+    def _actualizar(self, tabla, clave, datos):
+        fila = self.tablas[tabla].get(clave)
+        if fila is None:
+            return None
+        fila.update(datos)
+        return dict(fila)
+
+    @staticmethod
+    def _ahora():
+        return datetime.utcnow().isoformat()
+
+    # Equivalente a 'categorias!inner(nombre), estatus!inner(nombre)'
+    def _tarea_con_joins(self, tarea):
+        categoria = self.tablas['categorias'].get(tarea['id_categoria'])
+        estatus = self.tablas['estatus'].get(tarea['id_estatus'])
+        if categoria is None or estatus is None:
+            return None
+        fila = dict(tarea)
+        fila['categorias'] = {'nombre': categoria['nombre']}
+        fila['estatus'] = {'nombre': estatus['nombre']}
+        return fila
+
+    # ---------- Usuarios ----------
+
+    def usuario_existe(self, usuario_id):
+        return self._ejecutar('usuarios.existe', lambda: usuario_id in self.tablas['usuarios'])
+
+    def obtener_usuario(self, usuario_id):
+        return self._ejecutar('usuarios.obtener', lambda: self._primera(self._buscar('usuarios', id_usuario=usuario_id)))
+
+    def obtener_usuario_por_email(self, email):
+        return self._ejecutar('usuarios.por_email', lambda: self._primera(self._buscar('usuarios', email=email)))
+
+    def email_registrado(self, email, excluir_id=None):
+        return self._ejecutar('usuarios.email_registrado', lambda: any(
+            usuario['id_usuario'] != excluir_id for usuario in self._buscar('usuarios', email=email)))
+
+    def obtener_contrasena(self, usuario_id):
+        usuario = self._ejecutar('usuarios.contrasena', lambda: self.tablas['usuarios'].get(usuario_id))
+        return usuario['contrasena'] if usuario else None
+
+    def crear_usuario(self, datos):
+        return self._ejecutar('usuarios.crear', lambda: self._insertar('usuarios', 'id_usuario', datos, fecha_registro=self._ahora(), epoca_tokens=0))
+
+    def revocar_tokens(self, usuario_id):
+        def operacion():
+            usuario = self.tablas['usuarios'].get(usuario_id)
+            if usuario is None:
+                return None
+            usuario['epoca_tokens'] += 1
+            return usuario['epoca_tokens']
+        return self._ejecutar('usuarios.revocar_tokens', operacion)
+
+    def cambiar_contrasena(self, usuario_id, contrasena):
+        def operacion():
+            usuario = self.tablas['usuarios'].get(usuario_id)
+            if usuario is None:
+                return None
+            usuario['contrasena'] = contrasena
+            usuario['epoca_tokens'] += 1
+            return {columna: usuario[columna] for columna in ('id_usuario', 'email', 'epoca_tokens')}
+        return self._ejecutar('usuarios.cambiar_contrasena', operacion)
+
+    def actualizar_usuario(self, usuario_id, datos):
+        return self._ejecutar('usuarios.actualizar', lambda: self._actualizar('usuarios', usuario_id, datos))
+
+    # ---------- Proyectos ----------
+
+    def crear_proyecto(self, datos):
+        return self._ejecutar('proyectos.crear', lambda: self._insertar('proyectos', 'id_proyecto', datos, fecha_creacion=self._ahora(), version=0))
+
+    def crear_proyecto_con_categorias(self, datos, categorias):
+        def operacion():
+            proyecto = self._insertar('proyectos', 'id_proyecto', datos, fecha_creacion=self._ahora(), version=0)
+            creadas = [self._insertar('categorias', 'id_categoria', {'nombre': nombre, 'id_proyecto': proyecto['id_proyecto']})
+                       for nombre in categorias]
+            return proyecto, creadas
+        return self._ejecutar('proyectos.crear_con_categorias', operacion)
+
+    def listar_proyectos(self, usuario_id, columnas=None, despues_de=None, limite=None):
+        return self._ejecutar('proyectos.listar', lambda: self._pagina(
+            self._buscar('proyectos', id_usuario_creador=usuario_id), 'id_proyecto', columnas, despues_de, limite))
+
+    def obtener_proyecto(self, proyecto_id, usuario_id, campos='*'):
+        return self._ejecutar('proyectos.obtener', lambda: self._primera(
+            self._buscar('proyectos', id_proyecto=proyecto_id, id_usuario_creador=usuario_id)))
+
+    def proyectos_de_usuario(self, proyecto_ids, usuario_id):
+        def operacion():
+            proyectos = self.tablas['proyectos']
+            return {proyecto_id for proyecto_id in proyecto_ids
+                    if proyecto_id in proyectos and proyectos[proyecto_id]['id_usuario_creador'] == usuario_id}
+        return self._ejecutar('proyectos.de_usuario', operacion)
+
+    # ---------- Categorías ----------
+
+    def crear_categoria(self, datos):
+        def operacion():
+            if self._buscar('categorias', id_proyecto=datos['id_proyecto'], nombre=datos['nombre']):
+                raise Duplicado('duplicate key value violates unique constraint "categorias_id_proyecto_nombre_key"')
+            return self._insertar('categorias', 'id_categoria', datos)
+        return self._ejecutar('categorias.crear', operacion)
+
+    def _proyecto_de_usuario(self, proyecto_id, usuario_id):
+        proyecto = self.tablas['proyectos'].get(proyecto_id)
+        if proyecto is None or proyecto['id_usuario_creador'] != usuario_id:
+            return None
+        return proyecto
+
+    def crear_categoria_de_usuario(self, proyecto_id, usuario_id, nombre):
+        def operacion():
+            if self._proyecto_de_usuario(proyecto_id, usuario_id) is None:
+                return None
+            if self._buscar('categorias', id_proyecto=proyecto_id, nombre=nombre):
+                raise Duplicado('duplicate key value violates unique constraint "categorias_id_proyecto_nombre_key"')
+            return self._insertar('categorias', 'id_categoria', {'nombre': nombre, 'id_proyecto': proyecto_id})
+        return self._ejecutar('categorias.crear_de_usuario', operacion)
+
+    def listar_categorias(self, proyecto_id, usuario_id):
+        def operacion():
+            proyecto = self._proyecto_de_usuario(proyecto_id, usuario_id)
+            if proyecto is None:
+                return None
+            return proyecto['version'], self._buscar('categorias', id_proyecto=proyecto_id)
+        return self._ejecutar('categorias.listar', operacion)
+
+    def obtener_o_crear_categoria(self, proyecto_id, nombre):
+        return self._ejecutar('categorias.obtener_o_crear', lambda: self._obtener_o_insertar(
+            'categorias', 'id_categoria', nombre=nombre, id_proyecto=proyecto_id))
+
+    def obtener_o_crear_categorias(self, pares):
+        return self._ejecutar('categorias.obtener_o_crear_varias', lambda: [
+            self._obtener_o_insertar('categorias', 'id_categoria', nombre=nombre, id_proyecto=proyecto_id)
+            for proyecto_id, nombre in pares])
+
+    # ---------- Estatus ----------
+
+    def listar_estatus(self):
+        return self._ejecutar('estatus.listar', lambda: [dict(fila) for fila in self.tablas['estatus'].values()])
+
+    def crear_estatus(self, datos):
+        def operacion():
+            if self._buscar('estatus', nombre=datos['nombre']):
+                raise Duplicado('duplicate key value violates unique constraint "estatus_nombre_key"')
+            return self._insertar('estatus', 'id_estatus', datos)
+        return self._ejecutar('estatus.crear', operacion)
+
+    def obtener_o_crear_estatus(self, nombre):
+        return self._ejecutar('estatus.obtener_o_crear', lambda: self._obtener_o_insertar('estatus', 'id_estatus', nombre=nombre))
+
+    def obtener_o_crear_varios_estatus(self, nombres):
+        return self._ejecutar('estatus.obtener_o_crear_varios', lambda: [
+            self._obtener_o_insertar('estatus', 'id_estatus', nombre=nombre) for nombre in nombres])
+
+    # ---------- Tareas ----------
+
+    def _insertar_tarea(self, datos):
+        tarea = self._insertar('tareas', 'id_tarea', datos, descripcion='', prioridad=3, fecha_vencimiento=None, fecha_creacion=self._ahora())
+        self.indice.agregar(tarea)
+        return tarea
+
+    def crear_tarea(self, datos):
+        return self._ejecutar('tareas.crear', lambda: self._insertar_tarea(datos))
+
+    def crear_tareas(self, lista):
+        return self._ejecutar('tareas.crear_varias', lambda: [self._insertar_tarea(datos) for datos in lista])
+
+    def _tareas_de_proyecto(self, proyecto_id):
+        tareas = []
+        for tarea in self.tablas['tareas'].values():
+            if tarea['id_proyecto'] == proyecto_id:
+                fila = self._tarea_con_joins(tarea)
+                if fila is not None:
+                    tareas.append(fila)
+        return tareas
+
+    def listar_tareas(self, proyecto_id, usuario_id, columnas=None, despues_de=None, limite=None, filtros=None,
+                      orden=None, desplazamiento=None):
+        def operacion():
+            proyecto = self._proyecto_de_usuario(proyecto_id, usuario_id)
+            if proyecto is None:
+                return None
+            tareas = self._filtrar(self._tareas_de_proyecto(proyecto_id), filtros)
+            return proyecto['version'], self._pagina(tareas, 'id_tarea', columnas, despues_de, limite,
+                                                     extras=('categorias', 'estatus'), orden=orden,
+                                                     desplazamiento=desplazamiento)
+        return self._ejecutar('tareas.listar', operacion)
+
+    def obtener_tablero(self, proyecto_id, usuario_id, filtros=None, orden=None):
+        def operacion():
+            proyecto = self._proyecto_de_usuario(proyecto_id, usuario_id)
+            if proyecto is None:
+                return None
+            tareas = self._filtrar(self._tareas_de_proyecto(proyecto_id), filtros)
+            return dict(proyecto), self._ordenar(tareas, orden) if orden else tareas
+        return self._ejecutar('tareas.tablero', operacion)
+
+    def buscar_tareas(self, proyecto_id, usuario_id, terminos, desplazamiento=0, limite=20):
+        def operacion():
+            proyecto = self._proyecto_de_usuario(proyecto_id, usuario_id)
+            if proyecto is None:
+                return None
+            tareas = []
+            for relevancia, tarea_id in self.indice.buscar(proyecto_id, terminos, desplazamiento, limite):
+                fila = self._tarea_con_joins(self.tablas['tareas'][tarea_id])
+                if fila is not None:
+                    fila['relevancia'] = relevancia
+                    tareas.append(fila)
+            return proyecto['version'], tareas
+        return self._ejecutar('tareas.buscar', operacion)
+
+    def obtener_tarea_con_propietario(self, tarea_id):
+        def operacion():
+            tarea = self.tablas['tareas'].get(tarea_id)
+            proyecto = self.tablas['proyectos'].get(tarea['id_proyecto']) if tarea else None
+            if proyecto is None:
+                return None
+            return {
+                'id_tarea': tarea['id_tarea'],
+                'id_proyecto': tarea['id_proyecto'],
+                'id_categoria': tarea['id_categoria'],
+                'id_estatus': tarea['id_estatus'],
+                'proyectos': {'id_usuario_creador': proyecto['id_usuario_creador']}
+            }
+        return self._ejecutar('tareas.propietario', operacion)
+
+    def tareas_con_propietario(self, tarea_ids):
+        def operacion():
+            filas = []
+            for tarea_id in tarea_ids:
+                tarea = self.tablas['tareas'].get(tarea_id)
+                proyecto = self.tablas['proyectos'].get(tarea['id_proyecto']) if tarea else None
+                if proyecto is not None:
+                    filas.append({
+                        'id_tarea': tarea_id,
+                        'id_proyecto': tarea['id_proyecto'],
+                        'proyectos': {'id_usuario_creador': proyecto['id_usuario_creador']}
+                    })
+            return filas
+        return self._ejecutar('tareas.propietarios', operacion)
+
+    def actualizar_tareas(self, cambios):
+        def operacion():
+            filas = []
+            for datos in cambios:
+                tarea = self.tablas['tareas'].get(datos['id_tarea'])
+                if tarea is None:
+                    continue
+                self._cambiar_tarea(tarea, {columna: valor for columna, valor in datos.items() if columna in COLUMNAS_ACTUALIZABLES})
+                fila = self._tarea_con_joins(tarea)
+                if fila is not None:
+                    filas.append(fila)
+            return filas
+        return self._ejecutar('tareas.actualizar_varias', operacion)
+
+    def actualizar_tarea_de_usuario(self, tarea_id, usuario_id, cambios, nombre_categoria=None, nombre_estatus=None):
+        def operacion():
+            tarea = self.tablas['tareas'].get(tarea_id)
+            proyecto = self.tablas['proyectos'].get(tarea['id_proyecto']) if tarea else None
+            if proyecto is None:
+                return 'no_encontrada', None
+            if proyecto['id_usuario_creador'] != usuario_id:
+                return 'no_autorizado', None
+            # Solo las columnas que aplica la función actualizar_tarea_de_usuario
+            datos = {columna: valor for columna, valor in cambios.items() if columna in COLUMNAS_ACTUALIZABLES}
+            if nombre_categoria is not None:
+                datos['id_categoria'] = self._obtener_o_insertar(
+                    'categorias', 'id_categoria', nombre=nombre_categoria, id_proyecto=tarea['id_proyecto'])['id_categoria']
+            if nombre_estatus is not None:
+                datos['id_estatus'] = self._obtener_o_insertar('estatus', 'id_estatus', nombre=nombre_estatus)['id_estatus']
+            self._cambiar_tarea(tarea, datos)
+            return 'ok', self._tarea_con_joins(tarea)
+        return self._ejecutar('tareas.actualizar_de_usuario', operacion)
+
+    def eliminar_tarea(self, tarea_id):
+        return self._ejecutar('tareas.eliminar', lambda: self._eliminar_tarea(tarea_id))
+
+    def eliminar_tareas(self, tarea_ids):
+        return self._ejecutar('tareas.eliminar_varias', lambda: [
+            tarea for tarea in (self._eliminar_tarea(tarea_id) for tarea_id in tarea_ids) if tarea])
+
+
+# ========================== ACCESO ASÍNCRONO ==========================
+
+# Lecturas de las rutas servidas por asgi.py. Cada método es una corrutina y un
+# único viaje; las consultas independientes se lanzan a la vez con asyncio.gather.
+class RepositorioAsincrono:
+    observador = None
+    politica = None
+
+    def __init__(self):
+        self.llamadas = 0
+        self._lock_llamadas = threading.Lock()
+
+    async def _ejecutar(self, nombre, operacion):
+        observador = self.observador
+        if observador is None:
+            return await self._con_politica(nombre, operacion)
+        inicio = time.perf_counter()
+        error = None
+        try:
+            return await self._con_politica(nombre, operacion)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            observador(nombre, time.perf_counter() - inicio, error)
+
+    async def _con_politica(self, nombre, operacion):
+        politica = self.politica
+        if politica is None:
+            return await self._viaje(operacion)
+        return await politica.ejecutar_asincrono(nombre, lambda: self._viaje(operacion),
+                                                 nombre in OPERACIONES_IDEMPOTENTES, nombre in OPERACIONES_CUBIERTAS)
+
+    async def _viaje(self, operacion):
+        with self._lock_llamadas:
+            self.llamadas += 1
+        return await operacion()
+
+    @staticmethod
+    def _primera(filas):
+        return filas[0] if filas else None
+
+    async def version_proyecto(self, proyecto_id, usuario_id):
+        proyecto = await self.obtener_proyecto(proyecto_id, usuario_id, 'version')
+        return proyecto['version'] if proyecto else None
+
+
+class RepositorioSupabaseAsincrono(ConsultasSupabase, RepositorioAsincrono):
+    def __init__(self, cliente):
+        super().__init__()
+        self.cliente = cliente
+
+    async def _datos(self, nombre, consulta):
+        respuesta = await self._ejecutar(nombre, consulta.execute)
+        return respuesta.data
+
+    async def usuario_existe(self, usuario_id):
+        return bool(await self._datos('usuarios.existe', self._consulta_usuario_existe(usuario_id)))
+
+    async def obtener_proyecto(self, proyecto_id, usuario_id, campos='*'):
+        return self._primera(await self._datos('proyectos.obtener', self._consulta_proyecto(proyecto_id, usuario_id, campos)))
+
+    async def listar_categorias(self, proyecto_id, usuario_id):
+        return self._version_y(self._primera(await self._datos(
+            'categorias.listar', self._consulta_categorias(proyecto_id, usuario_id))), 'categorias')
+
+    async def listar_tareas(self, proyecto_id, usuario_id, columnas=None, despues_de=None, limite=None, filtros=None,
+                            orden=None, desplazamiento=None):
+        return self._version_y(self._primera(await self._datos('tareas.listar', self._consulta_tareas(
+            proyecto_id, usuario_id, columnas, despues_de, limite, filtros, orden, desplazamiento))), 'tareas')
+
+    async def obtener_tablero(self, proyecto_id, usuario_id, filtros=None, orden=None):
+        return self._proyecto_y_tareas(self._primera(await self._datos(
+            'tareas.tablero', self._consulta_tablero(proyecto_id, usuario_id, filtros, orden))))
+
+
+# Vista asíncrona de un RepositorioMemoria: comparte sus tablas y su lock, y la
+# latencia simulada se espera con asyncio.sleep en lugar de bloquear el hilo
+class RepositorioMemoriaAsincrono(RepositorioAsincrono):
+    def __init__(self, repo):
+        super().__init__()
+        self._demora = repo._demora
+        self._repo = copy.copy(repo)
+        self._repo.latencia = self._repo.fallos = self._repo.lentas = 0.0
+        # La llamada se observa (y se reintenta) aquí, no también en el repositorio síncrono
+        self._repo.observador = None
+        self._repo.politica = None
+
+    async def _ejecutar(self, nombre, operacion):
+        async def con_latencia():
+            demora = self._demora()
+            if demora:
+                await asyncio.sleep(demora)
+            return operacion()
+        return await super()._ejecutar(nombre, con_latencia)
+
+    async def usuario_existe(self, usuario_id):
+        return await self._ejecutar('usuarios.existe', lambda: self._repo.usuario_existe(usuario_id))
+
+    async def obtener_proyecto(self, proyecto_id, usuario_id, campos='*'):
+        return await self._ejecutar('proyectos.obtener', lambda: self._repo.obtener_proyecto(proyecto_id, usuario_id, campos))
+
+    async def listar_categorias(self, proyecto_id, usuario_id):
+        return await self._ejecutar('categorias.listar', lambda: self._repo.listar_categorias(proyecto_id, usuario_id))
+
+    async def listar_tareas(self, proyecto_id, usuario_id, columnas=None, despues_de=None, limite=None, filtros=None,
+                            orden=None, desplazamiento=None):
+        return await self._ejecutar('tareas.listar', lambda: self._repo.listar_tareas(
+            proyecto_id, usuario_id, columnas, despues_de, limite, filtros, orden, desplazamiento))
+
+    async def obtener_tablero(self, proyecto_id, usuario_id, filtros=None, orden=None):
+        return await self._ejecutar('tareas.tablero', lambda: self._repo.obtener_tablero(
+            proyecto_id, usuario_id, filtros, orden))
+
+
+# ========================== FÁBRICA ==========================
+
+BACKENDS = ('supabase', 'memoria')
+
+# Crear el repositorio según el backend configurado ('supabase' o 'memoria').
+# 'conexiones' son las opciones del pool HTTP (conexiones.OPCIONES_POR_DEFECTO)
+# y 'observador_pool' recibe la ocupación y la espera de cada petición
+def crear_repositorio(backend, url=None, key=None, conexiones=None, observador_pool=None, **opciones):
+    if backend == 'memoria':
+        return RepositorioMemoria(**opciones)
+    if backend == 'supabase':
+        def fabrica():
+            from conexiones import cliente_http
+            from supabase import ClientOptions, create_client
+            return create_client(url, key, options=ClientOptions(httpx_client=cliente_http(conexiones, observador_pool)))
+        return RepositorioSupabase(fabrica=fabrica)
+    raise ValueError(f'Backend de datos desconocido: {backend}')
+
+
+# El cliente asíncrono de Supabase se crea dentro del bucle de eventos; con el
+# backend en memoria se envuelve el repositorio síncrono para compartir los datos
+async def crear_repositorio_asincrono(backend, url=None, key=None, repo=None, conexiones=None, observador_pool=None):
+    if backend == 'memoria':
+        return RepositorioMemoriaAsincrono(repo)
+    if backend == 'supabase':
+        from conexiones import cliente_http_asincrono
+        from supabase import AsyncClientOptions, acreate_client
+        return RepositorioSupabaseAsincrono(await acreate_client(
+            url, key, options=AsyncClientOptions(httpx_client=cliente_http_asincrono(conexiones, observador_pool))))
+    raise ValueError(f'Backend de datos desconocido: {backend}')
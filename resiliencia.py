@@ -0,0 +1,304 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextvars import ContextVar, copy_context
+
+from flask import g
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Instante (time.monotonic) en que vence la petición en curso; lo fija la
+# aplicación al empezar cada petición y lo consulta cada llamada al backend
+# (antes de cada intento y, en modo síncrono, en los timeouts de httpx: ver
+# conexiones.py; en modo asíncrono la llamada se cancela al vencer)
+plazo_actual = ContextVar('plazo_actual', default=None)
+
+
+# El backend no puede atender la llamada ahora: la ruta responde 503
+class BackendNoDisponible(Exception):
+    pass
+
+
+class PlazoAgotado(BackendNoDisponible):
+    pass
+
+
+class CircuitoAbierto(BackendNoDisponible):
+    pass
+
+
+# Errores de red o de tiempo (no de la consulta en sí): se pueden reintentar
+# en lecturas y cuentan para abrir el circuito
+def es_transitorio(error):
+    if isinstance(error, (ConnectionError, TimeoutError, PlazoAgotado)):
+        return True
+    return httpx is not None and isinstance(error, httpx.TransportError)
+
+
+# La ruta debe responder 503 (reintentable) en lugar de 500
+def no_disponible(error):
+    return isinstance(error, BackendNoDisponible) or es_transitorio(error)
+
+
+def restante():
+    plazo = plazo_actual.get()
+    return None if plazo is None else plazo - time.monotonic()
+
+
+# Disyuntor: tras 'umbral' fallos transitorios seguidos se abre y rechaza las
+# llamadas durante 'espera' segundos; después deja pasar una de prueba
+# (semiabierto) y se cierra si sale bien
+class Disyuntor:
+    def __init__(self, umbral=5, espera=10.0, al_cambiar=None):
+        self.umbral = umbral
+        self.espera = espera
+        self.al_cambiar = al_cambiar
+        self.fallos = 0
+        self.abierto_hasta = None
+        self._sondeando = False
+        self._lock = threading.Lock()
+
+    # Devuelve True si la llamada es la de prueba: quien la hace debe terminar
+    # con exito(), fallo() o liberar()
+    def permitir(self):
+        if self.abierto_hasta is None:
+            return False
+        with self._lock:
+            if self.abierto_hasta is None:
+                return False
+            if time.monotonic() < self.abierto_hasta or self._sondeando:
+                raise CircuitoAbierto('Backend degradado: circuito abierto')
+            self._sondeando = True
+            return True
+
+    # La llamada de prueba se interrumpió sin respuesta del backend (cancelada):
+    # no cuenta como fallo ni como éxito y deja pasar otra
+    def liberar(self):
+        with self._lock:
+            self._sondeando = False
+
+    def exito(self):
+        if self.fallos or self.abierto_hasta is not None:
+            with self._lock:
+                abierto = self.abierto_hasta is not None
+                self.fallos = 0
+                self.abierto_hasta = None
+                self._sondeando = False
+            if abierto and self.al_cambiar:
+                self.al_cambiar(False)
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            abrir = self._sondeando or self.fallos >= self.umbral
+            if abrir:
+                self.abierto_hasta = time.monotonic() + self.espera
+                self._sondeando = False
+        if abrir and self.al_cambiar:
+            self.al_cambiar(True)
+
+
+# Política de las llamadas al backend: plazo de la petición, reintentos con
+# backoff exponencial y jitter completo (solo lecturas idempotentes), lectura
+# cubierta (se lanza una segunda copia si la primera tarda más de 'cobertura'
+# segundos y gana la primera en responder) y disyuntor.
+# 'al_evento(evento, nombre)' recibe 'reintento', 'cobertura', 'plazo_agotado'
+# y 'rechazada' para las métricas.
+class Politica:
+    def __init__(self, reintentos=2, espera_base=0.05, espera_maxima=1.0, cobertura=None, hilos_cobertura=8,
+                 disyuntor=None, al_evento=None):
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.cobertura = cobertura
+        self.disyuntor = disyuntor or Disyuntor()
+        self.al_evento = al_evento
+        self._hilos_cobertura = hilos_cobertura
+        self._ejecutor = None
+        self._lock = threading.Lock()
+
+    def _evento(self, evento, nombre):
+        if self.al_evento:
+            self.al_evento(evento, nombre)
+
+    def _backoff(self, intento):
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** intento))
+
+    def _restante(self, nombre):
+        segundos = restante()
+        if segundos is not None and segundos <= 0:
+            self._evento('plazo_agotado', nombre)
+            raise PlazoAgotado(f'Plazo de la petición agotado antes de {nombre}')
+        return segundos
+
+    def _permitir(self, nombre):
+        try:
+            return self.disyuntor.permitir()
+        except CircuitoAbierto:
+            self._evento('rechazada', nombre)
+            raise
+
+    # Un error de la consulta (no transitorio) también es una respuesta del backend
+    def _registrar(self, error):
+        if error is not None and es_transitorio(error):
+            self.disyuntor.fallo()
+        else:
+            self.disyuntor.exito()
+
+    # Espera antes del siguiente intento, o None si no queda otro
+    def _siguiente_espera(self, nombre, intento, idempotente, error):
+        if not idempotente or intento >= self.reintentos or not es_transitorio(error):
+            return None
+        espera = self._backoff(intento)
+        segundos = restante()
+        if segundos is not None and espera >= segundos:
+            return None
+        self._evento('reintento', nombre)
+        return espera
+
+    # ---------- Llamadas síncronas ----------
+
+    def ejecutar(self, nombre, operacion, idempotente=False, cubrir=False):
+        intento = 0
+        while True:
+            segundos = self._restante(nombre)
+            sondeo = self._permitir(nombre)
+            try:
+                if cubrir and self.cobertura:
+                    resultado = self._cubierta(nombre, operacion, segundos)
+                else:
+                    resultado = operacion()
+            except Exception as e:
+                self._registrar(e)
+                if segundos is not None and es_transitorio(e) and not isinstance(e, PlazoAgotado) and restante() <= 0:
+                    self._evento('plazo_agotado', nombre)
+                    raise PlazoAgotado(f'Plazo de la petición agotado en {nombre}') from e
+                espera = self._siguiente_espera(nombre, intento, idempotente, e)
+                if espera is None:
+                    raise
+                time.sleep(espera)
+                intento += 1
+                continue
+            except BaseException:
+                if sondeo:
+                    self.disyuntor.liberar()
+                raise
+            self._registrar(None)
+            return resultado
+
+    def _obtener_ejecutor(self):
+        if self._ejecutor is None:
+            with self._lock:
+                if self._ejecutor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._ejecutor = ThreadPoolExecutor(max_workers=self._hilos_cobertura, thread_name_prefix='cobertura')
+        return self._ejecutor
+
+    # Las llamadas síncronas no se pueden cancelar: la copia perdedora termina
+    # en segundo plano y su resultado se descarta. Cada copia corre en una copia
+    # del contexto de la petición (plazo, contexto de Flask), como las tareas
+    # de asyncio en la versión asíncrona
+    def _cubierta(self, nombre, operacion, segundos):
+        ejecutor = self._obtener_ejecutor()
+        limite = None if segundos is None else time.monotonic() + segundos
+        pendientes = {ejecutor.submit(copy_context().run, operacion)}
+        hechas, pendientes = wait(pendientes, timeout=self.cobertura if segundos is None else min(self.cobertura, segundos))
+        if not hechas:
+            self._evento('cobertura', nombre)
+            pendientes.add(ejecutor.submit(copy_context().run, operacion))
+        while True:
+            for futuro in hechas:
+                if futuro.exception() is None or not pendientes:
+                    return futuro.result()
+            espera = None if limite is None else limite - time.monotonic()
+            if espera is not None and espera <= 0:
+                self._evento('plazo_agotado', nombre)
+                raise PlazoAgotado(f'Plazo de la petición agotado en {nombre}')
+            hechas, pendientes = wait(pendientes, timeout=espera, return_when=FIRST_COMPLETED)
+
+    # ---------- Llamadas asíncronas (el plazo cancela la llamada) ----------
+    # asyncio se importa aquí: en modo WSGI no se carga
+
+    async def ejecutar_asincrono(self, nombre, operacion, idempotente=False, cubrir=False):
+        import asyncio
+
+        intento = 0
+        while True:
+            segundos = self._restante(nombre)
+            sondeo = self._permitir(nombre)
+            try:
+                if cubrir and self.cobertura:
+                    resultado = await self._cubierta_asincrona(nombre, operacion, segundos)
+                else:
+                    resultado = await asyncio.wait_for(operacion(), segundos)
+            except Exception as e:
+                self._registrar(e)
+                if isinstance(e, asyncio.TimeoutError) and segundos is not None and restante() <= 0:
+                    self._evento('plazo_agotado', nombre)
+                    raise PlazoAgotado(f'Plazo de la petición agotado en {nombre}') from e
+                espera = self._siguiente_espera(nombre, intento, idempotente, e)
+                if espera is None:
+                    raise
+                await asyncio.sleep(espera)
+                intento += 1
+                continue
+            except BaseException:
+                # Cancelada (cliente desconectado o copia perdedora de otra
+                # lectura cubierta): solo se libera la llamada de prueba
+                if sondeo:
+                    self.disyuntor.liberar()
+                raise
+            self._registrar(None)
+            return resultado
+
+    async def _cubierta_asincrona(self, nombre, operacion, segundos):
+        import asyncio
+
+        limite = None if segundos is None else time.monotonic() + segundos
+        pendientes = {asyncio.ensure_future(operacion())}
+        try:
+            hechas, pendientes = await asyncio.wait(pendientes, timeout=self.cobertura if segundos is None else min(self.cobertura, segundos))
+            if not hechas:
+                self._evento('cobertura', nombre)
+                pendientes.add(asyncio.ensure_future(operacion()))
+            while True:
+                for futuro in hechas:
+                    if futuro.exception() is None or not pendientes:
+                        return futuro.result()
+                espera = None if limite is None else limite - time.monotonic()
+                if espera is not None and espera <= 0:
+                    raise asyncio.TimeoutError()
+                hechas, pendientes = await asyncio.wait(pendientes, timeout=espera, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for futuro in pendientes:
+                futuro.cancel()
+
+    # Segundos hasta que el circuito deje pasar otra llamada (0 si está cerrado)
+    def segundos_hasta_reintento(self):
+        abierto_hasta = self.disyuntor.abierto_hasta
+        return 0.0 if abierto_hasta is None else max(0.0, abierto_hasta - time.monotonic())
+
+    def cerrar(self):
+        if self._ejecutor is not None:
+            self._ejecutor.shutdown(wait=False, cancel_futures=True)
+            self._ejecutor = None
+
+
+# Plazo de cada petición (segundos): se fija al empezar y se retira al terminar
+def instalar_plazo(app, segundos):
+    if not segundos:
+        return
+
+    @app.before_request
+    def fijar_plazo():
+        g.token_plazo = plazo_actual.set(time.monotonic() + segundos)
+
+    @app.teardown_request
+    def retirar_plazo(error=None):
+        token = g.pop('token_plazo', None)
+        if token is not None:
+            plazo_actual.reset(token)
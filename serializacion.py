@@ -0,0 +1,78 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Proveedor JSON de Flask que usa orjson si está instalado: codifica
+# directamente a bytes (sin pasar por str) y sin ordenar las claves.
+# Sin orjson se comporta como el proveedor por defecto. Las fechas se dejan
+# a default() para conservar el formato de Flask (RFC 822, p. ej.
+# 'Wed, 21 Oct 2015 07:28:00 GMT') en lugar del ISO 8601 de orjson.
+class ProveedorJSON(DefaultJSONProvider):
+    sort_keys = False
+
+    def _opciones(self):
+        opciones = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+        return opciones
+
+    def dumps_bytes(self, obj):
+        if orjson is None:
+            return json.dumps(obj, default=self.default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys).encode()
+        return orjson.dumps(obj, default=self.default, option=self._opciones())
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+# Serializador de filas generado una sola vez a partir de la lista de campos
+# (salida, origen). El origen es una columna, una ruta ('tabla', 'columna') de
+# un join, o None para tomar el valor de un argumento con el nombre de salida.
+# El resultado es una función que copia los valores sin bucles ni condiciones.
+# Con en_sitio=True la fila recibida se transforma y se devuelve ella misma
+# (sin crear otro dict): solo sirve para filas recién leídas que traen
+# exactamente las columnas de origen.
+def compilar_serializador(campos, en_sitio=False):
+    argumentos = ['fila']
+    valores = []
+    for salida, origen in campos:
+        if origen is None:
+            argumentos.append(salida)
+            valor = salida
+        elif isinstance(origen, tuple):
+            valor = f'fila.pop({origen[0]!r})' if en_sitio else f'fila[{origen[0]!r}]'
+            valor += ''.join(f'[{parte!r}]' for parte in origen[1:])
+        elif en_sitio and origen != salida:
+            valor = f'fila.pop({origen!r})'
+        else:
+            valor = f'fila[{origen!r}]'
+        if not en_sitio:
+            valores.append(f'{salida!r}: {valor}')
+        elif valor != f'fila[{salida!r}]':
+            valores.append(f'fila[{salida!r}] = {valor}')
+
+    if en_sitio:
+        cuerpo = ''.join(f'    {valor}\n' for valor in valores) + '    return fila\n'
+    else:
+        cuerpo = f"    return {{{', '.join(valores)}}}\n"
+    codigo = f"def serializar({', '.join(argumentos)}):\n{cuerpo}"
+    espacio = {}
+    exec(compile(codigo, '<serializador>', 'exec'), espacio)
+    return espacio['serializar']
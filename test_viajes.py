@@ -0,0 +1,395 @@
+import time
+from datetime import date, datetime
+
+import pytest
+from flask import g, request
+from werkzeug.security import generate_password_hash
+
+import app as aplicacion
+from repositorio import OPERACIONES_IDEMPOTENTES, RepositorioMemoria
+from resiliencia import CircuitoAbierto, Disyuntor, Politica
+from viajes import PresupuestoExcedido, presupuesto_viajes
+
+# Presupuestos de viajes al backend (@presupuesto_viajes) con el backend en
+# memoria y ROUNDTRIP_BUDGETS=enforce: una ruta que los supera o repite una
+# consulta lanza PresupuestoExcedido en el cliente de pruebas
+
+CONFIG = {
+    'TESTING': True,
+    'SECRET_KEY': 'clave-de-pruebas-no-usar-en-produccion',
+    'DATA_BACKEND': 'memoria',
+    'ROUNDTRIP_BUDGETS': 'enforce',
+    'PASSWORD_HASH_WORKERS': 0
+}
+
+
+@pytest.fixture
+def app():
+    nueva = aplicacion.create_app(CONFIG, repositorio=RepositorioMemoria(), entorno={})
+    yield nueva
+    aplicacion.estado(nueva).cerrar()
+
+
+# Máximo de viajes por endpoint observado en las peticiones de 'recorrido'
+def viajes_por_endpoint(app, recorrido):
+    maximos = {}
+    repo = aplicacion.estado(app).repo
+
+    @app.before_request
+    def contar_desde():
+        g.llamadas_inicio = repo.llamadas
+
+    @app.after_request
+    def contar_hasta(response):
+        viajes = repo.llamadas - g.llamadas_inicio
+        maximos[request.endpoint] = max(maximos.get(request.endpoint, 0), viajes)
+        return response
+
+    recorrido(app.test_client())
+    return maximos
+
+
+def esperar(response, *estados):
+    assert response.status_code in estados, (response.status_code, response.get_json())
+    return response.get_json()
+
+
+# Cada ruta por su camino más caro: caches vacías, nombres de categoría y
+# estatus nuevos, If-None-Match desactualizado y hash de contraseña por renovar
+def recorrido_completo(cliente):
+    esperar(cliente.post('/registro', json={'nombre': 'Ana', 'email': 'ana@example.com', 'contrasena': 'secreto'}), 201)
+    repo = aplicacion.estado(cliente.application).repo
+    usuario = repo.obtener_usuario_por_email('ana@example.com')
+    repo.actualizar_usuario(usuario['id_usuario'], {'contrasena': generate_password_hash('secreto', 'pbkdf2:sha256:1000')})
+    sesion = esperar(cliente.post('/login', json={'email': 'ana@example.com', 'contrasena': 'secreto'}), 200)
+    esperar(cliente.post('/refresh', json={'refresh_token': sesion['refresh_token']}), 200)
+    cabeceras = {'Authorization': f"Bearer {sesion['token']}"}
+
+    esperar(cliente.get('/perfil', headers=cabeceras), 200)
+    esperar(cliente.put('/perfil', headers=cabeceras, json={'nombre': 'Ana B', 'email': 'ana.b@example.com'}), 200)
+    proyecto_id = esperar(cliente.post('/proyectos', headers=cabeceras, json={'nombre': 'Proyecto'}), 201)['proyecto']['id_proyecto']
+    esperar(cliente.get('/proyectos', headers=cabeceras), 200)
+    esperar(cliente.post('/categorias', headers=cabeceras, json={'nombre': 'Extra', 'proyecto_id': proyecto_id}), 201)
+
+    tarea_id = esperar(cliente.post('/tareas', headers=cabeceras, json={
+        'titulo': 'Primera', 'id_proyecto': proyecto_id, 'nombre_categoria': 'Nueva', 'nombre_estatus': 'Nuevo'}), 201)['tarea']['id_tarea']
+    esperar(cliente.put(f'/tareas/{tarea_id}', headers=cabeceras, json={'nombre_categoria': 'Otra', 'nombre_estatus': 'Otro'}), 200)
+    esperar(cliente.post('/tareas/bulk', headers=cabeceras, json={'tareas': [
+        {'titulo': 'Segunda', 'id_proyecto': proyecto_id, 'nombre_categoria': 'Lote', 'nombre_estatus': 'En lote'},
+        {'titulo': 'Tercera', 'id_proyecto': proyecto_id, 'nombre_categoria': 'To Do', 'nombre_estatus': 'To Do'}]}), 200)
+    esperar(cliente.put('/tareas/bulk', headers=cabeceras, json={'tareas': [
+        {'id_tarea': tarea_id, 'nombre_categoria': 'Movida', 'nombre_estatus': 'Movido'}]}), 200)
+
+    # Lecturas con un ETag que ya no es el vigente: versión y consulta completa
+    for ruta in (f'/proyectos/{proyecto_id}/categorias', f'/proyectos/{proyecto_id}/tareas',
+                 f'/proyectos/{proyecto_id}/tareas/buscar?q=primera', f'/proyectos/{proyecto_id}/tablero'):
+        esperar(cliente.get(ruta, headers={**cabeceras, 'If-None-Match': '"p1-v0"'}), 200)
+
+    tareas = esperar(cliente.get(f'/proyectos/{proyecto_id}/tareas', headers=cabeceras), 200)['tareas']
+    esperar(cliente.delete(f'/tareas/{tarea_id}', headers=cabeceras), 200)
+    esperar(cliente.delete('/tareas/bulk', headers=cabeceras, json={'ids': [tareas[1]['id_tarea']]}), 200)
+
+    sesion = esperar(cliente.put('/cambiar-contrasena', headers=cabeceras, json={
+        'contrasena_actual': 'secreto', 'contrasena_nueva': 'secreto2'}), 200)
+    esperar(cliente.post('/logout', headers={'Authorization': f"Bearer {sesion['token']}"}), 200)
+    esperar(cliente.get('/health'), 200)
+    esperar(cliente.get('/metrics'), 200)
+
+
+# Todas las rutas declaran un presupuesto, lo cumplen en su camino más caro y
+# no dejan margen: un viaje de más en cualquiera de ellas hace fallar la prueba
+def test_presupuestos_ajustados_al_camino_mas_caro(app):
+    viajes = viajes_por_endpoint(app, recorrido_completo)
+    for endpoint, vista in app.view_functions.items():
+        if endpoint == 'static':
+            continue
+        assert hasattr(vista, 'presupuesto_viajes'), f'{endpoint} no declara @presupuesto_viajes'
+        assert endpoint in viajes, f'{endpoint} no se ejecuta en el recorrido'
+        assert viajes[endpoint] == vista.presupuesto_viajes, (endpoint, viajes[endpoint], vista.presupuesto_viajes)
+
+
+def test_lecturas_en_cache_en_un_viaje(app):
+    def recorrido(cliente):
+        esperar(cliente.post('/registro', json={'nombre': 'Ana', 'email': 'ana@example.com', 'contrasena': 'secreto'}), 201)
+        token = esperar(cliente.post('/login', json={'email': 'ana@example.com', 'contrasena': 'secreto'}), 200)['token']
+        cabeceras = {'Authorization': f'Bearer {token}'}
+        proyecto_id = esperar(cliente.post('/proyectos', headers=cabeceras, json={'nombre': 'Proyecto'}), 201)['proyecto']['id_proyecto']
+        for ruta in (f'/proyectos/{proyecto_id}/categorias', f'/proyectos/{proyecto_id}/tareas', f'/proyectos/{proyecto_id}/tablero'):
+            esperar(cliente.get(ruta, headers=cabeceras), 200)
+
+    viajes = viajes_por_endpoint(app, recorrido)
+    assert viajes['api.listar_categorias'] == viajes['api.listar_tareas'] == viajes['api.obtener_tablero'] == 1
+
+
+def test_presupuesto_superado(app):
+    def vista():
+        aplicacion.repo.listar_estatus()
+        aplicacion.repo.usuario_existe(1)
+        return {}
+    app.add_url_rule('/prueba', 'prueba', presupuesto_viajes(1)(vista))
+
+    with pytest.raises(PresupuestoExcedido, match='2 viajes al backend'):
+        app.test_client().get('/prueba')
+    assert aplicacion.estado(app).registro_viajes.infracciones
+
+
+def test_consulta_repetida_n_mas_1(app):
+    def vista():
+        for usuario_id in (1, 2, 3):
+            aplicacion.repo.usuario_existe(usuario_id)
+        return {}
+    app.add_url_rule('/prueba', 'prueba', presupuesto_viajes(5)(vista))
+
+    with pytest.raises(PresupuestoExcedido, match=r"'usuarios.existe' repetida 3 veces"):
+        app.test_client().get('/prueba')
+
+
+def test_consulta_repetible_declarada(app):
+    def vista():
+        for usuario_id in (1, 2, 3):
+            aplicacion.repo.usuario_existe(usuario_id)
+        return {}
+    app.add_url_rule('/prueba', 'prueba', presupuesto_viajes(3, repetibles=('usuarios.existe',))(vista))
+
+    assert app.test_client().get('/prueba').status_code == 200
+    assert not aplicacion.estado(app).registro_viajes.infracciones
+
+
+# Las fechas conservan el formato de Flask (RFC 822) con el proveedor orjson
+def test_fechas_en_formato_de_flask(app):
+    with app.app_context():
+        cuerpo = app.json.dumps({'fecha': datetime(2015, 10, 21, 7, 28), 'dia': date(2020, 1, 2)})
+    assert app.json.loads(cuerpo) == {'fecha': 'Wed, 21 Oct 2015 07:28:00 GMT', 'dia': 'Thu, 02 Jan 2020 00:00:00 GMT'}
+
+
+# ---------- Comportamiento de las rutas ----------
+
+def iniciar_sesion(cliente, email='ana@example.com'):
+    esperar(cliente.post('/registro', json={'nombre': 'Ana', 'email': email, 'contrasena': 'secreto'}), 201)
+    sesion = esperar(cliente.post('/login', json={'email': email, 'contrasena': 'secreto'}), 200)
+    return sesion, {'Authorization': f"Bearer {sesion['token']}"}
+
+
+def tarea(titulo, proyecto_id, **datos):
+    return {'titulo': titulo, 'id_proyecto': proyecto_id, 'nombre_categoria': 'To Do', 'nombre_estatus': 'To Do', **datos}
+
+
+def crear_proyecto(cliente, cabeceras, titulos=()):
+    proyecto_id = esperar(cliente.post('/proyectos', headers=cabeceras, json={'nombre': 'Proyecto'}), 201)['proyecto']['id_proyecto']
+    if titulos:
+        esperar(cliente.post('/tareas/bulk', headers=cabeceras, json={'tareas': [
+            tarea(titulo, proyecto_id, prioridad=indice % 3 + 1) for indice, titulo in enumerate(titulos)]}), 200)
+    return proyecto_id
+
+
+def estados(cuerpo):
+    return [resultado['estado'] for resultado in cuerpo['resultados']]
+
+
+def test_lote_estados_por_tarea(app):
+    cliente = app.test_client()
+    _, cabeceras = iniciar_sesion(cliente)
+    _, ajenas = iniciar_sesion(cliente, 'beto@example.com')
+    proyecto_id = crear_proyecto(cliente, cabeceras)
+    ajeno_id = crear_proyecto(cliente, ajenas)
+
+    cuerpo = esperar(cliente.post('/tareas/bulk', headers=cabeceras, json={'tareas': [
+        tarea('Válida', proyecto_id), tarea('', proyecto_id), tarea('Ajena', ajeno_id)]}), 200)
+    assert estados(cuerpo) == [201, 400, 404]
+    assert (cuerpo['creadas'], cuerpo['fallidas']) == (1, 2)
+    tarea_id = cuerpo['resultados'][0]['tarea']['id_tarea']
+    tarea_ajena = esperar(cliente.post('/tareas', headers=ajenas, json=tarea('De Beto', ajeno_id)), 201)['tarea']['id_tarea']
+
+    cuerpo = esperar(cliente.put('/tareas/bulk', headers=cabeceras, json={'tareas': [
+        {'id_tarea': tarea_id, 'prioridad': 2}, {'id_tarea': tarea_id, 'prioridad': 3},
+        {'id_tarea': tarea_ajena, 'prioridad': 3}, {'id_tarea': 999, 'prioridad': 3}]}), 200)
+    assert estados(cuerpo) == [200, 400, 403, 404]
+    assert cuerpo['resultados'][1]['error'] == 'Tarea repetida en el lote'
+    assert cuerpo['resultados'][0]['tarea']['prioridad'] == 2
+
+    cuerpo = esperar(cliente.delete('/tareas/bulk', headers=cabeceras, json={'ids': [tarea_id, tarea_id, tarea_ajena]}), 200)
+    assert estados(cuerpo) == [200, 400, 403]
+    assert (cuerpo['eliminadas'], cuerpo['fallidas']) == (1, 2)
+
+
+# Si el backend confirma la inserción sin devolver todas las filas, las que
+# faltan quedan como 202 en lugar de convertir el lote en un 500
+def test_lote_insercion_confirmada_sin_filas(app, monkeypatch):
+    cliente = app.test_client()
+    _, cabeceras = iniciar_sesion(cliente)
+    proyecto_id = crear_proyecto(cliente, cabeceras)
+    repo = aplicacion.estado(app).repo
+    crear_tareas = repo.crear_tareas
+    monkeypatch.setattr(repo, 'crear_tareas', lambda tareas: crear_tareas(tareas)[:1])
+
+    cuerpo = esperar(cliente.post('/tareas/bulk', headers=cabeceras, json={'tareas': [
+        tarea('Primera', proyecto_id), tarea('Segunda', proyecto_id)]}), 200)
+    assert estados(cuerpo) == [201, 202]
+    assert (cuerpo['creadas'], cuerpo['fallidas']) == (1, 0)
+
+
+def test_logout_revoca_acceso_y_refresco(app):
+    cliente = app.test_client()
+    sesion, cabeceras = iniciar_sesion(cliente)
+    esperar(cliente.post('/logout', headers=cabeceras), 200)
+
+    assert esperar(cliente.get('/perfil', headers=cabeceras), 401)
+    assert esperar(cliente.post('/refresh', json={'refresh_token': sesion['refresh_token']}), 401) == {'error': 'Sesión revocada'}
+
+
+def test_login_renueva_hash(app):
+    cliente = app.test_client()
+    iniciar_sesion(cliente)
+    repo = aplicacion.estado(app).repo
+    usuario = repo.obtener_usuario_por_email('ana@example.com')
+    repo.actualizar_usuario(usuario['id_usuario'], {'contrasena': generate_password_hash('secreto', 'pbkdf2:sha256:1000')})
+
+    esperar(cliente.post('/login', json={'email': 'ana@example.com', 'contrasena': 'secreto'}), 200)
+    assert repo.obtener_usuario_por_email('ana@example.com')['contrasena'].startswith('scrypt:')
+
+
+# Si no se puede guardar el hash renovado el inicio de sesión sigue y se cuenta
+def test_login_con_fallo_al_renovar_hash(app, monkeypatch):
+    cliente = app.test_client()
+    iniciar_sesion(cliente)
+    repo = aplicacion.estado(app).repo
+    usuario = repo.obtener_usuario_por_email('ana@example.com')
+    repo.actualizar_usuario(usuario['id_usuario'], {'contrasena': generate_password_hash('secreto', 'pbkdf2:sha256:1000')})
+
+    def fallar(*args):
+        raise ConnectionError('Fallo simulado del backend')
+    monkeypatch.setattr(repo, 'actualizar_usuario', fallar)
+
+    esperar(cliente.post('/login', json={'email': 'ana@example.com', 'contrasena': 'secreto'}), 200)
+    assert aplicacion.estado(app).metricas.valores()[('app_password_rehash_failures_total', ())] == 1
+
+
+def test_disyuntor_abierto_y_semiabierto():
+    disyuntor = Disyuntor(umbral=2, espera=0.05)
+    disyuntor.fallo()
+    assert disyuntor.permitir() is False
+    disyuntor.fallo()
+    with pytest.raises(CircuitoAbierto):
+        disyuntor.permitir()
+
+    # Pasada la espera deja pasar una sola llamada de prueba
+    time.sleep(0.06)
+    assert disyuntor.permitir() is True
+    with pytest.raises(CircuitoAbierto):
+        disyuntor.permitir()
+
+    # Si la prueba falla vuelve a abrirse; si sale bien se cierra
+    disyuntor.fallo()
+    with pytest.raises(CircuitoAbierto):
+        disyuntor.permitir()
+    time.sleep(0.06)
+    assert disyuntor.permitir() is True
+    disyuntor.exito()
+    assert disyuntor.permitir() is False
+
+
+# Solo se reintentan las operaciones de OPERACIONES_IDEMPOTENTES
+def test_reintentos_solo_idempotentes():
+    repo = RepositorioMemoria(fallos=1.0)
+    repo.politica = Politica(reintentos=2, espera_base=0, disyuntor=Disyuntor(umbral=100))
+    assert 'estatus.listar' in OPERACIONES_IDEMPOTENTES and 'proyectos.crear' not in OPERACIONES_IDEMPOTENTES
+
+    with pytest.raises(ConnectionError):
+        repo.listar_estatus()
+    assert repo.llamadas == 3
+
+    with pytest.raises(ConnectionError):
+        repo.crear_proyecto({'nombre': 'Proyecto', 'id_usuario_creador': 1})
+    assert repo.llamadas == 4
+
+
+# Agotado el plazo de la petición no se empieza otra llamada: 503 reintentable
+def test_plazo_agotado_responde_503():
+    repo = RepositorioMemoria()
+    app = aplicacion.create_app(dict(CONFIG, BACKEND_DEADLINE=0.02), repositorio=repo, entorno={})
+    try:
+        cliente = app.test_client()
+        repo.latencia = 0.05
+        response = cliente.post('/registro', json={'nombre': 'Ana', 'email': 'ana@example.com', 'contrasena': 'secreto'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert repo.llamadas == 1
+    finally:
+        aplicacion.estado(app).cerrar()
+
+
+def test_indice_de_busqueda_sigue_los_cambios(app):
+    cliente = app.test_client()
+    _, cabeceras = iniciar_sesion(cliente)
+    proyecto_id = crear_proyecto(cliente, cabeceras)
+
+    def buscar(consulta):
+        cuerpo = esperar(cliente.get(f'/proyectos/{proyecto_id}/tareas/buscar?q={consulta}', headers=cabeceras), 200)
+        return [tarea['id_tarea'] for tarea in cuerpo['tareas']]
+
+    tarea_id = esperar(cliente.post('/tareas', headers=cabeceras, json=tarea(
+        'Revisar factura', proyecto_id, descripcion='del proveedor')), 201)['tarea']['id_tarea']
+    otra_id = esperar(cliente.post('/tareas', headers=cabeceras, json=tarea('Pagar factura', proyecto_id)), 201)['tarea']['id_tarea']
+    assert sorted(buscar('factura')) == [tarea_id, otra_id]
+    assert buscar('proveedor') == [tarea_id]
+
+    esperar(cliente.put(f'/tareas/{tarea_id}', headers=cabeceras, json={'titulo': 'Revisar contrato', 'descripcion': ''}), 200)
+    assert buscar('factura') == [otra_id]
+    assert buscar('proveedor') == []
+    assert buscar('contrato') == [tarea_id]
+
+    esperar(cliente.delete(f'/tareas/{otra_id}', headers=cabeceras), 200)
+    assert buscar('factura') == []
+    assert buscar('pagar') == []
+
+
+def test_filtros_y_paginacion(app):
+    cliente = app.test_client()
+    _, cabeceras = iniciar_sesion(cliente)
+    proyecto_id = crear_proyecto(cliente, cabeceras, [f'Tarea {indice}' for indice in range(7)])
+    ruta = f'/proyectos/{proyecto_id}/tareas'
+    todas = esperar(cliente.get(ruta, headers=cabeceras), 200)['tareas']
+
+    def paginas(consulta):
+        vistas, cursor = [], None
+        while True:
+            cuerpo = esperar(cliente.get(f'{ruta}?{consulta}&limit=3' + (f'&cursor={cursor}' if cursor else ''), headers=cabeceras), 200)
+            vistas += cuerpo['tareas']
+            cursor = cuerpo['siguiente']
+            if not cursor:
+                return vistas
+
+    assert paginas('fields=id_tarea') == [{'id_tarea': tarea['id_tarea']} for tarea in todas]
+    esperadas = sorted(todas, key=lambda tarea: (-tarea['prioridad'], tarea['id_tarea']))
+    assert paginas('sort=-prioridad') == esperadas
+    assert paginas('sort=-prioridad&prioridad_min=2') == [tarea for tarea in esperadas if tarea['prioridad'] >= 2]
+
+    # Un cursor solo vale para el tipo de paginación y el orden que lo emitieron
+    keyset = esperar(cliente.get(f'{ruta}?limit=3', headers=cabeceras), 200)['siguiente']
+    posicion = esperar(cliente.get(f'{ruta}?limit=3&sort=-prioridad', headers=cabeceras), 200)['siguiente']
+    for consulta in (f'sort=-prioridad&cursor={keyset}', f'cursor={posicion}', f'sort=prioridad&cursor={posicion}',
+                     'cursor=no-es-un-cursor', 'prioridad_min=9', 'sort=descripcion'):
+        esperar(cliente.get(f'{ruta}?limit=3&{consulta}', headers=cabeceras), 400)
+
+
+def test_etag_y_revalidacion(app):
+    cliente = app.test_client()
+    _, cabeceras = iniciar_sesion(cliente)
+    proyecto_id = crear_proyecto(cliente, cabeceras, ['Primera'])
+    ruta = f'/proyectos/{proyecto_id}/tareas'
+
+    response = cliente.get(ruta, headers=cabeceras)
+    etag = response.headers['ETag']
+    primera = response.get_json()['tareas'][0]
+    assert cliente.get(ruta, headers={**cabeceras, 'If-None-Match': etag}).status_code == 304
+
+    # Un cambio sin efecto no sube la versión del proyecto
+    esperar(cliente.put(f"/tareas/{primera['id_tarea']}", headers=cabeceras, json={'titulo': primera['titulo']}), 200)
+    assert cliente.get(ruta, headers={**cabeceras, 'If-None-Match': etag}).status_code == 304
+
+    # Una escritura sí: el ETag anterior deja de valer
+    esperar(cliente.post('/tareas', headers=cabeceras, json=tarea('Segunda', proyecto_id)), 201)
+    response = cliente.get(ruta, headers={**cabeceras, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.get_json()['tareas']) == 2
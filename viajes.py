@@ -0,0 +1,75 @@
+from collections import Counter, deque
+
+from flask import g, has_request_context, request
+
+MODOS = ('off', 'warn', 'enforce')
+
+
+# Una ruta superó su presupuesto de viajes al backend o repitió una consulta
+class PresupuestoExcedido(AssertionError):
+    pass
+
+
+# Declara cuántos viajes al backend puede hacer una ruta como máximo y qué
+# operaciones puede repetir dentro de la misma petición (el resto de
+# repeticiones se consideran un N+1)
+def presupuesto_viajes(maximo, repetibles=()):
+    def decorador(vista):
+        vista.presupuesto_viajes = maximo
+        vista.viajes_repetibles = frozenset(repetibles)
+        return vista
+    return decorador
+
+
+# Registro de los viajes al backend de cada petición (por nombre de operación,
+# que identifica la forma de la consulta) y comprobación al terminarla.
+# modo: 'off' (sin registro), 'warn' (solo log) o 'enforce' (lanza
+# PresupuestoExcedido: con TESTING la excepción llega al cliente de pruebas y
+# fuera de él la petición responde 500)
+class RegistroViajes:
+    def __init__(self, modo='off', max_infracciones=100):
+        if modo not in MODOS:
+            raise ValueError(f'Modo de presupuesto de viajes no válido: {modo}')
+        self.modo = modo
+        self.infracciones = deque(maxlen=max_infracciones)
+
+    @property
+    def activo(self):
+        return self.modo != 'off'
+
+    # Añade el registro a un observador del repositorio (nombre, segundos, error)
+    def envolver(self, observador):
+        def observar(nombre, segundos, error):
+            observador(nombre, segundos, error)
+            if has_request_context():
+                g.setdefault('viajes_backend', []).append(nombre)
+        return observar
+
+    def revisar(self, vista, viajes):
+        problemas = []
+        maximo = getattr(vista, 'presupuesto_viajes', None)
+        if maximo is not None and len(viajes) > maximo:
+            problemas.append(f'{len(viajes)} viajes al backend (presupuesto {maximo}): {", ".join(viajes)}')
+        repetibles = getattr(vista, 'viajes_repetibles', frozenset())
+        for nombre, veces in Counter(viajes).items():
+            if veces > 1 and nombre not in repetibles:
+                problemas.append(f"consulta '{nombre}' repetida {veces} veces en la misma petición (posible N+1)")
+        return problemas
+
+    def instalar(self, app):
+        if not self.activo:
+            return
+
+        @app.after_request
+        def revisar_viajes(response):
+            vista = app.view_functions.get(request.endpoint)
+            if vista is None:
+                return response
+            problemas = self.revisar(vista, g.pop('viajes_backend', []))
+            if problemas:
+                mensaje = f'{request.method} {request.url_rule.rule}: ' + '; '.join(problemas)
+                self.infracciones.append(mensaje)
+                if self.modo == 'enforce':
+                    raise PresupuestoExcedido(mensaje)
+                app.logger.warning(mensaje)
+            return response